@@ -0,0 +1,4 @@
+"""
+Throughput and memory benchmarks of imbox against an in-process IMAP server
+serving a synthetic mailbox. Run with ``python -m benchmarks --help``.
+"""
@@ -0,0 +1,82 @@
+import argparse
+import gc
+import time
+import tracemalloc
+
+import benchmarks
+from benchmarks.corpus import generate_mailbox
+from benchmarks.server import FakeIMAPServer
+from imbox import Imbox
+from imbox.parser import parse_email
+
+
+def measure(name, count, size, run):
+    """
+    Print and return the throughput of ``run()``, then the peak of memory it
+    allocates in a second run under tracemalloc, which slows it down.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        'name': name,
+        'seconds': elapsed,
+        'messages_per_second': count / elapsed,
+        'mb_per_second': size / elapsed / 1024 ** 2,
+        'peak_mb': peak / 1024 ** 2,
+    }
+    print('{name:<28} {seconds:8.2f} s {messages_per_second:10.1f} msg/s '
+          '{mb_per_second:8.2f} MB/s {peak_mb:9.1f} MB peak'.format(**result))
+    return result
+
+
+def bench_parse_email(mailbox):
+    def run():
+        for raw_email in mailbox.values():
+            parse_email(raw_email)
+    return run
+
+
+def bench_messages(server, **kwargs):
+    def run():
+        with Imbox('127.0.0.1', port=server.port, ssl=False,
+                   username='bench', password='bench') as imbox:
+            for _ in imbox.messages(**kwargs):
+                pass
+    return run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=benchmarks.__doc__)
+    parser.add_argument('--messages', type=int, default=500, help='size of the synthetic mailbox')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='seconds waited by the server before each response')
+    parser.add_argument('--chunk-size', type=int, default=None, help='fetch_chunk_size of Messages')
+    args = parser.parse_args(argv)
+
+    mailbox = generate_mailbox(args.messages, seed=args.seed)
+    count, size = len(mailbox), sum(len(raw_email) for raw_email in mailbox.values())
+    print('{} messages, {:.1f} MB, {:.1f} ms latency'.format(count, size / 1024 ** 2, args.latency * 1000))
+
+    results = [measure('parse_email', count, size, bench_parse_email(mailbox))]
+    with FakeIMAPServer(mailbox, latency=args.latency) as server:
+        results.append(measure('Imbox.messages()', count, size,
+                               bench_messages(server, fetch_chunk_size=args.chunk_size)))
+        results.append(measure('Imbox.messages(headers_only)', count, size,
+                               bench_messages(server, fetch_chunk_size=args.chunk_size, headers_only=True)))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import random
+from email.header import Header
+from email.mime.application import MIMEApplication
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import format_datetime, formataddr
+from datetime import datetime, timedelta, timezone
+
+# Charsets and a sample text each can encode
+CHARSETS = (
+    ('utf-8', 'Grüße, 你好, привет'),
+    ('iso-8859-1', 'Café crème à la française'),
+    ('windows-1252', 'Naïve “smart quotes” – résumé'),
+    ('koi8-r', 'Съешь же ещё этих мягких французских булок'),
+    ('shift_jis', 'こんにちは、世界'),
+)
+
+# Message shapes and their relative frequency
+SHAPES = (
+    ('plain', 40),
+    ('alternative', 30),
+    ('attachments', 20),
+    ('inline_image', 10),
+)
+
+ATTACHMENT_SIZES = (2 * 1024, 64 * 1024, 512 * 1024)
+
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'invoice', 'meeting', 'report',
+         'quarterly', 'update', 'please', 'review', 'attached', 'thanks')
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _body(rng, charset, sample):
+    lines = [_text(rng, 12) for _ in range(rng.randint(5, 40))]
+    lines.insert(rng.randint(0, len(lines)), sample)
+    return MIMEText('\n'.join(lines), 'plain', charset)
+
+
+def generate_message(index, rng, attachment_sizes=ATTACHMENT_SIZES):
+    """
+    Return one synthetic RFC 5322 message as bytes.
+    """
+    charset, sample = rng.choice(CHARSETS)
+    shape = rng.choices([name for name, _ in SHAPES], [weight for _, weight in SHAPES])[0]
+
+    if shape == 'plain':
+        message = _body(rng, charset, sample)
+    elif shape == 'alternative':
+        message = MIMEMultipart('alternative', boundary='alternative-{}'.format(index))
+        message.attach(_body(rng, charset, sample))
+        message.attach(MIMEText('<html><body><p>{}</p><p>{}</p></body></html>'.format(
+            _text(rng, 80), sample), 'html', charset))
+    else:
+        message = MIMEMultipart('mixed' if shape == 'attachments' else 'related',
+                                boundary='{}-{}'.format(shape, index))
+        message.attach(_body(rng, charset, sample))
+        for number in range(rng.randint(1, 3) if shape == 'attachments' else 1):
+            size = rng.choice(attachment_sizes)
+            payload = rng.getrandbits(8 * size).to_bytes(size, 'little')
+            if shape == 'attachments':
+                part = MIMEApplication(payload, 'pdf')
+                part.add_header('Content-Disposition', 'attachment',
+                                filename='scan-{}-{}.pdf'.format(index, number))
+            else:
+                part = MIMEImage(payload, 'png')
+                part.add_header('Content-Disposition', 'inline', filename='logo.png')
+                part.add_header('Content-ID', '<logo-{}>'.format(index))
+            message.attach(part)
+
+    date = datetime(2020, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=index * 17)
+    message['Subject'] = Header('{} #{} {}'.format(_text(rng, 4), index, sample), charset)
+    message['From'] = formataddr((str(Header(sample[:10], charset)), 'sender{}@example.com'.format(index % 50)))
+    message['To'] = 'team@example.com'
+    message['Date'] = format_datetime(date)
+    message['Message-ID'] = '<{}@bench.example.com>'.format(index)
+    return message.as_bytes()
+
+
+def generate_mailbox(count, seed=0, attachment_sizes=ATTACHMENT_SIZES):
+    """
+    Return ``{uid: raw_message}`` for ``count`` messages, the same for a
+    given ``seed``.
+    """
+    rng = random.Random(seed)
+    return {uid: generate_message(uid, rng, attachment_sizes) for uid in range(1, count + 1)}
@@ -0,0 +1,198 @@
+import re
+import socketserver
+import threading
+import time
+
+from imbox.utils import sequence_set_to_uids
+
+FETCH_ITEM_RE = re.compile(r'BODY(?:\.PEEK)?\[[^\]]*\]|[A-Z0-9.]+', re.IGNORECASE)
+
+
+def _quote_flags(flags):
+    return '({})'.format(' '.join(flags))
+
+
+class Mailbox:
+    """
+    The messages and flags served by FakeIMAPServer, shared by its
+    connections.
+    """
+
+    def __init__(self, messages, uidvalidity=1):
+        self.messages = dict(messages)
+        self.flags = {uid: set() for uid in self.messages}
+        self.uidvalidity = uidvalidity
+        self.lock = threading.Lock()
+
+    def uids(self):
+        return sorted(self.messages)
+
+    def header(self, uid):
+        raw = self.messages[uid]
+        end = raw.find(b'\r\n\r\n')
+        if end == -1:
+            end = raw.find(b'\n\n')
+            return raw if end == -1 else raw[:end + 2]
+        return raw[:end + 4]
+
+
+class IMAPHandler(socketserver.StreamRequestHandler):
+    """
+    Answers the IMAP4rev1 commands imaplib sends for imbox: CAPABILITY,
+    LOGIN, LIST (of INBOX only), SELECT/EXAMINE, UID SEARCH, UID FETCH, UID STORE, NOOP, CLOSE and
+    LOGOUT. SEARCH criteria other than ALL and UID are ignored.
+    """
+
+    def write(self, data):
+        self.wfile.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+
+    def handle(self):
+        self.write('* OK [CAPABILITY IMAP4rev1 UIDPLUS] imbox benchmark server ready\r\n')
+        self.wfile.flush()
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            tag, _, command = line.decode('utf-8').rstrip('\r\n').partition(' ')
+            name, _, arguments = command.partition(' ')
+            name = name.upper()
+
+            if self.server.latency:
+                time.sleep(self.server.latency)
+
+            handler = getattr(self, 'do_' + name, None)
+            if handler is None:
+                self.write('{} BAD unknown command {}\r\n'.format(tag, name))
+            else:
+                handler(arguments)
+                self.write('{} OK {} completed\r\n'.format(tag, name))
+            self.wfile.flush()
+            if name == 'LOGOUT':
+                break
+
+    def do_CAPABILITY(self, arguments):
+        self.write('* CAPABILITY IMAP4rev1 UIDPLUS\r\n')
+
+    def do_LOGIN(self, arguments):
+        pass
+
+    def do_NOOP(self, arguments):
+        pass
+
+    def do_CLOSE(self, arguments):
+        pass
+
+    def do_LOGOUT(self, arguments):
+        self.write('* BYE logging out\r\n')
+
+    def do_LIST(self, arguments):
+        self.write('* LIST (\\HasNoChildren) "/" "INBOX"\r\n')
+
+    def do_SELECT(self, arguments):
+        mailbox = self.server.mailbox
+        uids = mailbox.uids()
+        self.write('* {} EXISTS\r\n* 0 RECENT\r\n'.format(len(uids)))
+        self.write('* OK [UIDVALIDITY {}] UIDs valid\r\n'.format(mailbox.uidvalidity))
+        self.write('* OK [UIDNEXT {}] Predicted next UID\r\n'.format((uids[-1] if uids else 0) + 1))
+        self.write('* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)\r\n')
+
+    do_EXAMINE = do_SELECT
+
+    def do_UID(self, arguments):
+        command, _, arguments = arguments.partition(' ')
+        getattr(self, 'do_UID_' + command.upper())(arguments)
+
+    def _matching_uids(self, sequence_set):
+        uids = self.server.mailbox.uids()
+        if not uids:
+            return []
+        sequence_set = sequence_set.replace('*', str(uids[-1]))
+        wanted = set(sequence_set_to_uids(sequence_set))
+        return [uid for uid in uids if uid in wanted]
+
+    def do_UID_SEARCH(self, arguments):
+        uids = self.server.mailbox.uids()
+        match = re.search(r'UID ([0-9:,*]+)', arguments, re.IGNORECASE)
+        if match:
+            uids = self._matching_uids(match.group(1))
+        self.write(' '.join(['* SEARCH'] + [str(uid) for uid in uids]) + '\r\n')
+
+    def do_UID_FETCH(self, arguments):
+        sequence_set, _, items = arguments.partition(' ')
+        items = FETCH_ITEM_RE.findall(items)
+        mailbox = self.server.mailbox
+        for number, uid in enumerate(self._matching_uids(sequence_set), 1):
+            self.write('* {} FETCH (UID {}'.format(number, uid))
+            for item in items:
+                upper = item.upper()
+                if upper == 'UID':
+                    continue
+                if upper == 'FLAGS':
+                    self.write(' FLAGS {}'.format(_quote_flags(sorted(mailbox.flags[uid]))))
+                elif upper == 'INTERNALDATE':
+                    self.write(' INTERNALDATE "17-Jul-1996 02:44:25 -0700"')
+                elif upper == 'RFC822.SIZE':
+                    self.write(' RFC822.SIZE {}'.format(len(mailbox.messages[uid])))
+                elif upper.startswith('BODY'):
+                    section = upper[upper.index('['):]
+                    data = mailbox.header(uid) if section == '[HEADER]' else mailbox.messages[uid]
+                    self.write(' BODY{} {{{}}}\r\n'.format(section, len(data)))
+                    self.write(data)
+            self.write(')\r\n')
+
+    def do_UID_STORE(self, arguments):
+        sequence_set, operation, flags = arguments.split(' ', 2)
+        flags = set(flags.strip('()').split())
+        mailbox = self.server.mailbox
+        with mailbox.lock:
+            for number, uid in enumerate(self._matching_uids(sequence_set), 1):
+                if operation.upper().startswith('+'):
+                    mailbox.flags[uid] |= flags
+                elif operation.upper().startswith('-'):
+                    mailbox.flags[uid] -= flags
+                else:
+                    mailbox.flags[uid] = set(flags)
+                self.write('* {} FETCH (UID {} FLAGS {})\r\n'.format(
+                    number, uid, _quote_flags(sorted(mailbox.flags[uid]))))
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    """
+    An in-process IMAP server for benchmarks, serving ``messages`` (a dict
+    of UID to raw message) on an ephemeral port of localhost. ``latency``
+    seconds are waited before answering each command, to model a network
+    round trip.
+
+    ::
+
+        with FakeIMAPServer(generate_mailbox(1000), latency=0.02) as server:
+            imbox = Imbox('127.0.0.1', port=server.port, ssl=False, username='u', password='p')
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, messages, latency=0.0, host='127.0.0.1'):
+        super().__init__((host, 0), IMAPHandler)
+        self.mailbox = Mailbox(messages)
+        self.latency = latency
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
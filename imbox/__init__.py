@@ -1,3 +1,5 @@
 from imbox.imbox import Imbox
+from imbox.pool import ImboxPool
+from imbox.async_imbox import AsyncImbox
 
-__all__ = ['Imbox']
+__all__ = ['Imbox', 'ImboxPool', 'AsyncImbox']
@@ -0,0 +1,266 @@
+import asyncio
+import imaplib
+import re
+import ssl as pythonssllib
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+LITERAL_RE = re.compile(rb'\{(?P<size>\d+)\}$')
+RESPONSE_CODE_RE = re.compile(rb'\[(?P<type>[A-Z-]+)( (?P<data>[^\]]*))?\]')
+UNTAGGED_STATUS_RE = re.compile(rb'(?P<data>\d+) (?P<type>[A-Z-]+)( (?P<data2>.*))?$')
+UNTAGGED_RE = re.compile(rb'(?P<type>[A-Z-]+)( (?P<data>.*))?$')
+
+
+def quote(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class AsyncIMAP4:
+    """
+    A small asyncio IMAP4rev1 client.
+
+    Commands are coroutines returning ``(typ, data)`` shaped exactly like
+    the ``imaplib.IMAP4`` ones, so responses can be handed to the same
+    parsing functions. Commands on one connection are serialized.
+    """
+
+    error = imaplib.IMAP4.error
+    abort = imaplib.IMAP4.abort
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.capabilities = ()
+        self.untagged_responses = {}
+        self.continuation = None
+        self._tag_number = 0
+        self._lock = asyncio.Lock()
+
+    async def _readline(self):
+        line = await self.reader.readline()
+        if not line:
+            raise self.abort('socket error: EOF')
+        return line.rstrip(b'\r\n')
+
+    def _append_untagged(self, typ, data):
+        self.untagged_responses.setdefault(typ, []).append(data)
+
+    async def read_response(self):
+        """
+        Read one server response; returns the tagged line or None.
+        """
+        line = await self._readline()
+
+        if line.startswith(b'+'):
+            self.continuation = line[2:]
+            return None
+
+        if not line.startswith(b'* '):
+            return line
+
+        line = line[2:]
+        match = UNTAGGED_STATUS_RE.match(line)
+        if match:
+            data = match.group('data')
+            if match.group('data2'):
+                data += b' ' + match.group('data2')
+        else:
+            match = UNTAGGED_RE.match(line)
+            if match is None:
+                raise self.error("Unexpected response: {!r}".format(line))
+            data = match.group('data') or b''
+        typ = match.group('type').decode('ascii')
+
+        while True:
+            literal = LITERAL_RE.search(data)
+            if literal is None:
+                break
+            payload = await self.reader.readexactly(int(literal.group('size')))
+            self._append_untagged(typ, (data, payload))
+            data = await self._readline()
+
+        self._append_untagged(typ, data)
+
+        if typ in ('OK', 'NO', 'BAD', 'BYE', 'PREAUTH'):
+            code = RESPONSE_CODE_RE.match(data)
+            if code:
+                self._append_untagged(code.group('type').decode('ascii'), code.group('data'))
+        if typ == 'BYE':
+            raise self.abort(data.decode('utf-8', 'replace'))
+        return None
+
+    def _new_tag(self):
+        self._tag_number += 1
+        return 'A{:04d}'.format(self._tag_number).encode('ascii')
+
+    async def send(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    async def _command(self, name, *args):
+        tag = self._new_tag()
+        line = b' '.join([tag, name.encode('ascii')] +
+                         [arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+                          for arg in args if arg is not None])
+        await self.send(line + b'\r\n')
+
+        while True:
+            tagged = await self.read_response()
+            if tagged is None:
+                continue
+            if tagged.startswith(tag + b' '):
+                status, _, text = tagged[len(tag) + 1:].partition(b' ')
+                return status.decode('ascii'), text
+            logger.debug("Ignoring unexpected response {!r}".format(tagged))
+
+    async def command(self, name, *args, response=None):
+        """
+        Run a command; returns the status and the untagged responses of
+        type ``response`` (the command name by default), like imaplib does.
+        """
+        async with self._lock:
+            response = (response or name).upper()
+            self.untagged_responses.pop(response, None)
+            status, text = await self._command(name, *args)
+            if status == 'BAD':
+                raise self.error("{} command error: {}".format(name, text.decode('utf-8', 'replace')))
+            return status, self.untagged_responses.pop(response, None) or [text if status != 'OK' else None]
+
+    def response(self, code):
+        return code, self.untagged_responses.pop(code.upper(), [None])
+
+    async def capability(self):
+        status, data = await self.command('CAPABILITY')
+        if data and data[-1]:
+            self.capabilities = tuple(data[-1].decode('ascii').upper().split())
+        return status, data
+
+    async def login(self, username, password):
+        status, data = await self.command('LOGIN', quote(username), quote(password), response='OK')
+        if status != 'OK':
+            raise self.error(data[-1].decode('utf-8', 'replace'))
+        await self.capability()
+        return status, data
+
+    async def select(self, mailbox='INBOX', readonly=False):
+        self.untagged_responses = {}
+        name = 'EXAMINE' if readonly else 'SELECT'
+        return await self.command(name, mailbox, response='EXISTS')
+
+    async def uid(self, command, *args):
+        command = command.upper()
+        response = command if command in ('SEARCH', 'SORT', 'THREAD') else 'FETCH'
+        async with self._lock:
+            self.untagged_responses.pop(response, None)
+            status, text = await self._command('UID', command, *args)
+            if status == 'BAD':
+                raise self.error("UID {} command error: {}".format(command, text.decode('utf-8', 'replace')))
+            return status, self.untagged_responses.pop(response, None) or [None]
+
+    async def list(self, directory='""', pattern='*'):
+        return await self.command('LIST', directory, pattern)
+
+    async def idle(self, timeout, changes=('EXISTS', 'EXPUNGE', 'FETCH', 'RECENT')):
+        """
+        Run one IDLE command until the server sends one of the ``changes``
+        responses or ``timeout`` seconds passed.
+        """
+        async with self._lock:
+            tag = self._new_tag()
+            await self.send(tag + b' IDLE\r\n')
+            self.continuation = None
+            while self.continuation is None:
+                tagged = await self.read_response()
+                if tagged is not None and tagged.startswith(tag + b' '):
+                    raise self.error("IDLE command error: {}".format(tagged.decode('utf-8', 'replace')))
+
+            loop = asyncio.get_event_loop()
+            deadline = loop.time() + timeout
+            while not any(name in self.untagged_responses for name in changes):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self.read_response(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            await self.send(b'DONE\r\n')
+            while True:
+                tagged = await self.read_response()
+                if tagged is not None and tagged.startswith(tag + b' '):
+                    status = tagged[len(tag) + 1:].split(b' ', 1)[0].decode('ascii')
+                    if status != 'OK':
+                        raise self.error("IDLE command error: {}".format(tagged.decode('utf-8', 'replace')))
+                    return status, [self.untagged_responses.pop(name, None) for name in changes]
+
+    async def noop(self):
+        return await self.command('NOOP', response='OK')
+
+    async def expunge(self):
+        return await self.command('EXPUNGE')
+
+    async def close(self):
+        return await self.command('CLOSE', response='OK')
+
+    async def logout(self):
+        try:
+            status, data = await self.command('LOGOUT', response='BYE')
+        except self.abort:
+            status, data = 'BYE', [None]
+        self.writer.close()
+        return status, data
+
+
+class AsyncImapTransport:
+    """
+    The asyncio counterpart of ``ImapTransport``.
+    """
+
+    def __init__(self, hostname, port=None, ssl=True, ssl_context=None, starttls=False):
+        self.hostname = hostname
+        self.ssl = ssl
+        self.starttls = starttls
+        self.ssl_context = ssl_context
+        self.server = None
+
+        if ssl:
+            self.port = port or 993
+            if self.ssl_context is None:
+                self.ssl_context = pythonssllib.create_default_context()
+        else:
+            self.port = port or 143
+
+    async def open(self):
+        reader, writer = await asyncio.open_connection(
+            self.hostname, self.port, ssl=self.ssl_context if self.ssl else None)
+        self.server = AsyncIMAP4(reader, writer)
+        await self.server.read_response()
+
+        if self.starttls:
+            status, _ = await self.server.command('STARTTLS', response='OK')
+            if status != 'OK':
+                raise imaplib.IMAP4.error("STARTTLS failed")
+            if not hasattr(writer, 'start_tls'):
+                raise imaplib.IMAP4.error("STARTTLS with asyncio requires Python 3.11 or newer")
+            await writer.start_tls(self.ssl_context or pythonssllib.create_default_context())
+
+        await self.server.capability()
+        logger.debug("Created async IMAP4 transport for {host}:{port}"
+                     .format(host=self.hostname, port=self.port))
+        return self.server
+
+    async def list_folders(self):
+        logger.debug("List all folders in mailbox")
+        return await self.server.list()
+
+    async def connect(self, username, password):
+        if self.server is None:
+            await self.open()
+        await self.server.login(username, password)
+        await self.server.select()
+        logger.debug("Logged into server {} and selected mailbox 'INBOX'"
+                     .format(self.hostname))
+        return self.server
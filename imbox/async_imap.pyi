@@ -0,0 +1,55 @@
+import asyncio
+from ssl import SSLContext
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+ResponseData = List[Union[None, bytes, Tuple[bytes, bytes]]]
+
+def quote(value: str) -> str: ...
+
+
+class AsyncIMAP4:
+    capabilities: Tuple[str, ...]
+    untagged_responses: Dict[str, ResponseData]
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None: ...
+
+    async def read_response(self) -> Optional[bytes]: ...
+
+    async def send(self, data: bytes) -> None: ...
+
+    async def command(self, name: str, *args: Any, response: Optional[str] = None) -> Tuple[str, ResponseData]: ...
+
+    def response(self, code: str) -> Tuple[str, ResponseData]: ...
+
+    async def capability(self) -> Tuple[str, ResponseData]: ...
+
+    async def login(self, username: str, password: str) -> Tuple[str, ResponseData]: ...
+
+    async def select(self, mailbox: str = 'INBOX', readonly: bool = False) -> Tuple[str, ResponseData]: ...
+
+    async def uid(self, command: str, *args: Any) -> Tuple[str, ResponseData]: ...
+
+    async def list(self, directory: str = '""', pattern: str = '*') -> Tuple[str, ResponseData]: ...
+
+    async def idle(self, timeout: float,
+                   changes: Tuple[str, ...] = ...) -> Tuple[str, List[Optional[list]]]: ...
+
+    async def noop(self) -> Tuple[str, ResponseData]: ...
+
+    async def expunge(self) -> Tuple[str, ResponseData]: ...
+
+    async def close(self) -> Tuple[str, ResponseData]: ...
+
+    async def logout(self) -> Tuple[str, ResponseData]: ...
+
+
+class AsyncImapTransport:
+
+    def __init__(self, hostname: str, port: Optional[int], ssl: bool,
+                 ssl_context: Optional[SSLContext], starttls: bool) -> None: ...
+
+    async def open(self) -> AsyncIMAP4: ...
+
+    async def list_folders(self) -> Tuple[str, List[bytes]]: ...
+
+    async def connect(self, username: str, password: str) -> AsyncIMAP4: ...
@@ -0,0 +1,273 @@
+import asyncio
+import imaplib
+from functools import partial
+
+import logging
+
+from imbox.async_imap import AsyncImapTransport
+from imbox.idle import CHANGE_RESPONSES, IDLE_TIMEOUT
+from imbox.messages import Messages
+from imbox.parser import (EMAIL_FETCH_ITEMS, HEADERS_FETCH_ITEMS, ENVELOPE_FETCH_ITEMS, Struct,
+                          parse_fetched_email, parse_fetched_headers, parse_fetched_envelope,
+                          select_responses)
+from imbox.query import build_search_query
+from imbox.utils import UidList, chunked, quote_mailbox, uids_to_sequence_set
+from imbox.vendors import GmailMessages, hostname_vendorname_dict, name_authentication_string_dict
+from imbox.vendors.helpers import merge_two_dicts
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMessages:
+    """
+    The asyncio counterpart of ``Messages``, iterated with ``async for``.
+
+    The folder selection and UID search run on first iteration (or
+    ``await messages.uids()``).
+    In ``headers_only`` and ``envelope`` modes the returned Structs have no
+    body; use ``AsyncImbox.fetch(uid)`` to download a whole message.
+    """
+
+    IMAP_ATTRIBUTE_LOOKUP = Messages.IMAP_ATTRIBUTE_LOOKUP
+
+    FOLDER_LOOKUP = {}
+
+    FETCH_CHUNK_SIZE = Messages.FETCH_CHUNK_SIZE
+
+    def __init__(self,
+                 connection,
+                 parser_policy,
+                 fetch_chunk_size=None,
+                 headers_only=False,
+                 envelope=False,
+                 select=None,
+                 **kwargs):
+
+        self.connection = connection
+        self._select = select
+        self.parser_policy = parser_policy
+        self.fetch_chunk_size = fetch_chunk_size or self.FETCH_CHUNK_SIZE
+        self.headers_only = headers_only
+        self.envelope = envelope
+        self.kwargs = kwargs
+        self._uid_list = None
+
+    async def _query_uids(self, **kwargs):
+        query_ = build_search_query(self.IMAP_ATTRIBUTE_LOOKUP, **kwargs)
+        _, data = await self.connection.uid('search', None, query_)
+        return UidList.from_search(data[0])
+
+    async def uids(self):
+        if self._select is not None:
+            await self._select()
+            self._select = None
+        if self._uid_list is None:
+            self._uid_list = await self._query_uids(**self.kwargs)
+            logger.debug("Fetch all messages for UID in {}".format(self._uid_list))
+        return self._uid_list
+
+    def _build_email(self, response):
+        if self.envelope:
+            return Struct(**parse_fetched_envelope(response))
+        if self.headers_only:
+            return Struct(**parse_fetched_headers(response, self.parser_policy))
+        return parse_fetched_email(response, self.parser_policy)
+
+    async def _fetch_emails(self, uids):
+        items, required = EMAIL_FETCH_ITEMS
+        if self.envelope:
+            items, required = ENVELOPE_FETCH_ITEMS
+        elif self.headers_only:
+            items, required = HEADERS_FETCH_ITEMS
+
+        _, data = await self.connection.uid('fetch', uids_to_sequence_set(uids), items)
+        return [(uid, self._build_email(response))
+                for uid, response in select_responses(uids, data, required)]
+
+    async def _fetch_email_list(self):
+        for chunk in chunked(await self.uids(), self.fetch_chunk_size):
+            for uid, email_object in await self._fetch_emails(chunk):
+                yield uid, email_object
+
+    def __repr__(self):
+        if len(self.kwargs) > 0:
+            return 'AsyncMessages({})'.format('\n'.join('{}={}'.format(key, value)
+                                                        for key, value in self.kwargs.items()))
+        return 'AsyncMessages(ALL)'
+
+    def __aiter__(self):
+        return self._fetch_email_list()
+
+
+class AsyncGmailMessages(AsyncMessages):
+
+    IMAP_ATTRIBUTE_LOOKUP = merge_two_dicts(Messages.IMAP_ATTRIBUTE_LOOKUP,
+                                            GmailMessages.GMAIL_IMAP_ATTRIBUTE_LOOKUP_DIFF)
+
+    FOLDER_LOOKUP = GmailMessages.FOLDER_LOOKUP
+
+
+class AsyncImbox:
+    """
+    The asyncio counterpart of ``Imbox``.
+
+    The connection is opened by ``await imbox.connect()`` or by entering
+    ``async with AsyncImbox(...) as imbox``.
+    """
+
+    authentication_error_message = None
+
+    def __init__(self, hostname, username=None, password=None, ssl=True,
+                 port=None, ssl_context=None, policy=None, starttls=False,
+                 vendor=None):
+
+        self.server = AsyncImapTransport(hostname, ssl=ssl, port=port,
+                                         ssl_context=ssl_context, starttls=starttls)
+
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.parser_policy = policy
+        self.vendor = vendor or hostname_vendorname_dict.get(self.hostname)
+        self.connection = None
+        self.selected_folder = None
+
+        if self.vendor is not None:
+            self.authentication_error_message = name_authentication_string_dict.get(
+                self.vendor)
+
+    async def connect(self):
+        try:
+            self.connection = await self.server.connect(self.username, self.password)
+        except imaplib.IMAP4.error as e:
+            if self.authentication_error_message is None:
+                raise
+            raise imaplib.IMAP4.error(
+                self.authentication_error_message + '\n' + str(e))
+
+        self.selected_folder = 'INBOX'
+        logger.info("Connected to IMAP Server with user {username} on {hostname}".format(
+            hostname=self.hostname, username=self.username))
+        return self
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, type, value, traceback):
+        await self.logout()
+
+    async def logout(self):
+        await self.connection.close()
+        await self.connection.logout()
+        logger.info("Disconnected from IMAP Server {username}@{hostname}".format(
+            hostname=self.hostname, username=self.username))
+
+    async def mark_seen(self, uid):
+        logger.info("Mark UID {} with \\Seen FLAG".format(int(uid)))
+        await self.connection.uid('STORE', uid, '+FLAGS', '(\\Seen)')
+
+    async def mark_flag(self, uid):
+        logger.info("Mark UID {} with \\Flagged FLAG".format(int(uid)))
+        await self.connection.uid('STORE', uid, '+FLAGS', '(\\Flagged)')
+
+    async def delete(self, uid):
+        logger.info(
+            "Mark UID {} with \\Deleted FLAG and expunge.".format(int(uid)))
+        await self.connection.uid('STORE', uid, '+FLAGS', '(\\Deleted)')
+        await self.connection.expunge()
+
+    async def copy(self, uid, destination_folder):
+        logger.info("Copy UID {} to {} folder".format(
+            int(uid), str(destination_folder)))
+        return await self.connection.uid('COPY', uid, destination_folder)
+
+    async def move(self, uid, destination_folder):
+        logger.info("Move UID {} to {} folder".format(
+            int(uid), str(destination_folder)))
+        status, _ = await self.copy(uid, destination_folder)
+        if status == 'OK':
+            await self.delete(uid)
+
+    def _messages_class(self):
+        if self.vendor == 'gmail':
+            return AsyncGmailMessages
+        return AsyncMessages
+
+    async def select(self, folder):
+        messages_class = self._messages_class()
+        status, data = await self.connection.select(
+            quote_mailbox(messages_class.FOLDER_LOOKUP.get((folder.lower())) or folder))
+        if status == 'OK':
+            self.selected_folder = folder
+        logger.debug("Selected folder '{}': {}".format(folder, status))
+        return status, data
+
+    def messages(self, **kwargs):
+        folder = kwargs.pop('folder', False)
+
+        if folder:
+            kwargs['select'] = partial(self.select, folder)
+            msg = " from folder '{}'".format(folder)
+        else:
+            msg = " from inbox"
+
+        logger.info("Fetch list of messages{}".format(msg))
+
+        return self._messages_class()(connection=self.connection,
+                                      parser_policy=self.parser_policy,
+                                      **kwargs)
+
+    async def fetch(self, uid):
+        """
+        Download and parse the whole message ``uid`` of the selected folder.
+        """
+        _, data = await self.connection.uid('fetch', uid, EMAIL_FETCH_ITEMS[0])
+        for _, response in select_responses([uid], data, EMAIL_FETCH_ITEMS[1]):
+            return parse_fetched_email(response, self.parser_policy)
+        return None
+
+    async def _search_uids(self, criteria):
+        _, data = await self.connection.uid('search', None, criteria)
+        return UidList.from_search(data[0] if data else None).numbers
+
+    async def watch(self, folder='INBOX', fetch=False, idle_timeout=IDLE_TIMEOUT, poll_interval=30):
+        """
+        The asyncio counterpart of ``Imbox.watch``, iterated with ``async for``.
+        """
+        if folder != self.selected_folder:
+            await self.select(folder)
+        logger.info("Watch folder '{}' for new messages".format(folder))
+
+        use_idle = 'IDLE' in self.connection.capabilities
+        last_uid = max(await self._search_uids('UID *') or [0])
+        while True:
+            if use_idle:
+                _, changes = await self.connection.idle(idle_timeout, CHANGE_RESPONSES)
+                changes = dict(zip(CHANGE_RESPONSES, changes))
+            else:
+                await asyncio.sleep(poll_interval)
+                await self.connection.noop()
+                changes = {name: self.connection.untagged_responses.pop(name, None)
+                           for name in CHANGE_RESPONSES}
+
+            if not changes['EXISTS'] and not changes['RECENT']:
+                continue
+
+            uids = [uid for uid in await self._search_uids('UID {}:*'.format(last_uid + 1))
+                    if uid > last_uid]
+            if not uids:
+                continue
+            last_uid = max(uids)
+            uids = [str(uid).encode('ascii') for uid in uids]
+            logger.debug("New messages in '{}': {}".format(folder, uids))
+
+            if fetch:
+                _, data = await self.connection.uid('fetch', uids_to_sequence_set(uids), EMAIL_FETCH_ITEMS[0])
+                for uid, response in select_responses(uids, data, EMAIL_FETCH_ITEMS[1]):
+                    yield uid, parse_fetched_email(response, self.parser_policy)
+            else:
+                for uid in uids:
+                    yield uid
+
+    async def folders(self):
+        return await self.connection.list()
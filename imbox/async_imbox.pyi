@@ -0,0 +1,67 @@
+import datetime
+from email._policybase import Policy
+from ssl import SSLContext
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple, Union
+
+from imbox.async_imap import AsyncIMAP4
+from imbox.parser import Struct
+from imbox.utils import UidList
+
+
+class AsyncMessages:
+
+    FETCH_CHUNK_SIZE: int
+
+    def __init__(self,
+                 connection: AsyncIMAP4,
+                 parser_policy: Optional[Policy],
+                 fetch_chunk_size: Optional[int] = None,
+                 headers_only: bool = False,
+                 envelope: bool = False,
+                 select: Optional[Callable[[], Awaitable[Tuple[str, list]]]] = None,
+                 **kwargs: Union[bool, str, datetime.date]) -> None: ...
+
+    async def uids(self) -> UidList: ...
+
+    def __aiter__(self) -> AsyncIterator[Tuple[bytes, Struct]]: ...
+
+
+class AsyncGmailMessages(AsyncMessages): ...
+
+
+class AsyncImbox:
+
+    selected_folder: Optional[str]
+
+    def __init__(self, hostname: str, username: Optional[str] = None, password: Optional[str] = None,
+                 ssl: bool = True, port: Optional[int] = None, ssl_context: Optional[SSLContext] = None,
+                 policy: Optional[Policy] = None, starttls: bool = False, vendor: Optional[str] = None) -> None: ...
+
+    async def connect(self) -> 'AsyncImbox': ...
+
+    async def __aenter__(self) -> 'AsyncImbox': ...
+
+    async def __aexit__(self, type: Exception, value: str, traceback: object) -> None: ...
+
+    async def logout(self) -> None: ...
+
+    async def mark_seen(self, uid: bytes) -> None: ...
+
+    async def mark_flag(self, uid: bytes) -> None: ...
+
+    async def delete(self, uid: bytes) -> None: ...
+
+    async def copy(self, uid: bytes, destination_folder: Union[bytes, str]) -> Tuple[str, list]: ...
+
+    async def move(self, uid: bytes, destination_folder: Union[bytes, str]) -> None: ...
+
+    async def select(self, folder: str) -> Tuple[str, list]: ...
+
+    def messages(self, **kwargs: Union[bool, str, datetime.date]) -> AsyncMessages: ...
+
+    async def fetch(self, uid: bytes) -> Optional[Struct]: ...
+
+    def watch(self, folder: str = 'INBOX', fetch: bool = False, idle_timeout: float = ...,
+              poll_interval: float = 30) -> AsyncIterator[Union[bytes, Tuple[bytes, Struct]]]: ...
+
+    async def folders(self) -> Tuple[str, List[bytes]]: ...
@@ -0,0 +1,208 @@
+import sqlite3
+import threading
+import time
+
+import logging
+
+from imbox.parser import fetch_raw_by_uids, fetch_responses_by_uids
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    PRIMARY KEY (account, folder)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    raw BLOB NOT NULL,
+    flags TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (account, folder, uidvalidity, uid)
+);
+CREATE INDEX IF NOT EXISTS messages_accessed ON messages (accessed);
+"""
+
+
+def _encode_flags(flags):
+    return ' '.join(flag.decode('utf-8', 'replace') if isinstance(flag, bytes) else flag
+                    for flag in flags)
+
+
+def _decode_flags(flags):
+    return [flag.encode('utf-8') for flag in flags.split()]
+
+
+class MessageCache:
+    """
+    An on-disk SQLite cache of raw messages and their flags.
+
+    Messages are keyed by ``(account, folder, UIDVALIDITY, UID)``, which
+    identifies an immutable message. The cache of a folder is dropped when
+    its UIDVALIDITY changes. When ``max_size`` (in bytes) is set, the least
+    recently used messages are evicted to stay under it.
+    """
+
+    def __init__(self, path, max_size=None):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def folder(self, account, folder, uidvalidity):
+        """
+        Return the cache of one folder, invalidating it if UIDVALIDITY changed.
+        """
+        with self._lock, self._db:
+            row = self._db.execute('SELECT uidvalidity FROM folders WHERE account = ? AND folder = ?',
+                                   (account, folder)).fetchone()
+            if row is not None and row[0] != uidvalidity:
+                logger.info("UIDVALIDITY of {} changed, dropping its cache".format(folder))
+                self._db.execute('DELETE FROM messages WHERE account = ? AND folder = ?',
+                                 (account, folder))
+            if row is None or row[0] != uidvalidity:
+                self._db.execute('INSERT OR REPLACE INTO folders VALUES (?, ?, ?)',
+                                 (account, folder, uidvalidity))
+
+        return FolderCache(self, account, folder, uidvalidity)
+
+    def invalidate(self, account, folder):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM messages WHERE account = ? AND folder = ?', (account, folder))
+            self._db.execute('DELETE FROM folders WHERE account = ? AND folder = ?', (account, folder))
+
+    def get_many(self, account, folder, uidvalidity, uids):
+        """
+        Return ``{uid: (raw_email, flags)}`` for the cached ``uids``.
+        """
+        uids = [int(uid) for uid in uids]
+        found = {}
+        with self._lock, self._db:
+            # Stay well under the SQLite limit of bound parameters
+            for start in range(0, len(uids), 500):
+                batch = uids[start:start + 500]
+                rows = self._db.execute(
+                    'SELECT uid, raw, flags FROM messages WHERE account = ? AND folder = ? '
+                    'AND uidvalidity = ? AND uid IN ({})'.format(','.join('?' * len(batch))),
+                    [account, folder, uidvalidity] + batch)
+                for uid, raw, flags in rows:
+                    found[uid] = (bytes(raw), _decode_flags(flags))
+
+            self._db.executemany(
+                'UPDATE messages SET accessed = ? WHERE account = ? AND folder = ? '
+                'AND uidvalidity = ? AND uid = ?',
+                [(time.time(), account, folder, uidvalidity, uid) for uid in found])
+        return found
+
+    def put_many(self, account, folder, uidvalidity, messages):
+        """
+        Store ``(uid, raw_email, flags)`` tuples.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(account, folder, uidvalidity, int(uid), raw, _encode_flags(flags), len(raw), now)
+                 for uid, raw, flags in messages])
+            self._evict()
+
+    def update_flags(self, account, folder, uidvalidity, flags_by_uid):
+        with self._lock, self._db:
+            self._db.executemany(
+                'UPDATE messages SET flags = ? WHERE account = ? AND folder = ? '
+                'AND uidvalidity = ? AND uid = ?',
+                [(_encode_flags(flags), account, folder, uidvalidity, int(uid))
+                 for uid, flags in flags_by_uid.items()])
+
+    def size(self):
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM messages').fetchone()[0]
+
+    def _evict(self):
+        if self.max_size is None:
+            return
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM messages').fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        evicted = 0
+        rows = self._db.execute('SELECT rowid, size FROM messages ORDER BY accessed').fetchall()
+        rowids = []
+        for rowid, size in rows:
+            if total <= self.max_size:
+                break
+            rowids.append((rowid,))
+            total -= size
+            evicted += 1
+        self._db.executemany('DELETE FROM messages WHERE rowid = ?', rowids)
+        logger.debug("Evicted {} messages from the cache".format(evicted))
+
+
+class FolderCache:
+    """
+    The part of a MessageCache for one folder at one UIDVALIDITY.
+    """
+
+    def __init__(self, cache, account, folder, uidvalidity):
+        self.cache = cache
+        self.account = account
+        self.folder = folder
+        self.uidvalidity = uidvalidity
+
+    def get_many(self, uids):
+        return self.cache.get_many(self.account, self.folder, self.uidvalidity, uids)
+
+    def put_many(self, messages):
+        self.cache.put_many(self.account, self.folder, self.uidvalidity, messages)
+
+    def update_flags(self, flags_by_uid):
+        self.cache.update_flags(self.account, self.folder, self.uidvalidity, flags_by_uid)
+
+    def fetch_raw_by_uids(self, uids, connection):
+        """
+        Like ``parser.fetch_raw_by_uids``, serving cached messages locally.
+
+        Only the flags of cached messages, which may have changed, are asked
+        to the server, with one cheap ``UID FETCH (FLAGS)`` command.
+        """
+        cached = self.get_many(uids)
+        seen = set(cached)
+        logger.debug("{} of {} messages found in cache".format(len(cached), len(uids)))
+
+        if cached:
+            flags = {uid: list(response.get('FLAGS') or [])
+                     for uid, response in fetch_responses_by_uids(
+                         [uid for uid in uids if int(uid) in cached], connection, '(FLAGS)', 'FLAGS')}
+            self.update_flags(flags)
+            # Messages missing from the response were expunged meanwhile
+            cached = {int(uid): (cached[int(uid)][0], uid_flags) for uid, uid_flags in flags.items()}
+
+        missing = [uid for uid in uids if int(uid) not in cached and int(uid) not in seen]
+        fetched = {}
+        if missing:
+            downloaded = list(fetch_raw_by_uids(missing, connection))
+            self.put_many(downloaded)
+            fetched = {int(uid): (raw, flags) for uid, raw, flags in downloaded}
+
+        for uid in uids:
+            message = cached.get(int(uid)) or fetched.get(int(uid))
+            if message is not None:
+                yield (uid,) + message
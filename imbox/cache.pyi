@@ -0,0 +1,51 @@
+from imaplib import IMAP4_SSL
+from inspect import Traceback
+from typing import Dict, Generator, Iterable, List, Optional, Tuple, Union
+
+Flags = List[bytes]
+
+
+class MessageCache:
+    path: str
+    max_size: Optional[int]
+
+    def __init__(self, path: str, max_size: Optional[int] = None) -> None: ...
+
+    def __enter__(self) -> 'MessageCache': ...
+
+    def __exit__(self, type: Exception, value: str, traceback: Traceback) -> None: ...
+
+    def close(self) -> None: ...
+
+    def folder(self, account: str, folder: str, uidvalidity: int) -> 'FolderCache': ...
+
+    def invalidate(self, account: str, folder: str) -> None: ...
+
+    def get_many(self, account: str, folder: str, uidvalidity: int,
+                 uids: Iterable[Union[bytes, int]]) -> Dict[int, Tuple[bytes, Flags]]: ...
+
+    def put_many(self, account: str, folder: str, uidvalidity: int,
+                 messages: Iterable[Tuple[Union[bytes, int], bytes, Flags]]) -> None: ...
+
+    def update_flags(self, account: str, folder: str, uidvalidity: int,
+                     flags_by_uid: Dict[Union[bytes, int], Flags]) -> None: ...
+
+    def size(self) -> int: ...
+
+
+class FolderCache:
+    cache: MessageCache
+    account: str
+    folder: str
+    uidvalidity: int
+
+    def __init__(self, cache: MessageCache, account: str, folder: str, uidvalidity: int) -> None: ...
+
+    def get_many(self, uids: Iterable[Union[bytes, int]]) -> Dict[int, Tuple[bytes, Flags]]: ...
+
+    def put_many(self, messages: Iterable[Tuple[Union[bytes, int], bytes, Flags]]) -> None: ...
+
+    def update_flags(self, flags_by_uid: Dict[Union[bytes, int], Flags]) -> None: ...
+
+    def fetch_raw_by_uids(self, uids: List[bytes],
+                          connection: IMAP4_SSL) -> Generator[Tuple[bytes, bytes, Flags], None, None]: ...
@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+import chardet
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bytes of a payload handed to the statistical detector
+DETECTION_SAMPLE_SIZE = 32 * 1024
+
+
+def chardet_detect(sample):
+    return chardet.detect(sample).get('encoding')
+
+
+def charset_normalizer_detect(sample):
+    from charset_normalizer import from_bytes
+
+    best = from_bytes(sample).best()
+    return best.encoding if best is not None else None
+
+
+class CharsetDetector:
+    """
+    Guess the charset of a payload whose declared charset is unknown.
+
+    The payload is first checked to be valid UTF-8 (ASCII included), then
+    tried with each of ``candidates``, whose first strict decoding wins.
+    Only then is ``statistical`` (``chardet_detect`` by default, or
+    ``charset_normalizer_detect`` or any function of bytes returning an
+    encoding or None) run on the first ``sample_size`` bytes.
+
+    Statistical results are remembered per (sender, declared charset) pair,
+    up to ``cache_size`` pairs, since a sender mislabels its mail the same
+    way; a remembered encoding is used only if it strictly decodes the
+    payload.
+    """
+
+    def __init__(self, candidates=(), statistical=chardet_detect,
+                 sample_size=DETECTION_SAMPLE_SIZE, cache_size=1024):
+        self.candidates = tuple(candidates)
+        self.statistical = statistical
+        self.sample_size = sample_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        with self._lock:
+            encoding = self._cache.get(key)
+            if encoding is not None:
+                self._cache.move_to_end(key)
+            return encoding
+
+    def _remember(self, key, encoding):
+        with self._lock:
+            self._cache[key] = encoding
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _decodes(content, encoding):
+        try:
+            content.decode(encoding)
+            return True
+        except (UnicodeDecodeError, LookupError):
+            return False
+
+    def detect(self, content, label=None, sender=None):
+        """
+        Return the encoding of ``content`` declared as ``label`` by
+        ``sender``, or None when it cannot be told.
+        """
+        if self._decodes(content, 'utf-8'):
+            return 'utf-8'
+
+        # Only a statistical guess is remembered, and used again only when
+        # it decodes this content too
+        key = (sender, label.lower()) if label is not None else None
+        if key is not None:
+            encoding = self._cached(key)
+            if encoding is not None and self._decodes(content, encoding):
+                return encoding
+
+        for candidate in self.candidates:
+            if self._decodes(content, candidate):
+                return candidate
+
+        if self.statistical is None:
+            return None
+        logger.debug("Running the statistical charset detector on %s bytes",
+                     min(len(content), self.sample_size))
+        encoding = self.statistical(content[:self.sample_size])
+        if key is not None and encoding is not None:
+            self._remember(key, encoding)
+        return encoding
+
+
+default_detector = CharsetDetector()
+
+
+def set_default_detector(detector):
+    """
+    Replace the detector used when ``parse_email`` is given none.
+    """
+    global default_detector
+    default_detector = detector
@@ -0,0 +1,26 @@
+from typing import Callable, Iterable, Optional
+
+DETECTION_SAMPLE_SIZE: int
+
+def chardet_detect(sample: bytes) -> Optional[str]: ...
+
+def charset_normalizer_detect(sample: bytes) -> Optional[str]: ...
+
+
+class CharsetDetector:
+    candidates: tuple
+    statistical: Optional[Callable[[bytes], Optional[str]]]
+    sample_size: int
+    cache_size: int
+
+    def __init__(self, candidates: Iterable[str] = (),
+                 statistical: Optional[Callable[[bytes], Optional[str]]] = ...,
+                 sample_size: int = ..., cache_size: int = 1024) -> None: ...
+
+    def detect(self, content: bytes, label: Optional[str] = None,
+               sender: Optional[str] = None) -> Optional[str]: ...
+
+
+default_detector: CharsetDetector
+
+def set_default_detector(detector: CharsetDetector) -> None: ...
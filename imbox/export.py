@@ -0,0 +1,362 @@
+import argparse
+import datetime
+import getpass
+import json
+import os
+import re
+import sys
+import time
+
+import logging
+
+from imbox.parser import fetch_responses_by_uids, parse_fetched_headers
+from imbox.paging import search_uid_numbers
+from imbox.utils import UidList, chunked
+
+logger = logging.getLogger(__name__)
+
+# Bounds of the messages downloaded by one UID FETCH, held in memory at once
+EXPORT_CHUNK_SIZE = 100
+EXPORT_CHUNK_BYTES = 16 * 1024 ** 2
+
+# Number of UIDs whose RFC822.SIZE is asked in one command
+SIZE_CHUNK_SIZE = 1000
+
+RAW_FETCH_ITEMS = ('(BODY.PEEK[] FLAGS INTERNALDATE)', 'BODY[]')
+METADATA_FETCH_ITEMS = ('(BODY.PEEK[HEADER] RFC822.SIZE FLAGS INTERNALDATE)', 'BODY[HEADER]')
+
+FROM_LINE_RE = re.compile(rb'^(>*From )', re.MULTILINE)
+UNSAFE_FILENAME_RE = re.compile(r'[^\w.@+ -]')
+
+
+def folder_filename(folder):
+    """A file name for ``folder``, with path separators and such replaced"""
+    return UNSAFE_FILENAME_RE.sub('_', folder).strip('. ') or '_'
+
+
+def _internaldate(response):
+    value = response.get('INTERNALDATE')
+    if isinstance(value, bytes):
+        value = value.decode('ascii', 'replace')
+    try:
+        return datetime.datetime.strptime(value.strip(), '%d-%b-%Y %H:%M:%S %z')
+    except (AttributeError, ValueError):
+        return None
+
+
+def _text(value):
+    return value.decode('utf-8', 'replace') if isinstance(value, bytes) else value
+
+
+class FileExporter:
+    """
+    Writes the messages of each folder to one file, ``<folder><extension>``
+    in the destination directory, appended to when an export resumes.
+
+    ``position`` is saved in checkpoints after ``flush``; resuming
+    truncates the file back to it, so that messages written after the last
+    checkpoint are not written twice.
+    """
+
+    extension = ''
+    fetch_items = RAW_FETCH_ITEMS
+
+    def __init__(self, destination):
+        self.destination = destination
+        self.file = None
+        os.makedirs(destination, exist_ok=True)
+
+    def open_folder(self, folder, position=0):
+        self.close()
+        path = os.path.join(self.destination, folder_filename(folder) + self.extension)
+        self.file = open(path, 'ab')
+        self.file.truncate(position)
+        self.file.seek(position)
+        self.folder = folder
+
+    def position(self):
+        return self.file.tell()
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class MboxExporter(FileExporter):
+    """
+    Writes mbox files in the mboxrd format: a ``From`` separator line with
+    the INTERNALDATE of the message, ``>``-quoted ``From`` lines and LF line
+    endings. The messages are otherwise written as the server sent them.
+    """
+
+    extension = '.mbox'
+
+    def write(self, uid, response):
+        raw_email = response['BODY[]'].replace(b'\r\n', b'\n')
+        date = _internaldate(response)
+        timestamp = time.gmtime(date.timestamp() if date is not None else 0)
+        self.file.write('From MAILER-DAEMON {}\n'.format(time.asctime(timestamp)).encode())
+        self.file.write(FROM_LINE_RE.sub(rb'>\1', raw_email))
+        self.file.write(b'\n' if raw_email.endswith(b'\n') else b'\n\n')
+        return len(response['BODY[]'])
+
+
+class JsonlExporter(FileExporter):
+    """
+    Writes one JSON object of metadata per message, downloading only the
+    headers: folder, uid, flags, size, internaldate, subject, addresses,
+    date and message id.
+    """
+
+    extension = '.jsonl'
+    fetch_items = METADATA_FETCH_ITEMS
+
+    def __init__(self, destination, parser_policy=None):
+        super().__init__(destination)
+        self.parser_policy = parser_policy
+
+    def write(self, uid, response):
+        parsed_email = parse_fetched_headers(response, self.parser_policy)
+        date = _internaldate(response)
+        record = {
+            'folder': self.folder,
+            'uid': int(uid),
+            'flags': [_text(flag) for flag in parsed_email['flags']],
+            'size': parsed_email['size'],
+            'internaldate': date.isoformat() if date is not None else None,
+            'subject': parsed_email.get('subject'),
+            'sent_from': parsed_email.get('sent_from'),
+            'sent_to': parsed_email.get('sent_to'),
+            'cc': parsed_email.get('cc'),
+            'date': parsed_email.get('date'),
+            'message_id': parsed_email.get('message_id'),
+        }
+        self.file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        return len(response['BODY[HEADER]'])
+
+
+class EmlExporter:
+    """
+    Writes every message to ``<folder>/<uid>.eml`` in the destination
+    directory, as the server sent it.
+    """
+
+    fetch_items = RAW_FETCH_ITEMS
+
+    def __init__(self, destination):
+        self.destination = destination
+        self.directory = None
+
+    def open_folder(self, folder, position=0):
+        self.directory = os.path.join(self.destination, folder_filename(folder))
+        os.makedirs(self.directory, exist_ok=True)
+
+    def position(self):
+        return 0
+
+    def write(self, uid, response):
+        with open(os.path.join(self.directory, '{}.eml'.format(int(uid))), 'wb') as eml_file:
+            eml_file.write(response['BODY[]'])
+        return len(response['BODY[]'])
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+EXPORTERS = {
+    'mbox': MboxExporter,
+    'eml': EmlExporter,
+    'jsonl': JsonlExporter,
+}
+
+
+class Checkpoint:
+    """
+    The progress of an export, per folder: its UIDVALIDITY, the last UID
+    written and the ``position`` of the exporter, saved as JSON in ``path``
+    (atomically) after every chunk. A folder whose UIDVALIDITY changed is
+    exported again from the start.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.folders = {}
+        if path is not None and os.path.exists(path):
+            with open(path, encoding='utf-8') as checkpoint_file:
+                self.folders = json.load(checkpoint_file).get('folders', {})
+
+    def folder(self, folder, uidvalidity):
+        state = self.folders.get(folder)
+        if state is None or state['uidvalidity'] != uidvalidity:
+            if state is not None:
+                logger.info("UIDVALIDITY of {} changed, exporting it again".format(folder))
+            state = self.folders[folder] = {'uidvalidity': uidvalidity, 'last_uid': 0, 'position': 0}
+        return state
+
+    def save(self):
+        if self.path is None:
+            return
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump({'folders': self.folders}, checkpoint_file)
+        os.replace(temporary_path, self.path)
+
+
+class ExportProgress:
+    """
+    Totals of an export so far, handed to the ``report`` callback after
+    every chunk.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.folder = None
+        self.messages = 0
+        self.bytes = 0
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def messages_per_second(self):
+        return self.messages / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mb_per_second(self):
+        return self.bytes / self.elapsed / 1024 ** 2 if self.elapsed else 0.0
+
+    def __str__(self):
+        return '{}: {} messages, {:.1f} MB in {:.0f} s ({:.1f} msg/s, {:.2f} MB/s)'.format(
+            self.folder, self.messages, self.bytes / 1024 ** 2, self.elapsed,
+            self.messages_per_second, self.mb_per_second)
+
+
+def _size_chunks(connection, uids, chunk_size, chunk_bytes):
+    """
+    Split ``uids`` into chunks of at most ``chunk_size`` messages and
+    ``chunk_bytes`` bytes (a larger message makes a chunk of its own).
+    """
+    chunk, size = [], 0
+    for uid_chunk in chunked(uids, SIZE_CHUNK_SIZE):
+        for uid, response in fetch_responses_by_uids(uid_chunk, connection, '(RFC822.SIZE)', 'RFC822.SIZE'):
+            message_size = response['RFC822.SIZE']
+            if chunk and (len(chunk) >= chunk_size or size + message_size > chunk_bytes):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(uid)
+            size += message_size
+    if chunk:
+        yield chunk
+
+
+def export_folder(imbox, folder, exporter, checkpoint=None, chunk_size=EXPORT_CHUNK_SIZE,
+                  chunk_bytes=EXPORT_CHUNK_BYTES, progress=None, report=None):
+    """
+    Export the messages of ``folder`` above the UID of the checkpoint, in
+    UID order, and return the ExportProgress.
+
+    Messages are fetched in chunks bounded by ``chunk_size`` and
+    ``chunk_bytes``, and only one chunk is held in memory.
+    """
+    checkpoint = checkpoint or Checkpoint(None)
+    progress = progress or ExportProgress()
+    progress.folder = folder
+
+    connection = imbox.connection
+    status, data = imbox.select(folder)
+    if status != 'OK':
+        raise connection.error("Cannot select {}: {}".format(folder, data))
+    state = checkpoint.folder(folder, imbox.uidvalidity)
+
+    uids = UidList(uid for uid in search_uid_numbers(connection, 'UID {}:*'.format(state['last_uid'] + 1))
+                   if uid > state['last_uid'])
+    logger.info("Exporting {} messages of {}".format(len(uids), folder))
+
+    exporter.open_folder(folder, state['position'])
+    try:
+        chunks = [uids] if exporter.fetch_items is METADATA_FETCH_ITEMS else _size_chunks(
+            connection, uids, chunk_size, chunk_bytes)
+        for size_chunk in chunks:
+            for chunk in chunked(size_chunk, chunk_size):
+                for uid, response in fetch_responses_by_uids(chunk, connection, *exporter.fetch_items):
+                    progress.bytes += exporter.write(uid, response)
+                    progress.messages += 1
+
+                exporter.flush()
+                state['last_uid'] = max(int(uid) for uid in chunk)
+                state['position'] = exporter.position()
+                checkpoint.save()
+                if report is not None:
+                    report(progress)
+    finally:
+        exporter.close()
+    return progress
+
+
+def export(imbox, exporter, folders=None, checkpoint=None, chunk_size=EXPORT_CHUNK_SIZE,
+           chunk_bytes=EXPORT_CHUNK_BYTES, report=None):
+    """
+    Export ``folders`` (all the selectable folders by default) with
+    ``exporter``, an MboxExporter, EmlExporter or JsonlExporter, and return
+    the ExportProgress.
+
+    ``checkpoint`` is a Checkpoint or the path of one, to resume an
+    interrupted export; ``report`` is called with the ExportProgress after
+    every chunk.
+    """
+    if not isinstance(checkpoint, Checkpoint):
+        checkpoint = Checkpoint(checkpoint)
+    progress = ExportProgress()
+    for folder in folders or imbox.folder_names():
+        export_folder(imbox, folder, exporter, checkpoint, chunk_size, chunk_bytes, progress, report)
+    return progress
+
+
+def main(argv=None):
+    from imbox import Imbox
+
+    parser = argparse.ArgumentParser(prog='imbox-export',
+                                     description='Export IMAP folders to mbox files, EML files or JSONL metadata.')
+    parser.add_argument('hostname')
+    parser.add_argument('destination', help='directory of the exported files')
+    parser.add_argument('-u', '--username', required=True)
+    parser.add_argument('--password', help='defaults to $IMBOX_PASSWORD, or is prompted for')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--no-ssl', dest='ssl', action='store_false')
+    parser.add_argument('--starttls', action='store_true')
+    parser.add_argument('-f', '--format', choices=sorted(EXPORTERS), default='mbox')
+    parser.add_argument('--folder', action='append', dest='folders',
+                        help='folder to export, may be repeated (default: all)')
+    parser.add_argument('--checkpoint', help='checkpoint file (default: <destination>/.imbox-export.json)')
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+    parser.add_argument('--chunk-mb', type=float, default=EXPORT_CHUNK_BYTES / 1024 ** 2)
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    password = args.password or os.environ.get('IMBOX_PASSWORD') or getpass.getpass()
+    exporter = EXPORTERS[args.format](args.destination)
+    checkpoint = args.checkpoint or os.path.join(args.destination, '.imbox-export.json')
+
+    def report(progress):
+        print(progress, file=sys.stderr)
+
+    with Imbox(args.hostname, username=args.username, password=password, ssl=args.ssl,
+               port=args.port, starttls=args.starttls) as imbox:
+        progress = export(imbox, exporter, args.folders, checkpoint, args.chunk_size,
+                          int(args.chunk_mb * 1024 ** 2), None if args.quiet else report)
+    if not args.quiet:
+        print(progress, file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+from email._policybase import Policy
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from imbox.imbox import Imbox
+
+EXPORT_CHUNK_SIZE: int
+EXPORT_CHUNK_BYTES: int
+
+def folder_filename(folder: str) -> str: ...
+
+
+class FileExporter:
+    extension: str
+    fetch_items: Tuple[str, str]
+
+    def __init__(self, destination: str) -> None: ...
+
+    def open_folder(self, folder: str, position: int = 0) -> None: ...
+
+    def position(self) -> int: ...
+
+    def write(self, uid: bytes, response: Dict[str, Any]) -> int: ...
+
+    def flush(self) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class MboxExporter(FileExporter): ...
+
+
+class JsonlExporter(FileExporter):
+
+    def __init__(self, destination: str, parser_policy: Optional[Policy] = None) -> None: ...
+
+
+class EmlExporter(FileExporter): ...
+
+
+EXPORTERS: Dict[str, type]
+
+
+class Checkpoint:
+    path: Optional[str]
+    folders: Dict[str, Dict[str, int]]
+
+    def __init__(self, path: Optional[str]) -> None: ...
+
+    def folder(self, folder: str, uidvalidity: Optional[int]) -> Dict[str, int]: ...
+
+    def save(self) -> None: ...
+
+
+class ExportProgress:
+    folder: Optional[str]
+    messages: int
+    bytes: int
+
+    @property
+    def elapsed(self) -> float: ...
+
+    @property
+    def messages_per_second(self) -> float: ...
+
+    @property
+    def mb_per_second(self) -> float: ...
+
+
+def export_folder(imbox: Imbox, folder: str, exporter: FileExporter,
+                  checkpoint: Optional[Checkpoint] = None, chunk_size: int = ...,
+                  chunk_bytes: int = ..., progress: Optional[ExportProgress] = None,
+                  report: Optional[Callable[[ExportProgress], None]] = None) -> ExportProgress: ...
+
+def export(imbox: Imbox, exporter: FileExporter, folders: Optional[Sequence[str]] = None,
+           checkpoint: Optional[Union[Checkpoint, str]] = None, chunk_size: int = ...,
+           chunk_bytes: int = ...,
+           report: Optional[Callable[[ExportProgress], None]] = None) -> ExportProgress: ...
+
+def main(argv: Optional[List[str]] = None) -> int: ...
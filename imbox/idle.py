@@ -0,0 +1,120 @@
+import select
+import ssl
+import time
+
+import logging
+
+from imbox.paging import search_uid_numbers
+
+logger = logging.getLogger(__name__)
+
+# RFC 2177 servers may end an IDLE after 30 minutes of inactivity, so it is
+# re-issued well before that.
+IDLE_TIMEOUT = 25 * 60
+
+# Untagged responses telling that the selected mailbox changed
+CHANGE_RESPONSES = ('EXISTS', 'EXPUNGE', 'FETCH', 'RECENT')
+
+
+def _pop_changes(connection):
+    changes = {}
+    for name in CHANGE_RESPONSES:
+        data = connection.untagged_responses.pop(name, None)
+        if data:
+            changes[name] = data
+    return changes
+
+
+def _has_buffered_data(connection):
+    # Peek without blocking into the buffer of imaplib's file object, where
+    # select() cannot see responses that came along with the previous one.
+    sock = connection.sock
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        return bool(connection.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        sock.settimeout(timeout)
+
+
+def _wait_readable(connection, timeout):
+    if _has_buffered_data(connection):
+        return True
+    readable, _, _ = select.select([connection.sock], [], [], timeout)
+    return bool(readable)
+
+
+def idle(connection, timeout=IDLE_TIMEOUT):
+    """
+    Run one IDLE command (RFC 2177) on an imaplib connection.
+
+    Returns as soon as the server reports a change of the selected mailbox,
+    or after ``timeout`` seconds, with a dict of the change responses
+    received (EXISTS, EXPUNGE, FETCH, RECENT).
+    """
+    tag = connection._new_tag()
+    connection.send(tag + b' IDLE\r\n')
+
+    while connection._get_response() is not None:
+        if connection.tagged_commands.get(tag) is not None:
+            typ, data = connection.tagged_commands.pop(tag)
+            raise connection.error("IDLE command error: {} {}".format(typ, data))
+
+    logger.debug("Idling for up to {} seconds".format(timeout))
+    deadline = time.monotonic() + timeout
+    while not any(name in connection.untagged_responses for name in CHANGE_RESPONSES):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not _wait_readable(connection, remaining):
+            break
+        connection._get_response()
+        if 'BYE' in connection.untagged_responses:
+            raise connection.abort(connection.untagged_responses['BYE'][-1])
+
+    connection.send(b'DONE\r\n')
+    while connection.tagged_commands.get(tag) is None:
+        connection._get_response()
+
+    typ, data = connection.tagged_commands.pop(tag)
+    if typ != 'OK':
+        raise connection.error("IDLE command error: {} {}".format(typ, data))
+    return _pop_changes(connection)
+
+
+def poll(connection, interval):
+    """
+    The NOOP fallback of ``idle`` for servers without IDLE.
+    """
+    time.sleep(interval)
+    connection.noop()
+    return _pop_changes(connection)
+
+
+def watch(connection, idle_timeout=IDLE_TIMEOUT, poll_interval=30):
+    """
+    Yield lists of the UIDs of messages arriving in the selected mailbox.
+
+    Uses IDLE when the server advertises it and NOOP polling every
+    ``poll_interval`` seconds otherwise. Runs until the generator is closed.
+    """
+    use_idle = 'IDLE' in connection.capabilities
+    # UID * is the highest UID of the mailbox
+    last_uid = max(search_uid_numbers(connection, 'UID *') or [0])
+    _pop_changes(connection)
+    logger.debug("Watching for UIDs above {} with {}".format(last_uid, 'IDLE' if use_idle else 'NOOP'))
+
+    while True:
+        if use_idle:
+            changes = idle(connection, idle_timeout)
+        else:
+            changes = poll(connection, poll_interval)
+
+        if 'EXISTS' not in changes and 'RECENT' not in changes:
+            continue
+
+        uids = [uid for uid in search_uid_numbers(connection, 'UID {}:*'.format(last_uid + 1))
+                if uid > last_uid]
+        if uids:
+            last_uid = max(uids)
+            yield [str(uid).encode('ascii') for uid in uids]
@@ -0,0 +1,11 @@
+from imaplib import IMAP4
+from typing import Dict, Iterator, List, Tuple
+
+IDLE_TIMEOUT: int
+CHANGE_RESPONSES: Tuple[str, ...]
+
+def idle(connection: IMAP4, timeout: float = ...) -> Dict[str, list]: ...
+
+def poll(connection: IMAP4, interval: float) -> Dict[str, list]: ...
+
+def watch(connection: IMAP4, idle_timeout: float = ..., poll_interval: float = 30) -> Iterator[List[bytes]]: ...
@@ -1,3 +1,4 @@
+import time
 from imaplib import IMAP4, IMAP4_SSL
 
 import logging
@@ -6,19 +7,69 @@ import ssl as pythonssllib
 logger = logging.getLogger(__name__)
 
 
+class MeteredMixin:
+    """
+    Records the round trips, their duration and the bytes received by an
+    imaplib connection in ``metrics``.
+    """
+
+    def __init__(self, *args, metrics, **kwargs):
+        self.metrics = metrics
+        self._command_started = None
+        super().__init__(*args, **kwargs)
+
+    def _command(self, name, *args):
+        self.metrics.count('round_trips')
+        self._command_started = time.perf_counter()
+        return super()._command(name, *args)
+
+    def _command_complete(self, name, tag):
+        try:
+            return super()._command_complete(name, tag)
+        finally:
+            if self._command_started is not None:
+                self.metrics.timing('command', time.perf_counter() - self._command_started)
+                self._command_started = None
+
+    def read(self, size):
+        data = super().read(size)
+        self.metrics.count('bytes_received', len(data))
+        return data
+
+    def readline(self):
+        line = super().readline()
+        self.metrics.count('bytes_received', len(line))
+        return line
+
+
+class MeteredIMAP4(MeteredMixin, IMAP4):
+    pass
+
+
+class MeteredIMAP4_SSL(MeteredMixin, IMAP4_SSL):
+    pass
+
+
 class ImapTransport:
 
-    def __init__(self, hostname, port=None, ssl=True, ssl_context=None, starttls=False):
+    def __init__(self, hostname, port=None, ssl=True, ssl_context=None, starttls=False, metrics=None):
         self.hostname = hostname
 
         if ssl:
             self.port = port or 993
             if ssl_context is None:
                 ssl_context = pythonssllib.create_default_context()
-            self.server = IMAP4_SSL(self.hostname, self.port, ssl_context=ssl_context)
+            if metrics is not None:
+                self.server = MeteredIMAP4_SSL(self.hostname, self.port, ssl_context=ssl_context,
+                                               metrics=metrics)
+            else:
+                self.server = IMAP4_SSL(self.hostname, self.port, ssl_context=ssl_context)
         else:
             self.port = port or 143
-            self.server = IMAP4(self.hostname, self.port)
+            if metrics is not None:
+                self.server = MeteredIMAP4(self.hostname, self.port, metrics=metrics)
+            else:
+                self.server = IMAP4(self.hostname, self.port)
 
         if starttls:
             self.server.starttls()
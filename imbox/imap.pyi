@@ -1,12 +1,31 @@
 from imaplib import IMAP4, IMAP4_SSL
 from ssl import SSLContext
-from typing import Optional, Union, Tuple, List
+from typing import Any, Optional, Union, Tuple, List
+
+from imbox.metrics import Metrics
+
+
+class MeteredMixin:
+    metrics: Metrics
+
+    def __init__(self, *args: Any, metrics: Metrics, **kwargs: Any) -> None: ...
+
+    def read(self, size: int) -> bytes: ...
+
+    def readline(self) -> bytes: ...
+
+
+class MeteredIMAP4(MeteredMixin, IMAP4): ...
+
+
+class MeteredIMAP4_SSL(MeteredMixin, IMAP4_SSL): ...
 
 
 class ImapTransport:
 
     def __init__(self, hostname: str, port: Optional[int], ssl: bool,
-                 ssl_context: Optional[SSLContext], starttls: bool) -> None: ...
+                 ssl_context: Optional[SSLContext], starttls: bool,
+                 metrics: Optional[Metrics] = None) -> None: ...
 
     def list_folders(self) -> Tuple[str, List[bytes]]: ...
 
@@ -1,7 +1,15 @@
 import imaplib
 
+from imbox.idle import IDLE_TIMEOUT, watch
 from imbox.imap import ImapTransport
 from imbox.messages import Messages
+from imbox.metrics import NULL_METRICS
+from imbox.parser import fetch_emails_by_uids
+from imbox.query import build_search_query
+from imbox.response import parse_list_response
+from imbox.sync import sync
+from imbox.threads import ThreadIndex, gmail_threads, prune_threads, server_threads
+from imbox.utils import UidList, quote_mailbox
 
 import logging
 
@@ -14,18 +22,25 @@ class Imbox:
 
     authentication_error_message = None
 
+    # Number of UIDs sent in a single STORE/COPY/MOVE/EXPUNGE command
+    BULK_CHUNK_SIZE = 1000
+
     def __init__(self, hostname, username=None, password=None, ssl=True,
                  port=None, ssl_context=None, policy=None, starttls=False,
-                 vendor=None):
+                 vendor=None, cache=None, metrics=None, search_index=None):
 
         self.server = ImapTransport(hostname, ssl=ssl, port=port,
-                                    ssl_context=ssl_context, starttls=starttls)
+                                    ssl_context=ssl_context, starttls=starttls,
+                                    metrics=metrics)
 
         self.hostname = hostname
         self.username = username
         self.password = password
         self.parser_policy = policy
         self.vendor = vendor or hostname_vendorname_dict.get(self.hostname)
+        self.cache = cache
+        self.search_index = search_index
+        self.metrics = metrics or NULL_METRICS
 
         if self.vendor is not None:
             self.authentication_error_message = name_authentication_string_dict.get(
@@ -39,6 +54,9 @@ class Imbox:
             raise imaplib.IMAP4.error(
                 self.authentication_error_message + '\n' + str(e))
 
+        self.selected_folder = 'INBOX'
+        self._read_uidvalidity()
+
         logger.info("Connected to IMAP Server with user {username} on {hostname}{ssl}".format(
             hostname=hostname, username=username, ssl=(" over SSL" if ssl or starttls else "")))
 
@@ -79,17 +97,90 @@ class Imbox:
         if self.copy(uid, destination_folder):
             self.delete(uid)
 
-    def messages(self, **kwargs):
-        folder = kwargs.get('folder', False)
+    def _sequence_sets(self, uids):
+        return UidList(uids).sequence_sets(self.BULK_CHUNK_SIZE)
+
+    def _store_many(self, uids, flag):
+        count = 0
+        for sequence_set in self._sequence_sets(uids):
+            self.connection.uid('STORE', sequence_set, '+FLAGS', flag)
+            count += 1
+        return count
+
+    def mark_seen_many(self, uids):
+        count = self._store_many(uids, '(\\Seen)')
+        logger.info("Marked UIDs with \\Seen FLAG in {} commands".format(count))
+
+    def mark_flag_many(self, uids):
+        count = self._store_many(uids, '(\\Flagged)')
+        logger.info("Marked UIDs with \\Flagged FLAG in {} commands".format(count))
+
+    def delete_many(self, uids):
+        """
+        Mark ``uids`` as deleted and expunge them. With UIDPLUS only these
+        messages are expunged (UID EXPUNGE), otherwise one EXPUNGE is sent
+        at the end.
+        """
+        uids = list(uids)
+        self._store_many(uids, '(\\Deleted)')
+        if 'UIDPLUS' in self.connection.capabilities:
+            for sequence_set in self._sequence_sets(uids):
+                self.connection.uid('EXPUNGE', sequence_set)
+        elif uids:
+            self.connection.expunge()
+        logger.info("Deleted {} UIDs".format(len(uids)))
 
-        messages_class = Messages
+    def copy_many(self, uids, destination_folder):
+        results = [self.connection.uid('COPY', sequence_set, destination_folder)
+                   for sequence_set in self._sequence_sets(uids)]
+        logger.info("Copied UIDs to {} folder in {} commands".format(
+            str(destination_folder), len(results)))
+        return results
 
+    def move_many(self, uids, destination_folder):
+        """
+        Move ``uids`` with UID MOVE (RFC 6851) when the server supports it,
+        otherwise with COPY followed by ``delete_many``.
+        """
+        uids = list(uids)
+        if 'MOVE' in self.connection.capabilities:
+            for sequence_set in self._sequence_sets(uids):
+                status, _ = self.connection.uid('MOVE', sequence_set, destination_folder)
+                if status != 'OK':
+                    raise imaplib.IMAP4.error("Cannot move messages to {}".format(destination_folder))
+        else:
+            results = self.copy_many(uids, destination_folder)
+            if any(status != 'OK' for status, _ in results):
+                raise imaplib.IMAP4.error("Cannot copy messages to {}".format(destination_folder))
+            self.delete_many(uids)
+        logger.info("Moved {} UIDs to {} folder".format(len(uids), str(destination_folder)))
+
+    def _messages_class(self):
         if self.vendor == 'gmail':
-            messages_class = GmailMessages
+            return GmailMessages
+        return Messages
+
+    def _read_uidvalidity(self):
+        _, data = self.connection.response('UIDVALIDITY')
+        self.uidvalidity = int(data[-1]) if data and data[-1] else None
+
+    def select(self, folder):
+        messages_class = self._messages_class()
+        status, data = self.connection.select(
+            quote_mailbox(messages_class.FOLDER_LOOKUP.get((folder.lower())) or folder))
+        if status == 'OK':
+            self.selected_folder = folder
+            self._read_uidvalidity()
+        logger.debug("Selected folder '{}': {}".format(folder, status))
+        return status, data
+
+    def messages(self, **kwargs):
+        folder = kwargs.get('folder', False)
+
+        messages_class = self._messages_class()
 
         if folder:
-            self.connection.select(
-                messages_class.FOLDER_LOOKUP.get((folder.lower())) or folder)
+            self.select(folder)
             msg = " from folder '{}'".format(folder)
             del kwargs['folder']
         else:
@@ -97,9 +188,93 @@ class Imbox:
 
         logger.info("Fetch list of messages{}".format(msg))
 
+        account = '{}@{}'.format(self.username, self.hostname)
+        if self.cache is not None and self.uidvalidity is not None:
+            kwargs.setdefault('cache', self.cache.folder(account, self.selected_folder, self.uidvalidity))
+        if self.search_index is not None and self.uidvalidity is not None:
+            kwargs.setdefault('search_index', self.search_index.folder(
+                account, self.selected_folder, self.uidvalidity))
+
+        kwargs.setdefault('metrics', self.metrics)
+
         return messages_class(connection=self.connection,
                               parser_policy=self.parser_policy,
                               **kwargs)
 
+    def sync(self, folder='INBOX', state=None):
+        """
+        Select ``folder`` and return the new, changed and vanished UIDs since
+        ``state``, the ``SyncResult.state`` of the previous call (or None).
+        """
+        messages_class = self._messages_class()
+        result = sync(self.connection,
+                      quote_mailbox(messages_class.FOLDER_LOOKUP.get(folder.lower()) or folder),
+                      state=state)
+        self.selected_folder = folder
+        self.uidvalidity = result.state.uidvalidity
+        logger.info("Synchronized folder '{}': {} new, {} changed, {} vanished".format(
+            folder, len(result.new), len(result.changed), len(result.vanished)))
+        return result
+
+    def watch(self, folder='INBOX', fetch=False, idle_timeout=IDLE_TIMEOUT, poll_interval=30):
+        """
+        Yield the UIDs of messages arriving in ``folder``, or ``(uid, message)``
+        tuples when ``fetch`` is True, blocking until new mail comes.
+
+        The server pushes changes with IDLE when it supports it; otherwise it
+        is polled with NOOP every ``poll_interval`` seconds.
+        """
+        if folder != self.selected_folder:
+            self.select(folder)
+        logger.info("Watch folder '{}' for new messages".format(folder))
+
+        for uids in watch(self.connection, idle_timeout=idle_timeout, poll_interval=poll_interval):
+            logger.debug("New messages in '{}': {}".format(folder, uids))
+            if fetch:
+                yield from fetch_emails_by_uids(uids, self.connection, self.parser_policy)
+            else:
+                yield from uids
+
+    def threads(self, folder='INBOX', index=None, query=None, **kwargs):
+        """
+        Return the conversations of ``folder`` as a list of ThreadNode trees,
+        restricted to the messages matching the ``Imbox.messages()`` criteria
+        ``kwargs`` and the Q ``query``.
+
+        Threads are built by the server with THREAD=REFERENCES (RFC 5256),
+        from X-GM-THRID on Gmail, or else from the headers of the messages in
+        the ThreadIndex ``index`` (a new in-memory one by default), which is
+        updated with the messages it lacks.
+        """
+        if folder != self.selected_folder:
+            self.select(folder)
+        messages_class = self._messages_class()
+        criteria = build_search_query(messages_class.IMAP_ATTRIBUTE_LOOKUP, query, **kwargs)
+
+        if self.vendor != 'gmail' and 'THREAD=REFERENCES' in self.connection.capabilities:
+            return server_threads(self.connection, criteria)
+
+        _, data = self.connection.uid('search', None, criteria)
+        uids = UidList.from_search(data[0])
+        if self.vendor == 'gmail':
+            return gmail_threads(self.connection, uids)
+
+        if index is None:
+            index = ThreadIndex()
+        index.update(self.connection, self.selected_folder, self.uidvalidity or 0)
+        threads = index.threads(self.selected_folder, self.uidvalidity or 0)
+        if criteria != '(ALL)':
+            threads = prune_threads(threads, set(uids))
+        return threads
+
     def folders(self):
         return self.connection.list()
+
+    def folder_names(self, selectable=True):
+        """
+        The names of the folders of the account, without those that cannot
+        be selected (``\\Noselect``) unless ``selectable`` is False.
+        """
+        _, data = self.connection.list()
+        return [name for flags, _, name in parse_list_response(data)
+                if not selectable or not {'\\noselect', '\\nonexistent'} & {flag.lower() for flag in flags}]
@@ -2,13 +2,28 @@ import datetime
 from email._policybase import Policy
 from inspect import Traceback
 from ssl import SSLContext
-from typing import Optional, Union, Tuple, List
+from imbox.cache import MessageCache
+from imbox.metrics import Metrics
+from imbox.sync import SyncResult, SyncState
+from imbox.parser import Struct
+from imbox.query import Q
+from imbox.search_index import SearchIndex
+from imbox.threads import ThreadIndex, ThreadNode
+from typing import Iterable, Iterator, Optional, Union, Tuple, List
 
 
 class Imbox:
 
+    BULK_CHUNK_SIZE: int
+    selected_folder: str
+    uidvalidity: Optional[int]
+    metrics: Metrics
+    search_index: Optional[SearchIndex]
+
     def __init__(self, hostname: str, username: Optional[str], password: Optional[str], ssl: bool,
-                 port: Optional[int], ssl_context: Optional[SSLContext], policy: Optional[Policy], starttls: bool): ...
+                 port: Optional[int], ssl_context: Optional[SSLContext], policy: Optional[Policy], starttls: bool,
+                 vendor: Optional[str] = None, cache: Optional[MessageCache] = None,
+                 metrics: Optional[Metrics] = None, search_index: Optional[SearchIndex] = None): ...
 
     def __enter__(self) -> 'Imbox': ...
 
@@ -26,6 +41,29 @@ class Imbox:
 
     def move(self, uid: bytes, destination_folder: Union[bytes, str]) -> None: ...
 
+    def mark_seen_many(self, uids: Iterable[Union[bytes, int]]) -> None: ...
+
+    def mark_flag_many(self, uids: Iterable[Union[bytes, int]]) -> None: ...
+
+    def delete_many(self, uids: Iterable[Union[bytes, int]]) -> None: ...
+
+    def copy_many(self, uids: Iterable[Union[bytes, int]],
+                  destination_folder: Union[bytes, str]) -> List[Tuple[str, list]]: ...
+
+    def move_many(self, uids: Iterable[Union[bytes, int]], destination_folder: Union[bytes, str]) -> None: ...
+
+    def select(self, folder: str) -> Tuple[str, List[bytes]]: ...
+
     def messages(self, **kwargs: Union[bool, str, datetime.date]) -> 'Messages': ...
 
-    def folders(self) -> Tuple[str, List[bytes]]: ...
\ No newline at end of file
+    def sync(self, folder: str = 'INBOX', state: Optional[SyncState] = None) -> SyncResult: ...
+
+    def watch(self, folder: str = 'INBOX', fetch: bool = False, idle_timeout: float = ...,
+              poll_interval: float = 30) -> Iterator[Union[bytes, Tuple[bytes, Struct]]]: ...
+
+    def threads(self, folder: str = 'INBOX', index: Optional[ThreadIndex] = None, query: Optional[Q] = None,
+                **kwargs: Union[bool, str, datetime.date]) -> List[ThreadNode]: ...
+
+    def folders(self) -> Tuple[str, List[bytes]]: ...
+
+    def folder_names(self, selectable: bool = True) -> List[str]: ...
\ No newline at end of file
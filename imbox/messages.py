@@ -1,8 +1,17 @@
 import datetime
 import logging
+import time
+from functools import partial
+from concurrent.futures import Executor, ProcessPoolExecutor
 
+from imbox.metrics import NULL_METRICS, use_metrics
+from imbox.paging import search_uids
 from imbox.query import build_search_query
-from imbox.parser import fetch_email_by_uid
+from imbox.parser import (fetch_raw_by_uids, fetch_headers_by_uids,
+                          fetch_envelopes_by_uids, parse_email, parse_raw_email)
+from imbox.storage import SpooledStorage
+from imbox.structure import fetch_previews_by_uids, fetch_structures_by_uids
+from imbox.utils import UidList, chunked
 
 
 logger = logging.getLogger(__name__)
@@ -22,37 +31,210 @@ class Messages:
         'subject': '(SUBJECT "{}")',
         'uid__range': '(UID {})',
         'text': '(TEXT "{}")',
+        'body': '(BODY "{}")',
+        'cc': '(CC "{}")',
+        'bcc': '(BCC "{}")',
+        'seen': '(SEEN)',
+        'answered': '(ANSWERED)',
+        'unanswered': '(UNANSWERED)',
+        'deleted': '(DELETED)',
+        'undeleted': '(UNDELETED)',
+        'draft': '(DRAFT)',
+        'keyword': '(KEYWORD {})',
+        'unkeyword': '(UNKEYWORD {})',
+        'size__gt': '(LARGER {})',
+        'size__lt': '(SMALLER {})',
+        'sent__gt': '(SENTSINCE "{}")',
+        'sent__lt': '(SENTBEFORE "{}")',
+        'sent__on': '(SENTON "{}")',
+        # header__<field>, e.g. header__X-Mailer
+        'header': '(HEADER "{}" "{}")',
     }
 
     FOLDER_LOOKUP = {}
 
+    # Number of UIDs requested by a single UID FETCH command
+    FETCH_CHUNK_SIZE = 100
+
     def __init__(self,
                  connection,
                  parser_policy,
+                 fetch_chunk_size=None,
+                 headers_only=False,
+                 envelope=False,
+                 lazy_attachments=False,
+                 preview_bytes=None,
+                 parse_workers=None,
+                 cache=None,
+                 search_index=None,
+                 storage=None,
+                 memory_budget=None,
+                 compact=False,
+                 keep_raw_email=True,
+                 metrics=None,
+                 order_by=None,
+                 limit=None,
+                 offset=0,
+                 uids=None,
                  **kwargs):
 
         self.connection = connection
         self.parser_policy = parser_policy
+        self.fetch_chunk_size = fetch_chunk_size or self.FETCH_CHUNK_SIZE
+        self.headers_only = headers_only
+        self.envelope = envelope
+        self.lazy_attachments = lazy_attachments
+        self.preview_bytes = preview_bytes
+        self.parse_workers = parse_workers
+        self.cache = cache
+        self.search_index = search_index
+        # Raw messages fetched for a search index keeping them, until indexed
+        self._raw_emails = {}
+        self._indexing = 0
+        if memory_budget is not None:
+            # The budget is this instance's own: a SpooledStorage is not shared
+            if storage is None:
+                storage = SpooledStorage(memory_budget=memory_budget)
+            elif isinstance(storage, SpooledStorage):
+                storage = SpooledStorage(storage.threshold, memory_budget, storage.dir)
+            else:
+                raise ValueError("memory_budget applies to a SpooledStorage")
+        if parse_workers and isinstance(storage, SpooledStorage):
+            raise ValueError("Temporary files cannot be sent back by parse_workers, "
+                             "use a DirectoryStorage")
+        self.storage = storage
+        self.compact = compact
+        self.keep_raw_email = keep_raw_email
+        self.metrics = metrics or NULL_METRICS
+        self.order_by = order_by
+        self.limit = limit
+        self.offset = offset
         self.kwargs = kwargs
-        self._uid_list = self._query_uids(**kwargs)
+        # Number of matching messages, of which _uid_list may be one page
+        self.total = None
+        if uids is not None:
+            # Fetched as given, without searching
+            self._uid_list = UidList(uids)
+            self.total = len(self._uid_list)
+        else:
+            self._uid_list = self._query_uids(**kwargs)
 
         logger.debug("Fetch all messages for UID in {}".format(self._uid_list))
 
+    @property
+    def uids(self):
+        """The UidList of the messages to fetch"""
+        return self._uid_list
+
     def _fetch_email(self, uid):
-        return fetch_email_by_uid(uid=uid,
-                                  connection=self.connection,
-                                  parser_policy=self.parser_policy)
+        if self.search_index is not None:
+            return dict(self._index_email_list(self._fetch_emails, [uid])).get(uid)
+        return dict(self._fetch_emails([uid])).get(uid)
+
+    def _download_raw(self, uids):
+        return fetch_raw_by_uids(uids, self.connection)
+
+    def _fetch_raw(self, uids):
+        if self.cache is not None:
+            fetched = self.cache.fetch_raw_by_uids(uids, self.connection)
+        else:
+            fetched = self._download_raw(uids)
+        if self._indexing and self.search_index.keep_raw:
+            fetched = self._keep_raw_emails(fetched)
+
+        if self.metrics.enabled:
+            with self.metrics.timed('fetch'):
+                fetched = list(fetched)
+        return fetched
+
+    def _keep_raw_emails(self, fetched):
+        for uid, raw_email, flags in fetched:
+            self._raw_emails[uid] = raw_email
+            yield uid, raw_email, flags
+
+    def _parse_raw_email(self, raw_email, flags):
+        if not self.metrics.enabled:
+            return parse_raw_email(raw_email, flags, self.parser_policy, self.storage,
+                                   self.compact, self.keep_raw_email)
+
+        start = time.perf_counter()
+        with use_metrics(self.metrics):
+            email_object = parse_raw_email(raw_email, flags, self.parser_policy, self.storage,
+                                           self.compact, self.keep_raw_email)
+        self.metrics.timing('parse', time.perf_counter() - start)
+        return email_object
+
+    def _fetch_emails(self, uids):
+        fetch = None
+        if self.preview_bytes:
+            fetch = partial(fetch_previews_by_uids, preview_bytes=self.preview_bytes)
+        elif self.envelope:
+            fetch = fetch_envelopes_by_uids
+        elif self.headers_only:
+            fetch = fetch_headers_by_uids
+        elif self.lazy_attachments:
+            fetch = fetch_structures_by_uids
+
+        if fetch is not None:
+            return fetch(uids=uids,
+                         connection=self.connection,
+                         parser_policy=self.parser_policy)
+
+        return ((uid, self._parse_raw_email(raw_email, flags))
+                for uid, raw_email, flags in self._fetch_raw(uids))
 
     def _query_uids(self, **kwargs):
+        # A UidList: an array of ints rather than a bytes object per UID
         query_ = build_search_query(self.IMAP_ATTRIBUTE_LOOKUP, **kwargs)
-        _, data = self.connection.uid('search', None, query_)
-        if data[0] is None:
-            return []
-        return data[0].split()
+        with self.metrics.timed('search'):
+            uids, self.total = search_uids(self.connection, query_, self.order_by,
+                                           self.offset, self.limit, self.fetch_chunk_size)
+        return uids
+
+    def _fetch_email_list(self, uids=None):
+        if uids is None:
+            uids = self._uid_list
+        if self.parse_workers and not (self.headers_only or self.envelope or self.lazy_attachments
+                                       or self.preview_bytes):
+            yield from self._fetch_email_list_in_workers(uids)
+            return
+
+        for chunk in chunked(uids, self.fetch_chunk_size):
+            yield from self._fetch_emails(chunk)
+
+    def _fetch_email_list_in_workers(self, uids):
+        """
+        Parse messages in a process pool while the next chunk is downloaded.
+
+        ``parse_workers`` is either a number of processes or an Executor,
+        which is then left running for the caller to reuse.
+        """
+        if isinstance(self.parse_workers, Executor):
+            executor = self.parse_workers
+        else:
+            executor = ProcessPoolExecutor(max_workers=self.parse_workers)
 
-    def _fetch_email_list(self):
-        for uid in self._uid_list:
-            yield uid, self._fetch_email(uid)
+        try:
+            pending = []
+            for chunk in chunked(uids, self.fetch_chunk_size):
+                submitted = [(uid, flags, executor.submit(parse_email, raw_email, self.parser_policy,
+                                                          self.storage, self.compact, self.keep_raw_email))
+                             for uid, raw_email, flags in self._fetch_raw(chunk)]
+
+                yield from self._collect_parsed(pending)
+                pending = submitted
+
+            yield from self._collect_parsed(pending)
+        finally:
+            if executor is not self.parse_workers:
+                executor.shutdown()
+
+    @staticmethod
+    def _collect_parsed(submitted):
+        for uid, flags, future in submitted:
+            email_object = future.result()
+            email_object.flags = flags
+            yield uid, email_object
 
     def __repr__(self):
         if len(self.kwargs) > 0:
@@ -60,7 +242,38 @@ class Messages:
                                                    for key, value in self.kwargs.items()))
         return 'Messages(ALL)'
 
+    def _index_email_list(self, fetch, uids=None):
+        """
+        Add the messages of ``fetch(uids)`` to the search index as they
+        pass, a chunk at a time.
+        """
+        # Only a full fetch has the body at hand, other modes would fetch it
+        with_body = not (self.headers_only or self.envelope or self.lazy_attachments or self.preview_bytes)
+        pending = []
+        raw_emails = {}
+        # Raw messages are kept while an indexed fetch runs only
+        self._indexing += 1
+        try:
+            for uid, message in fetch(uids):
+                pending.append((uid, message))
+                if uid in self._raw_emails:
+                    # As received, which the parsed message no longer is
+                    raw_emails[uid] = self._raw_emails.pop(uid)
+                if len(pending) >= self.fetch_chunk_size:
+                    self.search_index.add_many(pending, with_body, raw_emails)
+                    pending = []
+                    raw_emails = {}
+                yield uid, message
+        finally:
+            self._indexing -= 1
+            if not self._indexing:
+                self._raw_emails.clear()
+            if pending:
+                self.search_index.add_many(pending, with_body, raw_emails)
+
     def __iter__(self):
+        if self.search_index is not None:
+            return self._index_email_list(self._fetch_email_list)
         return self._fetch_email_list()
 
     def __next__(self):
@@ -72,9 +285,10 @@ class Messages:
     def __getitem__(self, index):
         uids = self._uid_list[index]
 
-        if not isinstance(uids, list):
+        if not isinstance(index, slice):
             uid = uids
             return uid, self._fetch_email(uid)
 
-        return [(uid, self._fetch_email(uid))
-                for uid in uids]
+        if self.search_index is not None:
+            return list(self._index_email_list(self._fetch_email_list, uids))
+        return list(self._fetch_email_list(uids))
@@ -1,21 +1,61 @@
 import datetime
+from concurrent.futures import Executor
 from email._policybase import Policy
 from imaplib import IMAP4, IMAP4_SSL
-from typing import Union, List, Generator, Tuple
+from imbox.cache import FolderCache
+from imbox.metrics import Metrics
+from imbox.search_index import FolderSearchIndex
+from imbox.storage import Storage
+from imbox.utils import UidList
+from typing import Callable, Union, List, Generator, Tuple, Optional, Iterable
 
 
 class Messages:
 
+    FETCH_CHUNK_SIZE: int
+
     def __init__(self,
                  connection: Union[IMAP4, IMAP4_SSL],
                  parser_policy: Policy,
+                 fetch_chunk_size: Optional[int] = None,
+                 headers_only: bool = False,
+                 envelope: bool = False,
+                 lazy_attachments: bool = False,
+                 preview_bytes: Optional[int] = None,
+                 parse_workers: Optional[Union[int, Executor]] = None,
+                 cache: Optional[FolderCache] = None,
+                 search_index: Optional[FolderSearchIndex] = None,
+                 storage: Optional[Storage] = None,
+                 memory_budget: Optional[int] = None,
+                 compact: bool = False,
+                 keep_raw_email: bool = True,
+                 metrics: Optional[Metrics] = None,
+                 order_by: Optional[Union[str, List[str]]] = None,
+                 limit: Optional[int] = None,
+                 offset: int = 0,
+                 uids: Optional[Iterable[Union[bytes, int]]] = None,
                  **kwargs: Union[bool, str, datetime.date]) -> None: ...
 
+    @property
+    def uids(self) -> UidList: ...
+
     def _fetch_email(self, uid: bytes) -> 'Struct': ...
 
-    def _query_uids(self, **kwargs: Union[bool, str, datetime.date]) -> List[bytes]: ...
+    def _download_raw(self, uids: List[bytes]) -> Generator[Tuple[bytes, bytes, List[bytes]]]: ...
+
+    def _fetch_raw(self, uids: List[bytes]) -> Generator[Tuple[bytes, bytes, List[bytes]]]: ...
+
+    def _keep_raw_emails(self, fetched: Iterable[Tuple[bytes, bytes, List[bytes]]]
+                         ) -> Generator[Tuple[bytes, bytes, List[bytes]]]: ...
+
+    def _fetch_emails(self, uids: List[bytes]) -> Generator[Tuple[bytes, 'Struct']]: ...
+
+    def _query_uids(self, **kwargs: Union[bool, str, datetime.date]) -> UidList: ...
+
+    def _fetch_email_list(self, uids: Optional[Iterable[bytes]] = None) -> Generator[Tuple[bytes, 'Struct']]: ...
 
-    def _fetch_email_list(self) -> Generator[Tuple[bytes, 'Struct']]: ...
+    def _index_email_list(self, fetch: Callable[[Optional[Iterable[bytes]]], Iterable[Tuple[bytes, 'Struct']]],
+                          uids: Optional[Iterable[bytes]] = None) -> Generator[Tuple[bytes, 'Struct']]: ...
 
     def __repr__(self) -> str: ...
 
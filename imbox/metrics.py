@@ -0,0 +1,162 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    """
+    The interface of metrics hooks, recording nothing.
+
+    Counters are ``round_trips``, ``bytes_received`` and
+    ``charset_fallbacks``; timings (in seconds) are ``command``, ``search``,
+    ``fetch``, ``parse`` (one per message) and ``charset_detection``.
+    Instrumented code skips even reading the clock when ``enabled`` is False.
+    """
+
+    enabled = False
+
+    def count(self, name, value=1):
+        pass
+
+    def timing(self, name, seconds):
+        pass
+
+    @contextmanager
+    def timed(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timing(name, time.perf_counter() - start)
+
+
+NULL_METRICS = Metrics()
+
+
+class CallbackMetrics(Metrics):
+    """
+    Calls ``callback(kind, name, value)``, ``kind`` being ``'count'`` or
+    ``'timing'``, e.g. to forward to statsd.
+    """
+
+    enabled = True
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def count(self, name, value=1):
+        self.callback('count', name, value)
+
+    def timing(self, name, seconds):
+        self.callback('timing', name, seconds)
+
+
+class Stats(Metrics):
+    """
+    Accumulates counters and timings in memory, thread-safely.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            # name -> [count, total seconds, max seconds]
+            self.timings = {}
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def timing(self, name, seconds):
+        with self._lock:
+            timing = self.timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def snapshot(self):
+        """
+        Return ``{'counters': {name: value}, 'timings': {name: {'count',
+        'total', 'max'}}}``.
+        """
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'timings': {name: {'count': count, 'total': total, 'max': maximum}
+                            for name, (count, total, maximum) in self.timings.items()},
+            }
+
+    def prometheus(self, prefix='imbox'):
+        """
+        Return the metrics in the Prometheus text exposition format: counters
+        as ``<prefix>_<name>_total`` and timings as ``<prefix>_<name>_seconds``
+        summaries.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            metric = '{}_{}_total'.format(prefix, name)
+            lines.append('# TYPE {} counter'.format(metric))
+            lines.append('{} {}'.format(metric, value))
+        for name, timing in sorted(snapshot['timings'].items()):
+            metric = '{}_{}_seconds'.format(prefix, name)
+            lines.append('# TYPE {} summary'.format(metric))
+            lines.append('{}_count {}'.format(metric, timing['count']))
+            lines.append('{}_sum {}'.format(metric, timing['total']))
+        return '\n'.join(lines) + '\n'
+
+
+class PrometheusCollector:
+    """
+    A ``prometheus_client`` collector exposing a Stats::
+
+        prometheus_client.REGISTRY.register(PrometheusCollector(stats))
+    """
+
+    def __init__(self, stats, prefix='imbox'):
+        self.stats = stats
+        self.prefix = prefix
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, SummaryMetricFamily
+
+        snapshot = self.stats.snapshot()
+        for name, value in sorted(snapshot['counters'].items()):
+            yield CounterMetricFamily('{}_{}'.format(self.prefix, name), name.replace('_', ' '), value=value)
+        for name, timing in sorted(snapshot['timings'].items()):
+            yield SummaryMetricFamily('{}_{}_seconds'.format(self.prefix, name), name + ' time',
+                                      count_value=timing['count'], sum_value=timing['total'])
+
+
+# A thread-local rather than a ContextVar, which needs Python 3.7; metrics
+# are only set around synchronous parsing, never across an await
+_current = threading.local()
+
+
+def current_metrics():
+    """
+    The metrics of the code running, for functions not given an Imbox.
+    """
+    return getattr(_current, 'metrics', NULL_METRICS)
+
+
+@contextmanager
+def use_metrics(metrics):
+    previous = current_metrics()
+    _current.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _current.metrics = previous
@@ -0,0 +1,48 @@
+from contextlib import AbstractContextManager
+from typing import Any, Callable, Dict, Iterator, List
+
+
+class Metrics:
+    enabled: bool
+
+    def count(self, name: str, value: int = 1) -> None: ...
+
+    def timing(self, name: str, seconds: float) -> None: ...
+
+    def timed(self, name: str) -> AbstractContextManager[None]: ...
+
+
+NULL_METRICS: Metrics
+
+
+class CallbackMetrics(Metrics):
+    callback: Callable[[str, str, float], Any]
+
+    def __init__(self, callback: Callable[[str, str, float], Any]) -> None: ...
+
+
+class Stats(Metrics):
+    counters: Dict[str, int]
+    timings: Dict[str, List[float]]
+
+    def __init__(self) -> None: ...
+
+    def reset(self) -> None: ...
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]: ...
+
+    def prometheus(self, prefix: str = 'imbox') -> str: ...
+
+
+class PrometheusCollector:
+    stats: Stats
+    prefix: str
+
+    def __init__(self, stats: Stats, prefix: str = 'imbox') -> None: ...
+
+    def collect(self) -> Iterator[Any]: ...
+
+
+def current_metrics() -> Metrics: ...
+
+def use_metrics(metrics: Metrics) -> AbstractContextManager[Metrics]: ...
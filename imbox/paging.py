@@ -0,0 +1,228 @@
+import datetime
+import re
+
+import logging
+
+from imbox.parser import ENVELOPE_FETCH_ITEMS, fetch_responses_by_uids, parse_envelope
+from imbox.response import parse_esearch_response
+from imbox.utils import UidList, chunked
+
+logger = logging.getLogger(__name__)
+
+# order_by criteria and their RFC 5256 SORT keys; 'uid' needs no SORT
+SORT_KEYS = {
+    'arrival': 'ARRIVAL',
+    'cc': 'CC',
+    'date': 'DATE',
+    'from': 'FROM',
+    'size': 'SIZE',
+    'subject': 'SUBJECT',
+    'to': 'TO',
+}
+
+SUBJECT_PREFIX_RE = re.compile(r'^\s*((re|fwd?)\s*(\[[^\]]*\])?\s*:\s*)+', re.IGNORECASE)
+
+
+def parse_order_by(order_by):
+    """
+    Return ``[(criterion, reverse)]`` for ``order_by``, a criterion name or
+    a list of them, each prefixed by ``-`` for a descending order. ``uid``
+    comes first, or last as the (implicit) ascending tiebreak.
+    """
+    if order_by is None:
+        return []
+    if isinstance(order_by, str):
+        order_by = [order_by]
+
+    criteria = []
+    for criterion in order_by:
+        reverse = criterion.startswith('-')
+        name = criterion.lstrip('-').lower()
+        if name != 'uid' and name not in SORT_KEYS:
+            raise ValueError("Cannot order messages by '{}'".format(criterion))
+        criteria.append((name, reverse))
+
+    for index, (name, reverse) in enumerate(criteria[1:], 1):
+        if name != 'uid':
+            continue
+        # SORT and the local sort break ties in ascending UID order already
+        if index != len(criteria) - 1 or reverse:
+            raise ValueError("'uid' can only come first in order_by, or last in ascending order")
+        criteria.pop()
+    return criteria
+
+
+def sort_criteria(criteria):
+    """
+    Return the SORT criteria of ``parse_order_by`` results, e.g. ``(REVERSE DATE)``.
+    """
+    keys = []
+    for name, reverse in criteria:
+        if reverse:
+            keys.append('REVERSE')
+        keys.append(SORT_KEYS[name])
+    return '({})'.format(' '.join(keys))
+
+
+def expand_sequence_set(sequence_set):
+    """
+    Return the UIDs of a sequence-set as bytes, keeping the order of the
+    server (meaningful in ESORT results).
+    """
+    if sequence_set is None:
+        return []
+    if isinstance(sequence_set, int):
+        return [str(sequence_set).encode('ascii')]
+
+    uids = []
+    for part in sequence_set.split(b','):
+        if b':' in part:
+            start, end = (int(value) for value in part.split(b':'))
+            step = 1 if end >= start else -1
+            uids.extend(str(uid).encode('ascii') for uid in range(start, end + step, step))
+        elif part:
+            uids.append(part)
+    return uids
+
+
+def _search(connection, criteria):
+    _, data = connection.uid('search', None, criteria)
+    return UidList.from_search(data[0])
+
+
+def search_uid_numbers(connection, criteria):
+    """
+    Return the UIDs matching a UID SEARCH as ints, in the server's order.
+    """
+    _, data = connection.uid('search', None, criteria)
+    return UidList.from_search(data[0] if data else None).numbers
+
+
+def _sort(connection, criteria, sort_keys):
+    _, data = connection.uid('sort', sort_keys, 'UTF-8', criteria)
+    return UidList.from_search(data[0])
+
+
+def _extended(connection, command, return_options, *args):
+    """
+    Run a UID SEARCH or UID SORT with RETURN options (RFC 4731, RFC 5267)
+    and return the parsed ESEARCH response.
+    """
+    connection.response('ESEARCH')
+    status, data = connection.uid(command, 'RETURN ({})'.format(return_options), *args)
+    if status != 'OK':
+        raise connection.error("UID {} command error: {} {}".format(command, status, data))
+    _, data = connection.response('ESEARCH')
+    return parse_esearch_response(data)
+
+
+def _partial_range(offset, limit, from_end):
+    if from_end:
+        return '-{}:-{}'.format(offset + 1, offset + limit)
+    return '{}:{}'.format(offset + 1, offset + limit)
+
+
+def _internal_timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('ascii', 'replace')
+    try:
+        return datetime.datetime.strptime(value.strip(), '%d-%b-%Y %H:%M:%S %z').timestamp()
+    except ValueError:
+        return None
+
+
+def _first_address(addresses):
+    return addresses[0]['email'].lower() if addresses else ''
+
+
+def _sort_value(name, response, envelope):
+    if name == 'arrival':
+        return _internal_timestamp(response.get('INTERNALDATE'))
+    if name == 'date':
+        parsed_date = envelope.get('parsed_date')
+        if parsed_date is not None:
+            return parsed_date.timestamp()
+        return _internal_timestamp(response.get('INTERNALDATE'))
+    if name == 'size':
+        return response.get('RFC822.SIZE')
+    if name == 'subject':
+        return SUBJECT_PREFIX_RE.sub('', envelope.get('subject') or '').strip().lower()
+    return _first_address(envelope.get({'from': 'sent_from', 'to': 'sent_to', 'cc': 'cc'}[name]))
+
+
+def _sort_locally(connection, uids, criteria, chunk_size):
+    """
+    Sort ``uids`` like the SORT extension would, from their ENVELOPE,
+    INTERNALDATE and RFC822.SIZE.
+    """
+    items = '(ENVELOPE INTERNALDATE RFC822.SIZE)'
+    values = {}
+    for chunk in chunked(uids, chunk_size):
+        for uid, response in fetch_responses_by_uids(chunk, connection, items, ENVELOPE_FETCH_ITEMS[1]):
+            envelope = parse_envelope(response['ENVELOPE'])
+            values[uid] = [_sort_value(name, response, envelope) for name, _ in criteria]
+
+    uids = [uid for uid in uids if uid in values]
+    # Stable sorts from the last criterion; messages lacking a value go last
+    for index in reversed(range(len(criteria))):
+        present = [uid for uid in uids if values[uid][index] is not None]
+        present.sort(key=lambda uid: values[uid][index], reverse=criteria[index][1])
+        uids = present + [uid for uid in uids if values[uid][index] is None]
+    return UidList(uids)
+
+
+def search_uids(connection, criteria, order_by=None, offset=0, limit=None, chunk_size=100):
+    """
+    Return ``(uids, total)``: a UidList of the UIDs matching the SEARCH ``criteria`` in
+    ``order_by`` order, from ``offset`` and at most ``limit`` of them, and
+    the number of matching messages.
+
+    SORT (RFC 5256) orders messages on the server and ESEARCH/ESORT with
+    ``RETURN (PARTIAL ...)`` (RFC 5267, RFC 9394) returns only the requested
+    page; without them the UIDs are searched in full and sorted and sliced
+    here.
+    """
+    capabilities = connection.capabilities
+    order = parse_order_by(order_by)
+    reverse_uids = bool(order) and order[0] == ('uid', True)
+    if order and order[0][0] == 'uid':
+        order = []
+
+    if limit is not None and limit <= 0:
+        return UidList(), None
+    paged = limit is not None
+    partial = 'PARTIAL' in capabilities or 'CONTEXT=SEARCH' in capabilities
+
+    if order:
+        if 'SORT' in capabilities:
+            keys = sort_criteria(order)
+            esort = 'ESORT' in capabilities and ('CONTEXT=SORT' in capabilities or 'PARTIAL' in capabilities)
+            if paged and esort:
+                results = _extended(connection, 'sort', 'PARTIAL {} COUNT'.format(
+                    _partial_range(offset, limit, False)), keys, 'UTF-8', criteria)
+                page = (results.get('PARTIAL') or [None, None])[1]
+                return UidList(expand_sequence_set(page)), results.get('COUNT')
+            uids = _sort(connection, criteria, keys)
+        else:
+            logger.debug("No SORT extension, sorting messages locally")
+            uids = _sort_locally(connection, _search(connection, criteria), order, chunk_size)
+
+    elif paged and partial and (not reverse_uids or 'PARTIAL' in capabilities):
+        results = _extended(connection, 'search', 'PARTIAL {} COUNT'.format(
+            _partial_range(offset, limit, reverse_uids)), criteria)
+        # The page comes as a sequence-set, in ascending UID order
+        page = UidList(sorted(expand_sequence_set((results.get('PARTIAL') or [None, None])[1]),
+                              key=int, reverse=reverse_uids))
+        return page, results.get('COUNT')
+
+    else:
+        uids = _search(connection, criteria)
+        if reverse_uids:
+            uids.reverse()
+
+    total = len(uids)
+    if offset or paged:
+        uids = uids[offset:offset + limit if paged else None]
+    return uids, total
@@ -0,0 +1,20 @@
+from imaplib import IMAP4, IMAP4_SSL
+from imbox.utils import UidList
+from typing import Dict, List, Optional, Tuple, Union
+
+SORT_KEYS: Dict[str, str]
+
+def parse_order_by(order_by: Optional[Union[str, List[str]]]) -> List[Tuple[str, bool]]: ...
+
+def sort_criteria(criteria: List[Tuple[str, bool]]) -> str: ...
+
+def expand_sequence_set(sequence_set: Optional[Union[bytes, int]]) -> List[bytes]: ...
+
+def search_uid_numbers(connection: Union[IMAP4, IMAP4_SSL], criteria: str) -> List[int]: ...
+
+def search_uids(connection: Union[IMAP4, IMAP4_SSL],
+                criteria: str,
+                order_by: Optional[Union[str, List[str]]] = None,
+                offset: int = 0,
+                limit: Optional[int] = None,
+                chunk_size: int = 100) -> Tuple[UidList, Optional[int]]: ...
@@ -2,19 +2,26 @@ import imaplib
 import io
 import re
 import email
-import chardet
 import base64
 import quopri
+import sys
 import time
 from datetime import datetime
+from functools import lru_cache, partial
 from email.header import decode_header
-from imbox.utils import str_encode, str_decode
+from imbox import charset as charset_detection
+from imbox.metrics import current_metrics
+from imbox.response import parse_fetch_response
+from imbox.utils import lookup_charset, str_encode, str_decode, uids_to_sequence_set
 
 import logging
 from email.message import Message
 
 logger = logging.getLogger(__name__)
 
+# Number of distinct header values and address lists whose decoding is kept
+HEADER_CACHE_SIZE = 4096
+
 
 class Struct:
     def __init__(self, **entries):
@@ -27,42 +34,110 @@ class Struct:
         return str(self.__dict__)
 
 
+class LazyStruct(Struct):
+    """
+    A Struct holding only part of a message.
+
+    The first access to an attribute it does not hold (``body``,
+    ``attachments``, ``raw_email``...) calls ``loader`` to download and parse
+    the whole message, then fills in the missing attributes.
+    """
+    __slots__ = ('_loader',)
+
+    BODY_KEYS = ('raw_email', 'body', 'attachments')
+
+    def __init__(self, loader, **entries):
+        self._loader = loader
+        super().__init__(**entries)
+
+    def load(self):
+        if self._loader is not None:
+            full_email = self._loader()
+            self._loader = None
+            for key, value in full_email.__dict__.items():
+                self.__dict__.setdefault(key, value)
+        return self
+
+    def __getattr__(self, name):
+        if name.startswith('_') or self._loader is None:
+            raise AttributeError(name)
+        logger.debug("Loading full message to access '{}'".format(name))
+        self.load()
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class CompactStruct:
+    """
+    A Struct keeping its attributes in slots rather than a ``__dict__``, to
+    hold many parsed messages at once. Attributes the message lacks (e.g.
+    ``subject``) are left unset, as with Struct.
+    """
+    __slots__ = ('raw_email', 'attachments', 'body', 'sent_from', 'sent_to', 'cc', 'bcc',
+                 'headers', 'subject', 'date', 'message_id', 'parsed_date', 'flags', 'size',
+                 'gmail_msgid', 'gmail_thread_id', 'gmail_labels')
+
+    def __init__(self, **entries):
+        for key, value in entries.items():
+            setattr(self, key, value)
+
+    def keys(self):
+        return [key for key in self.__slots__ if hasattr(self, key)]
+
+    def __repr__(self):
+        return str({key: getattr(self, key) for key in self.keys()})
+
+
 def decode_mail_header(value, default_charset='us-ascii'):
     """
     Decode a header value into a unicode string.
     """
+    if isinstance(value, str):
+        return _decode_header_value(value, default_charset)
+    return _decode_header_value.__wrapped__(value, default_charset)
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def _decode_header_value(value, default_charset):
     try:
         headers = decode_header(value)
     except email.errors.HeaderParseError:
         return str_decode(str_encode(value, default_charset, 'replace'), default_charset)
     else:
         for index, (text, charset) in enumerate(headers):
-            try:
-                logger.debug("Mail header no. {index}: {data} encoding {charset}".format(
-                    index=index,
-                    data=str_decode(text, charset or 'utf-8', 'replace'),
-                    charset=charset))
-                headers[index] = str_decode(text, charset or default_charset,
-                                            'replace')
-            except LookupError:
+            encoding = lookup_charset(charset or default_charset)
+            if encoding is None:
                 # if the charset is unknown, force default
-                headers[index] = str_decode(text, default_charset, 'replace')
+                current_metrics().count('charset_fallbacks')
+                encoding = default_charset
+            headers[index] = str_decode(text, encoding, 'replace')
+            logger.debug("Mail header no. %s: %s encoding %s", index, headers[index], charset)
 
         return ''.join(headers)
 
 
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def _parse_addresses(headers):
+    return tuple((decode_mail_header(address_name), sys.intern(address_email))
+                 for address_name, address_email in email.utils.getaddresses(headers))
+
+
 def get_mail_addresses(message, header_name):
     """
     Retrieve all email addresses from one message header.
     """
-    headers = [h for h in message.get_all(header_name, [])]
-    addresses = email.utils.getaddresses(headers)
-
-    for index, (address_name, address_email) in enumerate(addresses):
-        addresses[index] = {'name': decode_mail_header(address_name),
-                            'email': address_email}
-        logger.debug("{} Mail address in message: <{}> {}".format(
-            header_name.upper(), address_name, address_email))
+    headers = tuple(message.get_all(header_name, []))
+    if all(isinstance(header, str) for header in headers):
+        parsed = _parse_addresses(headers)
+    else:
+        parsed = _parse_addresses.__wrapped__(headers)
+
+    addresses = []
+    for address_name, address_email in parsed:
+        addresses.append({'name': address_name, 'email': address_email})
+        logger.debug("%s Mail address in message: <%s> %s", header_name.upper(), address_name, address_email)
     return addresses
 
 
@@ -92,7 +167,7 @@ def decode_param(param):
     if value_results:
         v = ''.join(value_results)
 
-    logger.debug("Decoded parameter {} - {}".format(name, v))
+    logger.debug("Decoded parameter %s - %s", name, v)
     return name, v
 
 
@@ -116,7 +191,7 @@ def parse_content_disposition(content_disposition):
 
 
 
-def parse_attachment(message_part):
+def parse_attachment(message_part, storage=None):
     # Check again if this is a valid attachment
     content_disposition = message_part.get("Content-Disposition", None)
     if content_disposition is not None and not message_part.is_multipart():
@@ -132,7 +207,7 @@ def parse_attachment(message_part):
             attachment = {
                 'content-type': message_part.get_content_type(),
                 'size': len(file_data),
-                'content': io.BytesIO(file_data),
+                'content': storage.store(file_data) if storage is not None else io.BytesIO(file_data),
                 'content-id': message_part.get("Content-ID", None)
             }
             filename_parts = []
@@ -162,7 +237,7 @@ def parse_attachment(message_part):
     return None
 
 
-def decode_content(message: Message) -> str:
+def decode_content(message: Message, detector=None, sender=None) -> str:
     """Decode the content of an email message.
 
     This function decodes the content of an email message by inferring the character encoding
@@ -170,6 +245,9 @@ def decode_content(message: Message) -> str:
 
     Args:
         message: An email message object.
+        detector: The CharsetDetector guessing undeclared or unknown charsets,
+            ``imbox.charset.default_detector`` by default.
+        sender: The From header of the message, to which detections are remembered.
 
     Returns:
         The decoded content of the email message as a string.
@@ -200,13 +278,16 @@ def decode_content(message: Message) -> str:
         Returns:
             The decoded content as a string.
         """
-        try:
-            return content.decode(charset, "ignore")
-        except LookupError:
-            encoding = chardet.detect(content).get("encoding")
-            if encoding:
-                return content.decode(encoding, "ignore")
-            return content
+        encoding = lookup_charset(charset)
+        if encoding is None:
+            metrics = current_metrics()
+            metrics.count('charset_fallbacks')
+            with metrics.timed('charset_detection'):
+                encoding = (detector or charset_detection.default_detector).detect(
+                    content, label=charset, sender=sender)
+            if not encoding:
+                return content
+        return content.decode(encoding, "ignore")
 
     content = message.get_payload(decode=True)
     charset = get_content_charset()
@@ -228,6 +309,174 @@ def fetch_email_by_uid(uid, connection, parser_policy):
     return email_object
 
 
+def select_responses(uids, data, required):
+    """
+    Match the data of a UID FETCH command with the requested ``uids``.
+
+    Yields ``(uid, response)`` tuples in the order of ``uids``, ``response``
+    being the dict of data items returned by the server. UIDs whose response
+    lacks the ``required`` data item (e.g. expunged in the meantime) are
+    skipped.
+    """
+    fetched = {}
+    for response in parse_fetch_response(data):
+        if response.get('UID') is not None and response.get(required) is not None:
+            fetched[response['UID']] = response
+
+    for uid in uids:
+        response = fetched.get(int(uid))
+        if response is None:
+            logger.debug("UID {} missing from FETCH response".format(int(uid)))
+            continue
+        yield uid, response
+
+
+def fetch_responses_by_uids(uids, connection, items, required):
+    """
+    Issue a single UID FETCH command for ``uids``, see ``select_responses``.
+    """
+    if not uids:
+        return
+
+    message, data = connection.uid('fetch', uids_to_sequence_set(uids), items)
+    logger.debug("Fetched {} {} with a single command".format(len(uids), items))
+
+    yield from select_responses(uids, data, required)
+
+
+# FETCH data items and the response item they must return, per fetch mode
+EMAIL_FETCH_ITEMS = ('(BODY.PEEK[] FLAGS)', 'BODY[]')
+HEADERS_FETCH_ITEMS = ('(BODY.PEEK[HEADER] RFC822.SIZE FLAGS)', 'BODY[HEADER]')
+ENVELOPE_FETCH_ITEMS = ('(ENVELOPE RFC822.SIZE FLAGS)', 'ENVELOPE')
+
+
+def parse_raw_email(raw_email, flags, parser_policy, storage=None, compact=False, keep_raw_email=True):
+    email_object = parse_email(raw_email, policy=parser_policy, storage=storage,
+                               compact=compact, keep_raw_email=keep_raw_email)
+    email_object.flags = list(flags or [])
+    return email_object
+
+
+def parse_fetched_email(response, parser_policy):
+    return parse_raw_email(response['BODY[]'], response.get('FLAGS'), parser_policy)
+
+
+def parse_fetched_headers(response, parser_policy):
+    """
+    Return the keys of ``parse_email`` available from a header-only fetch.
+    """
+    parsed_email = parse_email(response['BODY[HEADER]'], policy=parser_policy).__dict__
+    for key in LazyStruct.BODY_KEYS:
+        parsed_email.pop(key, None)
+    parsed_email['flags'] = list(response.get('FLAGS') or [])
+    parsed_email['size'] = response.get('RFC822.SIZE')
+    return parsed_email
+
+
+def parse_fetched_envelope(response):
+    """
+    Return the keys of ``parse_email`` available from an ENVELOPE fetch.
+    """
+    parsed_email = parse_envelope(response['ENVELOPE'])
+    parsed_email['flags'] = list(response.get('FLAGS') or [])
+    parsed_email['size'] = response.get('RFC822.SIZE')
+    return parsed_email
+
+
+def fetch_raw_by_uids(uids, connection):
+    """
+    Fetch several messages with a single UID FETCH command, unparsed.
+
+    Yields ``(uid, raw_email, flags)`` tuples in the order of ``uids``.
+    """
+    for uid, response in fetch_responses_by_uids(uids, connection, *EMAIL_FETCH_ITEMS):
+        yield uid, response['BODY[]'], list(response.get('FLAGS') or [])
+
+
+def fetch_emails_by_uids(uids, connection, parser_policy, storage=None):
+    """
+    Fetch several messages with a single UID FETCH command.
+
+    Yields ``(uid, message)`` tuples in the order of ``uids``. Messages are
+    parsed one at a time as they are consumed.
+    """
+    for uid, raw_email, flags in fetch_raw_by_uids(uids, connection):
+        yield uid, parse_raw_email(raw_email, flags, parser_policy, storage)
+
+
+def fetch_headers_by_uids(uids, connection, parser_policy):
+    """
+    Fetch only the headers of several messages.
+
+    Yields ``(uid, LazyStruct)`` tuples; the body, attachments and raw email
+    are downloaded when one of them is first accessed.
+    """
+    for uid, response in fetch_responses_by_uids(uids, connection, *HEADERS_FETCH_ITEMS):
+        yield uid, LazyStruct(partial(fetch_email_by_uid, uid, connection, parser_policy),
+                              **parse_fetched_headers(response, parser_policy))
+
+
+def fetch_envelopes_by_uids(uids, connection, parser_policy):
+    """
+    Fetch the ENVELOPE structure of several messages.
+
+    Yields ``(uid, LazyStruct)`` tuples holding the sender, recipients,
+    subject, date and message id; everything else is downloaded when first
+    accessed.
+    """
+    for uid, response in fetch_responses_by_uids(uids, connection, *ENVELOPE_FETCH_ITEMS):
+        yield uid, LazyStruct(partial(fetch_email_by_uid, uid, connection, parser_policy),
+                              **parse_fetched_envelope(response))
+
+
+def parse_envelope_addresses(addresses):
+    """
+    Convert a list of ENVELOPE address structures into address dicts.
+    """
+    result = []
+    for name, _, mailbox, host in addresses or []:
+        if mailbox is None or host is None:
+            # Start or end of a group (RFC 3501, section 7.4.2)
+            continue
+        result.append({'name': decode_mail_header(_envelope_text(name)),
+                       'email': '{}@{}'.format(_envelope_text(mailbox), _envelope_text(host))})
+    return result
+
+
+def _envelope_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, int):
+        return str(value)
+    return value.decode('utf-8', 'replace')
+
+
+def parse_envelope(envelope):
+    """
+    Convert an ENVELOPE structure into the keys ``parse_email`` would set.
+    """
+    date, subject, sent_from, _, _, sent_to, cc, bcc, _, message_id = envelope[:10]
+
+    parsed_email = {
+        'sent_from': parse_envelope_addresses(sent_from),
+        'sent_to': parse_envelope_addresses(sent_to),
+        'cc': parse_envelope_addresses(cc),
+        'bcc': parse_envelope_addresses(bcc),
+    }
+    if subject is not None:
+        parsed_email['subject'] = decode_mail_header(_envelope_text(subject))
+    if message_id is not None:
+        parsed_email['message_id'] = _envelope_text(message_id)
+    if date is not None:
+        parsed_email['date'] = _envelope_text(date)
+        try:
+            parsed_email['parsed_date'] = email.utils.parsedate_to_datetime(parsed_email['date'])
+        except (TypeError, ValueError):
+            logger.debug("Cannot parse envelope date {}".format(parsed_email['date']))
+
+    return parsed_email
+
+
 def parse_flags(headers):
     """Copied from https://github.com/girishramnani/gmail/blob/master/gmail/message.py"""
     if len(headers) == 0:
@@ -236,7 +485,8 @@ def parse_flags(headers):
     return list(imaplib.ParseFlags(headers))
 
 
-def parse_email(raw_email, policy=None):
+def parse_email(raw_email, policy=None, storage=None, compact=False, keep_raw_email=True,
+                charset_detector=None):
     if policy is not None:
         email_parse_kwargs = dict(policy=policy)
     else:
@@ -246,8 +496,9 @@ def parse_email(raw_email, policy=None):
     if isinstance(raw_email, bytes):
         email_message = email.message_from_bytes(
             raw_email, **email_parse_kwargs)
-        charset = email_message.get_content_charset('utf-8')
-        raw_email = str_encode(raw_email, charset, errors='ignore')
+        if keep_raw_email:
+            charset = email_message.get_content_charset('utf-8')
+            raw_email = str_encode(raw_email, charset, errors='ignore')
     else:
         try:
             email_message = email.message_from_string(
@@ -257,7 +508,8 @@ def parse_email(raw_email, policy=None):
                 raw_email.encode('utf-8'), **email_parse_kwargs)
 
     maintype = email_message.get_content_maintype()
-    parsed_email = {'raw_email': raw_email}
+    sender = email_message.get('From')
+    parsed_email = {'raw_email': raw_email} if keep_raw_email else {}
 
     body = {
         "plain": [],
@@ -274,7 +526,7 @@ def parse_email(raw_email, policy=None):
             if content_disposition or not part_maintype == "text":
                 content = part.get_payload(decode=True)
             else:
-                content = decode_content(part)
+                content = decode_content(part, charset_detector, sender)
 
             is_inline = content_disposition is None \
                 or content_disposition.startswith("inline")
@@ -283,17 +535,17 @@ def parse_email(raw_email, policy=None):
             elif content_type == "text/html" and is_inline:
                 body['html'].append(content)
             elif content_disposition:
-                attachment = parse_attachment(part)
+                attachment = parse_attachment(part, storage)
                 if attachment:
                     attachments.append(attachment)
 
     elif maintype == 'text':
-        payload = decode_content(email_message)
+        payload = decode_content(email_message, charset_detector, sender)
         body['plain'].append(payload)
 
     elif maintype == 'application':
             if email_message.get_content_subtype() == 'pdf':
-                attachment = parse_attachment(email_message)
+                attachment = parse_attachment(email_message, storage)
                 if attachment:
                     attachments.append(attachment)
 
@@ -322,12 +574,14 @@ def parse_email(raw_email, policy=None):
             parsed_email[valid_key_name] = decode_mail_header(value)
 
         if key.lower() in key_value_header_keys:
-            parsed_email['headers'].append({'Name': key,
+            parsed_email['headers'].append({'Name': sys.intern(key),
                                             'Value': value})
 
     if parsed_email.get('date'):
         parsed_email['parsed_date'] = email.utils.parsedate_to_datetime(parsed_email['date'])
 
-    logger.info("Downloaded and parsed mail '{}' with {} attachments".format(
-        parsed_email.get('subject'), len(parsed_email.get('attachments'))))
+    logger.info("Downloaded and parsed mail '%s' with %s attachments",
+                parsed_email.get('subject'), len(parsed_email.get('attachments')))
+    if compact:
+        return CompactStruct(**parsed_email)
     return Struct(**parsed_email)
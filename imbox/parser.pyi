@@ -3,7 +3,10 @@ from email._policybase import Policy
 from email.message import Message
 from imaplib import IMAP4_SSL
 import io
-from typing import Union, Dict, List, KeysView, Tuple, Optional
+from typing import Any, BinaryIO, Callable, Union, Dict, List, KeysView, Tuple, Optional, Generator
+
+from imbox.charset import CharsetDetector
+from imbox.storage import Storage
 
 
 class Struct:
@@ -15,20 +18,92 @@ class Struct:
 
     def __repr__(self) -> str: ...
 
+class LazyStruct(Struct):
+    BODY_KEYS: Tuple[str, ...]
+
+    def __init__(self, loader: Callable[[], Struct], **entries: Any) -> None: ...
+
+    def load(self) -> 'LazyStruct': ...
+
+    def __getattr__(self, name: str) -> Any: ...
+
+class CompactStruct:
+    raw_email: str
+    attachments: List[Dict[str, Any]]
+    body: Dict[str, List[str]]
+    sent_from: List[Dict[str, str]]
+    sent_to: List[Dict[str, str]]
+    cc: List[Dict[str, str]]
+    bcc: List[Dict[str, str]]
+    headers: List[Dict[str, str]]
+    subject: str
+    date: str
+    message_id: str
+    parsed_date: datetime.datetime
+    flags: List[bytes]
+    size: int
+
+    def __init__(self, **entries: Any) -> None: ...
+
+    def keys(self) -> List[str]: ...
+
+    def __repr__(self) -> str: ...
+
 def decode_mail_header(value: str, default_charset: str) -> str: ...
 
 def get_mail_addresses(message: Message, header_name: str) -> List[Dict[str, str]]: ...
 
 def decode_param(param: str) -> Tuple[str, str]: ...
 
-def parse_attachment(message_part: Message) -> Optional[Dict[str, Union[int, str, io.BytesIO]]]: ...
+def parse_attachment(message_part: Message,
+                     storage: Optional[Storage] = None) -> Optional[Dict[str, Union[int, str, BinaryIO]]]: ...
 
-def decode_content(message: Message) -> str: ...
+def decode_content(message: Message, detector: Optional[CharsetDetector] = None,
+                   sender: Optional[str] = None) -> str: ...
 
 def fetch_email_by_uid(uid: bytes, connection: IMAP4_SSL, parser_policy: Optional[Policy]) -> Struct: ...
     raw_headers: bytes
     raw_email: bytes
 
+def select_responses(uids: List[bytes], data: list,
+                     required: str) -> Generator[Tuple[bytes, Dict[str, Any]], None, None]: ...
+
+def fetch_responses_by_uids(uids: List[bytes], connection: IMAP4_SSL, items: str,
+                            required: str) -> Generator[Tuple[bytes, Dict[str, Any]], None, None]: ...
+
+EMAIL_FETCH_ITEMS: Tuple[str, str]
+HEADERS_FETCH_ITEMS: Tuple[str, str]
+ENVELOPE_FETCH_ITEMS: Tuple[str, str]
+
+def parse_raw_email(raw_email: bytes, flags: Optional[List[bytes]], parser_policy: Optional[Policy],
+                    storage: Optional[Storage] = None, compact: bool = False,
+                    keep_raw_email: bool = True) -> Union[Struct, CompactStruct]: ...
+
+def parse_fetched_email(response: Dict[str, Any], parser_policy: Optional[Policy]) -> Struct: ...
+
+def parse_fetched_headers(response: Dict[str, Any], parser_policy: Optional[Policy]) -> Dict[str, Any]: ...
+
+def parse_fetched_envelope(response: Dict[str, Any]) -> Dict[str, Any]: ...
+
+def fetch_raw_by_uids(uids: List[bytes],
+                      connection: IMAP4_SSL) -> Generator[Tuple[bytes, bytes, List[bytes]], None, None]: ...
+
+def fetch_emails_by_uids(uids: List[bytes], connection: IMAP4_SSL,
+                         parser_policy: Optional[Policy],
+                         storage: Optional[Storage] = None) -> Generator[Tuple[bytes, Struct], None, None]: ...
+
+def fetch_headers_by_uids(uids: List[bytes], connection: IMAP4_SSL,
+                          parser_policy: Optional[Policy]) -> Generator[Tuple[bytes, LazyStruct], None, None]: ...
+
+def fetch_envelopes_by_uids(uids: List[bytes], connection: IMAP4_SSL,
+                            parser_policy: Optional[Policy]) -> Generator[Tuple[bytes, LazyStruct], None, None]: ...
+
+def parse_envelope_addresses(addresses: Optional[list]) -> List[Dict[str, str]]: ...
+
+def parse_envelope(envelope: list) -> Dict[str, Any]: ...
+
 def parse_flags(headers: str) -> Union[list, List[bytes]]: ...
 
-def parse_email(raw_email: bytes, policy: Optional[Policy]) -> Struct: ...
+def parse_email(raw_email: bytes, policy: Optional[Policy], storage: Optional[Storage] = None,
+                compact: bool = False, keep_raw_email: bool = True,
+                charset_detector: Optional[CharsetDetector] = None) -> Union[Struct, CompactStruct]: ...
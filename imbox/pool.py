@@ -0,0 +1,131 @@
+import imaplib
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import logging
+
+from imbox.imbox import Imbox
+
+logger = logging.getLogger(__name__)
+
+# Errors meaning the connection is unusable and must be replaced
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError, EOFError)
+
+
+class ImboxPool:
+    """
+    A thread-safe pool of authenticated Imbox connections to one account.
+
+    Connections are created on demand, up to ``size`` of them, and handed out
+    with the ``connection()`` context manager. A connection idle for more
+    than ``health_check_interval`` seconds is checked with a NOOP before
+    being handed out again, and replaced if it has been dropped.
+    """
+
+    def __init__(self, hostname, username=None, password=None, size=4,
+                 timeout=None, health_check_interval=60, **kwargs):
+        self.hostname = hostname
+        self.username = username
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._imbox_kwargs = dict(kwargs, hostname=hostname, username=username, password=password)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _connect(self):
+        logger.debug("Opening a new pooled connection to {}".format(self.hostname))
+        return Imbox(**self._imbox_kwargs)
+
+    def _is_alive(self, imbox):
+        try:
+            status, _ = imbox.connection.noop()
+        except CONNECTION_ERRORS as e:
+            logger.info("Pooled connection to {} dropped: {}".format(self.hostname, e))
+            return False
+        return status == 'OK'
+
+    def _discard(self, imbox):
+        try:
+            imbox.connection.logout()
+        except (imaplib.IMAP4.error,) + CONNECTION_ERRORS:
+            pass
+
+    def _checkout(self):
+        while True:
+            try:
+                imbox, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+
+            if time.monotonic() - last_used < self.health_check_interval or self._is_alive(imbox):
+                return imbox
+            self._discard(imbox)
+
+    def _checkin(self, imbox):
+        if self._closed:
+            self._discard(imbox)
+        else:
+            self._idle.put((imbox, time.monotonic()))
+
+    @contextmanager
+    def connection(self, folder='INBOX'):
+        """
+        Borrow a connection, with ``folder`` selected, so that the folder
+        selected by a previous borrower does not leak to the next one.
+
+        The folder is only re-selected when the connection has another one
+        selected. A connection failing with a network error is not returned
+        to the pool.
+        """
+        if self._closed:
+            raise imaplib.IMAP4.error("Connection pool is closed")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("No connection available in the pool after {}s".format(self.timeout))
+
+        try:
+            imbox = self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        healthy = True
+        try:
+            if imbox.selected_folder != folder:
+                imbox.select(folder)
+            yield imbox
+        except CONNECTION_ERRORS:
+            healthy = False
+            raise
+        finally:
+            if healthy:
+                self._checkin(imbox)
+            else:
+                self._discard(imbox)
+            self._slots.release()
+
+    def close(self):
+        """
+        Log out every idle connection; connections in use are logged out
+        when they are given back.
+        """
+        self._closed = True
+        while True:
+            try:
+                imbox, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                imbox.logout()
+            except (imaplib.IMAP4.error,) + CONNECTION_ERRORS as e:
+                logger.debug("Error while closing pooled connection: {}".format(e))
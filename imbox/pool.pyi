@@ -0,0 +1,19 @@
+from inspect import Traceback
+from typing import Any, ContextManager, Optional
+
+from imbox.imbox import Imbox
+
+
+class ImboxPool:
+
+    def __init__(self, hostname: str, username: Optional[str] = None, password: Optional[str] = None,
+                 size: int = 4, timeout: Optional[float] = None, health_check_interval: float = 60,
+                 **kwargs: Any) -> None: ...
+
+    def __enter__(self) -> 'ImboxPool': ...
+
+    def __exit__(self, type: Exception, value: str, traceback: Traceback) -> None: ...
+
+    def connection(self, folder: str = 'INBOX') -> ContextManager[Imbox]: ...
+
+    def close(self) -> None: ...
@@ -2,18 +2,114 @@ import datetime
 
 from imbox.utils import date_to_date_text
 
+HEADER_PREFIX = 'header__'
 
-def build_search_query(imap_attribute_lookup, **kwargs):
-    query = []
+
+def _format_value(value):
+    if isinstance(value, datetime.date):
+        value = date_to_date_text(value)
+    if isinstance(value, str) and '"' in value:
+        value = value.replace('"', "'")
+    return value
+
+
+def _search_key(imap_attribute_lookup, name, value):
+    if name.startswith(HEADER_PREFIX):
+        # header__X-Mailer, or header__x_mailer in a plain keyword argument
+        field = name[len(HEADER_PREFIX):].replace('_', '-')
+        return imap_attribute_lookup['header'].format(_format_value(field), _format_value(value))
+    return imap_attribute_lookup[name].format(_format_value(value))
+
+
+class Q:
+    """
+    A composable search condition: ``Q(**kwargs)`` takes the keyword
+    arguments of ``Imbox.messages()`` (all of which must match), and
+    conditions combine with ``&``, ``|`` and ``~`` into the AND, OR and NOT
+    of RFC 3501 SEARCH::
+
+        Q(sent_from='alice@example.com') | ~Q(size__lt=1024 ** 2)
+    """
+
+    AND = 'AND'
+    OR = 'OR'
+    NOT = 'NOT'
+
+    def __init__(self, *children, connector=AND, **kwargs):
+        self.children = list(children) + sorted(kwargs.items())
+        self.connector = connector
+
+    def _combine(self, other, connector):
+        if not isinstance(other, Q):
+            return NotImplemented
+        # a | b | c makes a single OR of three conditions
+        children = self.children if self.connector == connector else [self]
+        others = other.children if other.connector == connector else [other]
+        return Q(*(children + others), connector=connector)
+
+    def __and__(self, other):
+        return self._combine(other, self.AND)
+
+    def __or__(self, other):
+        return self._combine(other, self.OR)
+
+    def __invert__(self):
+        return Q(self, connector=self.NOT)
+
+    def _keys(self, imap_attribute_lookup):
+        keys = []
+        for child in self.children:
+            if isinstance(child, Q):
+                key = child.compile(imap_attribute_lookup)
+            else:
+                name, value = child
+                if value is None:
+                    continue
+                key = _search_key(imap_attribute_lookup, name, value)
+            if key is not None:
+                keys.append(key)
+        return keys
+
+    def compile(self, imap_attribute_lookup):
+        """
+        Return the SEARCH key of the condition, using
+        ``imap_attribute_lookup`` (e.g. ``Messages.IMAP_ATTRIBUTE_LOOKUP``),
+        or None when it has no criteria.
+        """
+        keys = self._keys(imap_attribute_lookup)
+        if not keys:
+            return None
+
+        if self.connector == self.NOT:
+            return 'NOT {}'.format(keys[0] if len(keys) == 1 else '({})'.format(' '.join(keys)))
+        if self.connector == self.OR:
+            # OR takes two search keys
+            key = keys[-1]
+            for other in reversed(keys[:-1]):
+                key = 'OR {} {}'.format(other, key)
+            return '({})'.format(key)
+        return keys[0] if len(keys) == 1 else '({})'.format(' '.join(keys))
+
+    def __repr__(self):
+        return 'Q({}: {})'.format(self.connector, ', '.join(
+            repr(child) if isinstance(child, Q) else '{}={!r}'.format(*child) for child in self.children))
+
+
+def build_search_query(imap_attribute_lookup, query=None, **kwargs):
+    """
+    Return the SEARCH criteria matching all of ``kwargs`` and the Q
+    ``query``, if given.
+    """
+    criteria = []
     for name, value in kwargs.items():
         if value is not None:
-            if isinstance(value, datetime.date):
-                value = date_to_date_text(value)
-            if isinstance(value, str) and '"' in value:
-                value = value.replace('"', "'")
-            query.append(imap_attribute_lookup[name].format(value))
-
-    if query:
-        return " ".join(query)
+            criteria.append(_search_key(imap_attribute_lookup, name, value))
+    if query is not None:
+        key = query.compile(imap_attribute_lookup)
+        if key is not None:
+            criteria.append(key)
+
+    if criteria:
+        return " ".join(criteria)
 
     return "(ALL)"
@@ -0,0 +1,19 @@
+from typing import Any, Dict, Optional, Union
+
+
+class Q:
+    AND: str
+    OR: str
+    NOT: str
+
+    def __init__(self, *children: Union['Q', tuple], connector: str = ..., **kwargs: Any) -> None: ...
+
+    def __and__(self, other: 'Q') -> 'Q': ...
+
+    def __or__(self, other: 'Q') -> 'Q': ...
+
+    def __invert__(self) -> 'Q': ...
+
+    def compile(self, imap_attribute_lookup: Dict[str, str]) -> Optional[str]: ...
+
+def build_search_query(imap_attribute_lookup: Dict[str, str], query: Optional[Q] = None, **kwargs: Any) -> str: ...
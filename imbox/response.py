@@ -0,0 +1,181 @@
+import re
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(
+    rb'\s*(?:'
+    rb'(?P<open>\()|(?P<close>\))'
+    rb'|"(?P<quoted>(?:[^"\\]|\\.)*)"'
+    rb'|(?P<literal>\{\d+\+?\}\s*$)'
+    rb'|(?P<atom>[^\s()"\[\]{}]+(?:\[[^\]]*\])?(?:<[\d.]+>)?)'
+    rb')')
+
+OPEN = object()
+CLOSE = object()
+
+
+def _atom_value(atom):
+    if atom.isdigit():
+        return int(atom)
+    if atom.upper() == b'NIL':
+        return None
+    return atom
+
+
+def tokenize(data):
+    """
+    Split the data returned by an imaplib command into IMAP tokens.
+
+    Literals (the ``(header, payload)`` tuples of imaplib) are emitted as
+    plain bytes tokens, so callers do not have to care about line breaks.
+    """
+    for item in data:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            text, literal = item
+        else:
+            text, literal = item, None
+
+        position = 0
+        while position < len(text):
+            match = TOKEN_RE.match(text, position)
+            if match is None or match.end() == position:
+                if text[position:].strip():
+                    raise ValueError("Unexpected data in IMAP response: {!r}".format(
+                        text[position:]))
+                break
+            position = match.end()
+
+            if match.group('open') is not None:
+                yield OPEN
+            elif match.group('close') is not None:
+                yield CLOSE
+            elif match.group('quoted') is not None:
+                yield re.sub(rb'\\(.)', rb'\1', match.group('quoted'))
+            elif match.group('atom') is not None:
+                yield _atom_value(match.group('atom'))
+
+        if literal is not None:
+            yield literal
+
+
+def _parse_list(tokens):
+    values = []
+    for token in tokens:
+        if token is CLOSE:
+            return values
+        if token is OPEN:
+            values.append(_parse_list(tokens))
+        else:
+            values.append(token)
+    raise ValueError("Unterminated list in IMAP response")
+
+
+def parse_tokens(data):
+    """
+    Parse imaplib response data into nested lists of values.
+
+    Numbers become ``int``, ``NIL`` becomes ``None`` and every other atom,
+    quoted string or literal is returned as ``bytes``.
+    """
+    tokens = tokenize(data)
+    values = []
+    for token in tokens:
+        if token is OPEN:
+            values.append(_parse_list(tokens))
+        elif token is CLOSE:
+            raise ValueError("Unbalanced parenthesis in IMAP response")
+        else:
+            values.append(token)
+    return values
+
+
+def parse_fetch_response(data):
+    """
+    Parse the data of an imaplib ``fetch``/``uid('fetch')`` call.
+
+    Returns one dict per FETCH response, mapping the upper-cased data item
+    names (``UID``, ``FLAGS``, ``BODY[]``, ``BODY[HEADER]``...) to their values.
+    Several messages in one response are split apart, whatever the order of
+    the data items the server chose.
+    """
+    values = parse_tokens(data)
+    responses = []
+    for index in range(0, len(values) - 1, 2):
+        attributes = values[index + 1]
+        if not isinstance(attributes, list):
+            logger.debug("Skipping unexpected FETCH data {!r}".format(attributes))
+            continue
+
+        response = {}
+        for position in range(0, len(attributes) - 1, 2):
+            name = attributes[position]
+            if isinstance(name, bytes):
+                response[name.decode('ascii', 'replace').upper()] = attributes[position + 1]
+        responses.append(response)
+    return responses
+
+
+def parse_esearch_response(data):
+    """
+    Parse the data of an ESEARCH response (RFC 4731), e.g.
+    ``(TAG "A5") UID COUNT 17 PARTIAL (1:50 4,7:9)``.
+
+    Returns a dict of the upper-cased return items (``COUNT``, ``MIN``,
+    ``MAX``, ``ALL``, ``PARTIAL``...) to their values; ``UID`` maps to True
+    when the results are UIDs. Only the last response is used when ``data``
+    holds several.
+    """
+    results = {}
+    for item in reversed(data or []):
+        if item is None:
+            continue
+        values = parse_tokens([item])
+        if values and isinstance(values[0], list):
+            values = values[1:]
+        position = 0
+        while position < len(values):
+            name = values[position]
+            if not isinstance(name, bytes):
+                position += 1
+                continue
+            name = name.decode('ascii', 'replace').upper()
+            if name == 'UID':
+                results[name] = True
+                position += 1
+            else:
+                results[name] = values[position + 1] if position + 1 < len(values) else None
+                position += 2
+        break
+    return results
+
+
+def parse_list_response(data):
+    """
+    Parse the data of an imaplib ``list`` call into ``(flags, delimiter,
+    name)`` tuples, e.g. ``(['\\HasNoChildren'], '/', 'INBOX')``.
+
+    Names are left in the modified UTF-7 of IMAP, as SELECT expects them.
+    """
+    mailboxes = []
+    for item in data or []:
+        if item is None:
+            continue
+        values = parse_tokens([item])
+        if len(values) < 3 or not isinstance(values[0], list):
+            logger.debug("Skipping unexpected LIST data {!r}".format(item))
+            continue
+        flags, delimiter, name = values[:3]
+        mailboxes.append(([_text(flag) for flag in flags], _text(delimiter), _text(name)))
+    return mailboxes
+
+
+def _text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return str(value)
+    return value.decode('utf-8', 'replace')
@@ -0,0 +1,13 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+ResponseData = List[Union[None, bytes, Tuple[bytes, bytes]]]
+
+def tokenize(data: ResponseData) -> Iterator[Union[object, int, bytes, None]]: ...
+
+def parse_tokens(data: ResponseData) -> List[Any]: ...
+
+def parse_fetch_response(data: ResponseData) -> List[Dict[str, Any]]: ...
+
+def parse_esearch_response(data: ResponseData) -> Dict[str, Any]: ...
+
+def parse_list_response(data: ResponseData) -> List[Tuple[List[str], Optional[str], str]]: ...
@@ -0,0 +1,153 @@
+import queue
+import threading
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of UIDs of a folder fetched by one task, over one connection
+SHARD_SIZE = 500
+
+# Messages fetched ahead of the consumer, at most
+BUFFER_SIZE = 256
+
+# Modes whose messages load their body later over the connection they were
+# fetched on, which is back in the pool by then
+LAZY_MODES = ('headers_only', 'envelope', 'lazy_attachments', 'preview_bytes')
+
+_DONE = object()
+
+
+class _Failure:
+
+    def __init__(self, error):
+        self.error = error
+
+
+class Scanner:
+    """
+    Fetch the messages of several folders over the connections of an
+    ImboxPool, ``concurrency`` at a time (the size of the pool by default).
+
+    Every folder is searched once, then its UIDs are split into shards of
+    ``shard_size`` UIDs fetched in parallel, each over a connection which
+    has the folder selected already whenever possible. Iterating yields
+    ``(folder, uid, message)`` tuples in the order they are fetched.
+
+    ``folders`` defaults to every selectable folder of the account and
+    ``uid_range`` (e.g. ``'1:5000'``) restricts the UIDs searched; other
+    keyword arguments are given to ``Imbox.messages()``, e.g.
+    ``unread=True`` or ``compact=True``. Modes loading messages lazily
+    (``headers_only``, ``envelope``, ``lazy_attachments``,
+    ``preview_bytes``) are refused: the connection a message would load
+    its body from is used by another worker by then.
+
+    At most ``buffer_size`` fetched messages wait for the consumer; the
+    workers stop when the iteration is, or once one of them failed, whose
+    error is then raised.
+    """
+
+    def __init__(self, pool, folders=None, uid_range=None, concurrency=None,
+                 shard_size=SHARD_SIZE, buffer_size=BUFFER_SIZE, **kwargs):
+        lazy_modes = [mode for mode in LAZY_MODES if kwargs.get(mode)]
+        if lazy_modes:
+            raise ValueError("The scanner cannot fetch messages lazily ({}), their connection "
+                             "goes back to the pool".format(', '.join(lazy_modes)))
+        self.pool = pool
+        self.folders = folders
+        self.uid_range = uid_range
+        self.concurrency = concurrency or pool.size
+        self.shard_size = shard_size
+        self.buffer_size = buffer_size
+        self.kwargs = kwargs
+
+    def _folders(self):
+        if self.folders is not None:
+            return list(self.folders)
+        with self.pool.connection() as imbox:
+            return imbox.folder_names()
+
+    def _plan(self, folder):
+        kwargs = dict(self.kwargs)
+        if self.uid_range is not None:
+            kwargs['uid__range'] = self.uid_range
+        with self.pool.connection(folder) as imbox:
+            uids = imbox.messages(**kwargs).uids
+        logger.debug("Scanning {} messages of {}".format(len(uids), folder))
+        return [('fetch', folder, uids[start:start + self.shard_size])
+                for start in range(0, len(uids), self.shard_size)]
+
+    def _fetch(self, folder, uids, results, stop, slots):
+        with self.pool.connection(folder) as imbox:
+            for uid, message in imbox.messages(uids=uids, **self.kwargs):
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                results.put((folder, uid, message))
+
+    def _work(self, tasks, results, stop, slots, state):
+        while not stop.is_set():
+            task = tasks.get()
+            if task is None:
+                break
+            try:
+                if task[0] == 'plan':
+                    shards = self._plan(task[1])
+                    with state['lock']:
+                        state['pending'] += len(shards)
+                    for shard in shards:
+                        tasks.put(shard)
+                else:
+                    self._fetch(task[1], task[2], results, stop, slots)
+            except BaseException as e:
+                stop.set()
+                results.put(_Failure(e))
+            finally:
+                with state['lock']:
+                    state['pending'] -= 1
+                    finished = state['pending'] == 0
+                if finished:
+                    results.put(_DONE)
+
+    def __iter__(self):
+        folders = self._folders()
+        if not folders:
+            return
+
+        tasks = queue.Queue()
+        results = queue.Queue()
+        # Messages in results, which failures and the end of the scan skip
+        slots = threading.Semaphore(self.buffer_size)
+        stop = threading.Event()
+        state = {'lock': threading.Lock(), 'pending': len(folders)}
+        for folder in folders:
+            tasks.put(('plan', folder))
+
+        workers = [threading.Thread(target=self._work, args=(tasks, results, stop, slots, state), daemon=True)
+                   for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            while True:
+                result = results.get()
+                if result is _DONE:
+                    break
+                if isinstance(result, _Failure):
+                    raise result.error
+                slots.release()
+                yield result
+        finally:
+            stop.set()
+            for _ in workers:
+                tasks.put(None)
+            for worker in workers:
+                worker.join()
+
+
+def scan(pool, folders=None, uid_range=None, concurrency=None, **kwargs):
+    """
+    Iterate over ``(folder, uid, message)`` for the messages of ``folders``,
+    fetched in parallel over the connections of ``pool``; see Scanner.
+    """
+    return iter(Scanner(pool, folders, uid_range, concurrency, **kwargs))
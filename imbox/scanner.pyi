@@ -0,0 +1,26 @@
+from typing import Any, Iterator, Optional, Sequence, Tuple
+
+from imbox.parser import Struct
+from imbox.pool import ImboxPool
+
+SHARD_SIZE: int
+BUFFER_SIZE: int
+LAZY_MODES: Tuple[str, ...]
+
+
+class Scanner:
+    pool: ImboxPool
+    folders: Optional[Sequence[str]]
+    uid_range: Optional[str]
+    concurrency: int
+    shard_size: int
+    buffer_size: int
+
+    def __init__(self, pool: ImboxPool, folders: Optional[Sequence[str]] = None,
+                 uid_range: Optional[str] = None, concurrency: Optional[int] = None,
+                 shard_size: int = ..., buffer_size: int = ..., **kwargs: Any) -> None: ...
+
+    def __iter__(self) -> Iterator[Tuple[str, bytes, Struct]]: ...
+
+def scan(pool: ImboxPool, folders: Optional[Sequence[str]] = None, uid_range: Optional[str] = None,
+         concurrency: Optional[int] = None, **kwargs: Any) -> Iterator[Tuple[str, bytes, Struct]]: ...
@@ -0,0 +1,242 @@
+import html
+import re
+import sqlite3
+import threading
+
+import logging
+
+from imbox.parser import parse_email
+from imbox.structure import HTML_SKIPPED_RE, HTML_TAG_RE, WHITESPACE_RE
+from imbox.utils import UidList, chunked
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_folders (
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    PRIMARY KEY (account, folder)
+);
+CREATE TABLE IF NOT EXISTS search_messages (
+    id INTEGER PRIMARY KEY,
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    has_body INTEGER NOT NULL,
+    raw BLOB,
+    UNIQUE (account, folder, uidvalidity, uid)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_text USING fts5 (subject, addresses, body);
+"""
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def match_query(text):
+    """
+    Return an FTS5 query matching the messages containing all the words of
+    ``text``, so that punctuation (``re:``, ``foo-bar``) is not read as
+    FTS5 syntax.
+    """
+    return ' '.join('"{}"'.format(token) for token in TOKEN_RE.findall(text))
+
+
+def _addresses(message):
+    addresses = []
+    for name in ('sent_from', 'sent_to', 'cc'):
+        for address in getattr(message, name, None) or []:
+            addresses.extend(value for value in (address.get('name'), address.get('email')) if value)
+    return ' '.join(addresses)
+
+
+def message_text(message, with_body=True):
+    """
+    Return the ``(subject, addresses, body)`` indexed for a parsed message;
+    the body is its plain text parts, else its HTML ones stripped of tags.
+    """
+    body = ''
+    if with_body:
+        parts = (getattr(message, 'body', None) or {})
+        if parts.get('plain'):
+            body = ' '.join(parts['plain'])
+        elif parts.get('html'):
+            body = ' '.join(html.unescape(HTML_TAG_RE.sub(' ', HTML_SKIPPED_RE.sub(' ', part)))
+                            for part in parts['html'])
+    elif getattr(message, 'preview', None):
+        body = message.preview
+    return getattr(message, 'subject', None) or '', _addresses(message), WHITESPACE_RE.sub(' ', body).strip()
+
+
+class SearchIndex:
+    """
+    A local full-text index (SQLite FTS5) of the subject, addresses and plain
+    text bodies of messages, searched without contacting the server.
+
+    Messages are keyed by ``(account, folder, UIDVALIDITY, UID)`` like in
+    MessageCache, and the index of a folder is dropped when its UIDVALIDITY
+    changes. With ``keep_raw`` the raw messages are stored too, so that
+    ``messages()`` returns them parsed.
+    """
+
+    def __init__(self, path=':memory:', keep_raw=False):
+        self.path = path
+        self.keep_raw = keep_raw
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        try:
+            with self._db:
+                self._db.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            self._db.close()
+            raise sqlite3.NotSupportedError("SQLite lacks the FTS5 extension: {}".format(e))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def folder(self, account, folder, uidvalidity):
+        """
+        Return the index of one folder, dropping it if UIDVALIDITY changed.
+        """
+        with self._lock, self._db:
+            row = self._db.execute('SELECT uidvalidity FROM search_folders WHERE account = ? AND folder = ?',
+                                   (account, folder)).fetchone()
+            if row is not None and row[0] != uidvalidity:
+                logger.info("UIDVALIDITY of {} changed, dropping its search index".format(folder))
+                self._delete('account = ? AND folder = ?', (account, folder))
+            if row is None or row[0] != uidvalidity:
+                self._db.execute('INSERT OR REPLACE INTO search_folders VALUES (?, ?, ?)',
+                                 (account, folder, uidvalidity))
+
+        return FolderSearchIndex(self, account, folder, uidvalidity)
+
+    def _delete(self, where, parameters):
+        self._db.execute('DELETE FROM search_text WHERE rowid IN (SELECT id FROM search_messages WHERE {})'
+                         .format(where), parameters)
+        self._db.execute('DELETE FROM search_messages WHERE {}'.format(where), parameters)
+
+    def add_many(self, account, folder, uidvalidity, messages, with_body=True, raw_emails=None):
+        """
+        Index ``(uid, message)`` tuples of parsed messages. Messages already
+        indexed with their body are not replaced by ones without.
+
+        ``raw_emails`` maps UIDs to the raw messages as fetched, stored
+        with ``keep_raw``.
+        """
+        raw_emails = raw_emails or {}
+        rows = []
+        for uid, message in messages:
+            raw = raw_emails.get(uid) if self.keep_raw else None
+            rows.append((int(uid), raw, message_text(message, with_body)))
+
+        with self._lock, self._db:
+            for uid, raw, text in rows:
+                row = self._db.execute('SELECT id, has_body FROM search_messages WHERE account = ? AND folder = ? '
+                                       'AND uidvalidity = ? AND uid = ?',
+                                       (account, folder, uidvalidity, uid)).fetchone()
+                if row is not None:
+                    if row[1] and not with_body:
+                        continue
+                    self._db.execute('DELETE FROM search_text WHERE rowid = ?', (row[0],))
+                    self._db.execute('DELETE FROM search_messages WHERE id = ?', (row[0],))
+                cursor = self._db.execute(
+                    'INSERT INTO search_messages (account, folder, uidvalidity, uid, has_body, raw) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', (account, folder, uidvalidity, uid, int(with_body), raw))
+                self._db.execute('INSERT INTO search_text (rowid, subject, addresses, body) VALUES (?, ?, ?, ?)',
+                                 (cursor.lastrowid,) + text)
+        logger.debug("Indexed {} messages of {}".format(len(rows), folder))
+
+    def remove_many(self, account, folder, uidvalidity, uids):
+        """Remove expunged messages from the index"""
+        with self._lock, self._db:
+            for batch in chunked([int(uid) for uid in uids], 500):
+                self._delete('account = ? AND folder = ? AND uidvalidity = ? AND uid IN ({})'
+                             .format(','.join('?' * len(batch))), [account, folder, uidvalidity] + batch)
+
+    def last_uid(self, account, folder, uidvalidity):
+        with self._lock:
+            row = self._db.execute('SELECT MAX(uid) FROM search_messages WHERE account = ? AND folder = ? '
+                                   'AND uidvalidity = ?', (account, folder, uidvalidity)).fetchone()
+        return row[0] or 0
+
+    def _search(self, columns, query, account, folder, limit, raw_query):
+        where = ['search_text MATCH ?']
+        parameters = [query if raw_query else match_query(query)]
+        if parameters[0] == '':
+            return []
+        for name, value in (('account', account), ('folder', folder)):
+            if value is not None:
+                where.append('m.{} = ?'.format(name))
+                parameters.append(value)
+        sql = ('SELECT {} FROM search_text JOIN search_messages m ON m.id = search_text.rowid '
+               'JOIN search_folders f ON f.account = m.account AND f.folder = m.folder '
+               'AND f.uidvalidity = m.uidvalidity WHERE {} ORDER BY rank'.format(columns, ' AND '.join(where)))
+        if limit is not None:
+            sql += ' LIMIT {:d}'.format(limit)
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def search(self, query, account=None, folder=None, limit=None, raw_query=False):
+        """
+        Return ``(account, folder, uid)`` tuples of the indexed messages
+        containing all the words of ``query``, best matches first.
+
+        With ``raw_query`` the query is given to FTS5 as is, e.g.
+        ``subject:invoice OR body:"credit note"``.
+        """
+        return [(account_, folder_, str(uid).encode('ascii')) for account_, folder_, uid in self._search(
+            'm.account, m.folder, m.uid', query, account, folder, limit, raw_query)]
+
+    def messages(self, query, account=None, folder=None, limit=None, raw_query=False, parser_policy=None):
+        """
+        Yield ``(folder, uid, message)`` for the matching messages whose raw
+        message is stored (see ``keep_raw``), parsed from the index.
+        """
+        rows = self._search('m.folder, m.uid, m.raw', query, account, folder, limit, raw_query)
+        for folder_, uid, raw in rows:
+            if raw is not None:
+                yield folder_, str(uid).encode('ascii'), parse_email(bytes(raw), policy=parser_policy)
+
+
+class FolderSearchIndex:
+    """
+    The part of a SearchIndex for one folder at one UIDVALIDITY.
+    """
+
+    def __init__(self, index, account, folder, uidvalidity):
+        self.index = index
+        self.account = account
+        self.folder = folder
+        self.uidvalidity = uidvalidity
+
+    @property
+    def keep_raw(self):
+        return self.index.keep_raw
+
+    def add_many(self, messages, with_body=True, raw_emails=None):
+        self.index.add_many(self.account, self.folder, self.uidvalidity, messages, with_body, raw_emails)
+
+    def remove_many(self, uids):
+        self.index.remove_many(self.account, self.folder, self.uidvalidity, uids)
+
+    def last_uid(self):
+        """The highest UID indexed, to fetch the newer messages only"""
+        return self.index.last_uid(self.account, self.folder, self.uidvalidity)
+
+    def search(self, query, limit=None, raw_query=False):
+        """Return a UidList of the matching messages, best matches first"""
+        return UidList(uid for _, _, uid in self.index.search(query, self.account, self.folder, limit, raw_query))
+
+    def messages(self, query, limit=None, raw_query=False, parser_policy=None):
+        """Yield ``(uid, message)`` for the matching messages stored with ``keep_raw``"""
+        for _, uid, message in self.index.messages(query, self.account, self.folder, limit, raw_query,
+                                                   parser_policy):
+            yield uid, message
@@ -0,0 +1,64 @@
+from email._policybase import Policy
+from imbox.parser import Struct
+from imbox.utils import UidList
+from typing import Dict, Generator, Iterable, List, Optional, Tuple, Union
+
+SCHEMA: str
+
+def match_query(text: str) -> str: ...
+
+def message_text(message: Struct, with_body: bool = True) -> Tuple[str, str, str]: ...
+
+
+class SearchIndex:
+    path: str
+    keep_raw: bool
+
+    def __init__(self, path: str = ':memory:', keep_raw: bool = False) -> None: ...
+
+    def __enter__(self) -> 'SearchIndex': ...
+
+    def __exit__(self, type, value, traceback) -> None: ...
+
+    def close(self) -> None: ...
+
+    def folder(self, account: str, folder: str, uidvalidity: int) -> 'FolderSearchIndex': ...
+
+    def add_many(self, account: str, folder: str, uidvalidity: int,
+                 messages: Iterable[Tuple[Union[bytes, int], Struct]], with_body: bool = True,
+                 raw_emails: Optional[Dict[bytes, bytes]] = None) -> None: ...
+
+    def remove_many(self, account: str, folder: str, uidvalidity: int, uids: Iterable[Union[bytes, int]]) -> None: ...
+
+    def last_uid(self, account: str, folder: str, uidvalidity: int) -> int: ...
+
+    def search(self, query: str, account: Optional[str] = None, folder: Optional[str] = None,
+               limit: Optional[int] = None, raw_query: bool = False) -> List[Tuple[str, str, bytes]]: ...
+
+    def messages(self, query: str, account: Optional[str] = None, folder: Optional[str] = None,
+                 limit: Optional[int] = None, raw_query: bool = False,
+                 parser_policy: Optional[Policy] = None) -> Generator[Tuple[str, bytes, Struct], None, None]: ...
+
+
+class FolderSearchIndex:
+    index: SearchIndex
+    account: str
+    folder: str
+    uidvalidity: int
+
+    def __init__(self, index: SearchIndex, account: str, folder: str, uidvalidity: int) -> None: ...
+
+    @property
+    def keep_raw(self) -> bool: ...
+
+    def add_many(self, messages: Iterable[Tuple[Union[bytes, int], Struct]], with_body: bool = True,
+                 raw_emails: Optional[Dict[bytes, bytes]] = None) -> None: ...
+
+    def remove_many(self, uids: Iterable[Union[bytes, int]]) -> None: ...
+
+    def last_uid(self) -> int: ...
+
+    def search(self, query: str, limit: Optional[int] = None, raw_query: bool = False) -> UidList: ...
+
+    def messages(self, query: str, limit: Optional[int] = None, raw_query: bool = False,
+                 parser_policy: Optional[Policy] = None) -> Generator[Tuple[bytes, Struct], None, None]: ...
@@ -0,0 +1,128 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import weakref
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Attachments up to this size stay in memory by default
+SPOOL_THRESHOLD = 1024 * 1024
+
+
+class MemoryStorage:
+    """
+    Keeps attachment contents in memory, as ``io.BytesIO``.
+    """
+
+    def store(self, data):
+        return io.BytesIO(data)
+
+
+class SpooledStorage:
+    """
+    Keeps attachments up to ``threshold`` bytes in memory and writes larger
+    ones to temporary files, removed once their content is released.
+
+    With ``memory_budget`` (in bytes), attachments are also written to disk
+    while the contents held in memory, and not yet garbage collected, add up
+    to more than the budget. The budget is counted per storage, so Messages
+    sharing one share it; ``Messages(memory_budget=...)`` gets its own.
+    """
+
+    def __init__(self, threshold=SPOOL_THRESHOLD, memory_budget=None, dir=None):
+        self.threshold = threshold
+        self.memory_budget = memory_budget
+        self.dir = dir
+        self.in_memory = 0
+        self._lock = threading.Lock()
+
+    def _release(self, size):
+        with self._lock:
+            self.in_memory -= size
+
+    def _reserve(self, size):
+        with self._lock:
+            if size > self.threshold:
+                return False
+            if self.memory_budget is not None and self.in_memory + size > self.memory_budget:
+                return False
+            self.in_memory += size
+            return True
+
+    def store(self, data):
+        size = len(data)
+        in_memory = self._reserve(size)
+
+        content = tempfile.SpooledTemporaryFile(max_size=self.threshold, dir=self.dir)
+        content.write(data)
+        if in_memory:
+            weakref.finalize(content, self._release, size)
+        else:
+            logger.debug("Spilling attachment of {} bytes to disk".format(size))
+            content.rollover()
+        content.seek(0)
+        return content
+
+
+class StoredFile:
+    """
+    A file-like object reading a stored attachment, opened on first use so
+    that many of them do not hold as many file descriptors.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'rb')
+        return self._file
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._open(), name)
+
+    def __iter__(self):
+        return iter(self._open())
+
+    def __getstate__(self):
+        return {'path': self.path, '_file': None}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class DirectoryStorage:
+    """
+    Writes attachments larger than ``threshold`` bytes to ``path``, named by
+    the SHA-256 of their content so an attachment received many times is
+    stored once. Files are kept; removing them is left to the caller.
+    """
+
+    def __init__(self, path, threshold=0):
+        self.path = path
+        self.threshold = threshold
+
+    def store(self, data):
+        if len(data) <= self.threshold:
+            return io.BytesIO(data)
+
+        digest = hashlib.sha256(data).hexdigest()
+        directory = os.path.join(self.path, digest[:2])
+        path = os.path.join(directory, digest)
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            # Write then rename, concurrent writers of one content agree anyway
+            with tempfile.NamedTemporaryFile(dir=directory, delete=False) as stored:
+                stored.write(data)
+            os.replace(stored.name, path)
+            logger.debug("Stored attachment of {} bytes as {}".format(len(data), path))
+        return StoredFile(path)
@@ -0,0 +1,47 @@
+import io
+from typing import Any, BinaryIO, Iterator, Optional, Protocol
+
+SPOOL_THRESHOLD: int
+
+
+class Storage(Protocol):
+
+    def store(self, data: bytes) -> BinaryIO: ...
+
+
+class MemoryStorage:
+
+    def store(self, data: bytes) -> io.BytesIO: ...
+
+
+class SpooledStorage:
+    threshold: int
+    memory_budget: Optional[int]
+    dir: Optional[str]
+    in_memory: int
+
+    def __init__(self, threshold: int = ..., memory_budget: Optional[int] = None,
+                 dir: Optional[str] = None) -> None: ...
+
+    def store(self, data: bytes) -> BinaryIO: ...
+
+
+class StoredFile:
+    path: str
+
+    def __init__(self, path: str) -> None: ...
+
+    def __getattr__(self, name: str) -> Any: ...
+
+    def __iter__(self) -> Iterator[bytes]: ...
+
+    def close(self) -> None: ...
+
+
+class DirectoryStorage:
+    path: str
+    threshold: int
+
+    def __init__(self, path: str, threshold: int = 0) -> None: ...
+
+    def store(self, data: bytes) -> BinaryIO: ...
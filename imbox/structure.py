@@ -0,0 +1,347 @@
+import binascii
+import codecs
+import html
+import io
+import quopri
+import re
+import email.utils
+from email.message import Message
+from functools import partial
+
+import logging
+
+from imbox import charset as charset_detection
+from imbox.parser import (LazyStruct, decode_content, decode_mail_header, fetch_email_by_uid,
+                          fetch_responses_by_uids, parse_email, parse_fetched_headers)
+from imbox.utils import lookup_charset
+
+logger = logging.getLogger(__name__)
+
+HTML_SKIPPED_RE = re.compile(r'<(style|script|head)\b.*?(</\1\s*>|$)', re.IGNORECASE | re.DOTALL)
+# Tags, comments, and a tag cut by the end of a partial fetch
+HTML_TAG_RE = re.compile(r'<!--.*?(-->|$)|<[^>]*(>|$)', re.DOTALL)
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+class BodyPart:
+    """
+    One leaf of a BODYSTRUCTURE response.
+    """
+
+    def __init__(self, section, content_type, params, content_id, encoding, size,
+                 disposition=None, disposition_params=None):
+        self.section = section
+        self.content_type = content_type
+        self.params = params
+        self.content_id = content_id
+        self.encoding = encoding
+        self.size = size
+        self.disposition = disposition
+        self.disposition_params = disposition_params or {}
+
+    @property
+    def maintype(self):
+        return self.content_type.split('/', 1)[0]
+
+    @property
+    def filename(self):
+        return (_decode_filename(self.disposition_params, 'filename')
+                or _decode_filename(self.params, 'name'))
+
+    def is_body(self):
+        return (self.content_type in ('text/plain', 'text/html')
+                and self.disposition in (None, 'inline'))
+
+    def is_attachment(self):
+        return not self.is_body() and self.disposition in ('attachment', 'inline')
+
+    def __repr__(self):
+        return 'BodyPart({}, {})'.format(self.section, self.content_type)
+
+
+class PartContent:
+    """
+    A file-like object downloading its body part on first use.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._buffer = None
+
+    def _load(self):
+        if self._buffer is None:
+            self._buffer = io.BytesIO(self._loader())
+            self._loader = None
+        return self._buffer
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def __iter__(self):
+        return iter(self._load())
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return str(value)
+    return value.decode('utf-8', 'replace')
+
+
+def _params(values):
+    if not isinstance(values, list):
+        return {}
+    return {_text(values[index]).lower(): _text(values[index + 1])
+            for index in range(0, len(values) - 1, 2)}
+
+
+def _decode_filename(params, name):
+    pairs = [(key, '"{}"'.format(value)) for key, value in params.items()
+             if key == name or key.startswith(name + '*')]
+    if not pairs:
+        return None
+
+    for key, value in email.utils.decode_params([('', '')] + pairs)[1:]:
+        if key != name:
+            continue
+        if isinstance(value, tuple):
+            # RFC 2231 encoded value, already decoded from its charset
+            return email.utils.unquote(email.utils.collapse_rfc2231_value(value))
+        value = email.utils.unquote(value)
+        return decode_mail_header(value) if '=?' in value else value
+    return None
+
+
+def parse_body_structure(structure, section=''):
+    """
+    Flatten a BODYSTRUCTURE response into a list of BodyPart leaves.
+
+    Sections are numbered as BODY[<section>] expects them. Attached
+    messages (message/rfc822) are returned as a single part.
+    """
+    if isinstance(structure[0], list):
+        parts = []
+        prefix = section + '.' if section else ''
+        index = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            index += 1
+            parts.extend(parse_body_structure(child, prefix + str(index)))
+        return parts
+
+    maintype, subtype = _text(structure[0]).lower(), _text(structure[1]).lower()
+    content_type = '{}/{}'.format(maintype, subtype)
+
+    # Position of the disposition in the extension data (RFC 3501, 7.4.2)
+    if maintype == 'text':
+        extension = 9
+    elif content_type == 'message/rfc822':
+        extension = 11
+    else:
+        extension = 8
+
+    disposition, disposition_params = None, None
+    if len(structure) > extension and isinstance(structure[extension], list):
+        disposition = _text(structure[extension][0]).lower()
+        disposition_params = _params(structure[extension][1])
+
+    return [BodyPart(section=section or '1',
+                     content_type=content_type,
+                     params=_params(structure[2]),
+                     content_id=_text(structure[3]),
+                     encoding=(_text(structure[5]) or '7bit').lower(),
+                     size=structure[6],
+                     disposition=disposition,
+                     disposition_params=disposition_params)]
+
+
+def part_to_message(part, payload):
+    """
+    Wrap the raw payload of a body part in an email Message, so that the
+    transfer and charset decoding of the parser can be applied to it.
+    """
+    message = Message()
+    message['Content-Type'] = part.content_type
+    if part.params.get('charset'):
+        message.set_param('charset', part.params['charset'])
+    message['Content-Transfer-Encoding'] = part.encoding
+    message.set_payload(payload.decode('ascii', 'surrogateescape'))
+    return message
+
+
+def fetch_part_by_uid(uid, part, connection):
+    """
+    Download and decode a single body part of a message.
+    """
+    key = 'BODY[{}]'.format(part.section)
+    responses = fetch_responses_by_uids([uid], connection, '(BODY.PEEK[{}])'.format(part.section), key)
+    for _, response in responses:
+        logger.debug("Fetched part {} of UID {}".format(part.section, int(uid)))
+        return part_to_message(part, response[key]).get_payload(decode=True)
+    return b''
+
+
+def parse_attachment_part(uid, part, connection):
+    """
+    Build the attachment dict of ``parse_attachment`` without downloading
+    the content; ``size`` is the encoded size reported by the server.
+    """
+    return {
+        'content-type': part.content_type,
+        'size': part.size,
+        'content': PartContent(partial(fetch_part_by_uid, uid, part, connection)),
+        'content-id': part.content_id,
+        'filename': part.filename or '',
+        'section': part.section,
+    }
+
+
+def fetch_structures_by_uids(uids, connection, parser_policy):
+    """
+    Fetch headers, BODYSTRUCTURE and text parts of several messages.
+
+    Attachments are described from BODYSTRUCTURE and their content is only
+    downloaded, with BODY.PEEK[<section>], when it is read. Yields
+    ``(uid, LazyStruct)`` tuples in the order of ``uids``.
+    """
+    responses = list(fetch_responses_by_uids(
+        uids, connection, '(BODYSTRUCTURE BODY.PEEK[HEADER] RFC822.SIZE FLAGS)', 'BODYSTRUCTURE'))
+
+    body_parts = {}
+    uids_by_sections = {}
+    for uid, response in responses:
+        parts = parse_body_structure(response['BODYSTRUCTURE'])
+        body_parts[uid] = parts
+        sections = tuple(part.section for part in parts if part.is_body())
+        if sections:
+            uids_by_sections.setdefault(sections, []).append(uid)
+
+    # One command for every set of messages sharing the same text sections
+    payloads = {}
+    for sections, section_uids in uids_by_sections.items():
+        items = '({})'.format(' '.join('BODY.PEEK[{}]'.format(section) for section in sections))
+        required = 'BODY[{}]'.format(sections[0])
+        for uid, response in fetch_responses_by_uids(section_uids, connection, items, required):
+            payloads[uid] = response
+
+    for uid, response in responses:
+        parsed_email = parse_email(response.get('BODY[HEADER]') or b'', policy=parser_policy).__dict__
+        parsed_email.pop('raw_email', None)
+
+        body = {'plain': [], 'html': []}
+        attachments = []
+        for part in body_parts[uid]:
+            if part.is_body():
+                payload = payloads.get(uid, {}).get('BODY[{}]'.format(part.section))
+                if payload is not None:
+                    content = decode_content(part_to_message(part, payload))
+                    body['plain' if part.content_type == 'text/plain' else 'html'].append(content)
+            elif part.is_attachment():
+                attachments.append(parse_attachment_part(uid, part, connection))
+
+        parsed_email['body'] = body
+        parsed_email['attachments'] = attachments
+        parsed_email['flags'] = list(response.get('FLAGS') or [])
+        parsed_email['size'] = response.get('RFC822.SIZE')
+
+        yield uid, LazyStruct(partial(fetch_email_by_uid, uid, connection, parser_policy),
+                              **parsed_email)
+
+
+def preview_part(parts):
+    """
+    The part a preview is made of: the first text/plain body part, or else
+    the first text/html one.
+    """
+    bodies = [part for part in parts if part.is_body()]
+    for part in bodies:
+        if part.content_type == 'text/plain':
+            return part
+    return bodies[0] if bodies else None
+
+
+def _decode_truncated_transfer(encoding, payload):
+    """
+    Undo the transfer encoding of the start of a part, dropping the
+    incomplete quantum or escape the truncation may have left at its end.
+    """
+    if encoding == 'base64':
+        payload = re.sub(rb'[^A-Za-z0-9+/=]', b'', payload)
+        payload = payload[:len(payload) // 4 * 4]
+        try:
+            return binascii.a2b_base64(payload)
+        except binascii.Error:
+            logger.debug("Invalid base64 in a partial body part")
+            return b''
+    if encoding == 'quoted-printable':
+        escape = payload.rfind(b'=', len(payload) - 2)
+        if escape != -1:
+            payload = payload[:escape]
+        return quopri.decodestring(payload)
+    return payload
+
+
+def decode_preview(part, payload, sender=None):
+    """
+    Decode the first bytes of a text body part into a one-line snippet.
+
+    ``payload`` may stop anywhere: in a base64 quantum, a quoted-printable
+    escape, a multi-byte character or an HTML tag.
+    """
+    content = _decode_truncated_transfer(part.encoding, payload)
+
+    label = part.params.get('charset')
+    # UTF-8 when undeclared, like decode_content
+    encoding = lookup_charset(label) if label else 'utf-8'
+    if encoding is None:
+        encoding = lookup_charset(charset_detection.default_detector.detect(content, label, sender)
+                                  or 'utf-8') or 'utf-8'
+    # Not final: a character cut at the end is dropped rather than replaced
+    text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(content, final=False)
+
+    if part.content_type == 'text/html':
+        text = html.unescape(HTML_TAG_RE.sub(' ', HTML_SKIPPED_RE.sub(' ', text)))
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+
+def fetch_previews_by_uids(uids, connection, parser_policy, preview_bytes):
+    """
+    Fetch the headers of several messages and the first ``preview_bytes``
+    bytes of their text part, with BODY.PEEK[<section>]<0.N>.
+
+    Yields ``(uid, LazyStruct)`` tuples with a ``preview`` snippet next to
+    the headers; the body and attachments are downloaded when first accessed.
+    """
+    responses = list(fetch_responses_by_uids(
+        uids, connection, '(BODYSTRUCTURE BODY.PEEK[HEADER] RFC822.SIZE FLAGS)', 'BODYSTRUCTURE'))
+
+    parts = {}
+    uids_by_section = {}
+    for uid, response in responses:
+        part = preview_part(parse_body_structure(response['BODYSTRUCTURE']))
+        if part is not None:
+            parts[uid] = part
+            uids_by_section.setdefault(part.section, []).append(uid)
+
+    # One command for every set of messages whose text is in the same section
+    payloads = {}
+    for section, section_uids in uids_by_section.items():
+        key = 'BODY[{}]<0>'.format(section)
+        items = '(BODY.PEEK[{}]<0.{}>)'.format(section, preview_bytes)
+        for uid, response in fetch_responses_by_uids(section_uids, connection, items, key):
+            payloads[uid] = response[key]
+
+    for uid, response in responses:
+        parsed_email = parse_fetched_headers(response, parser_policy)
+        preview = ''
+        if uid in payloads:
+            sender = next((address['email'] for address in parsed_email.get('sent_from') or []), None)
+            preview = decode_preview(parts[uid], payloads[uid], sender)
+        parsed_email['preview'] = preview
+
+        yield uid, LazyStruct(partial(fetch_email_by_uid, uid, connection, parser_policy),
+                              **parsed_email)
@@ -0,0 +1,60 @@
+import io
+from email.message import Message
+from imaplib import IMAP4_SSL
+from email._policybase import Policy
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple, Union
+
+from imbox.parser import LazyStruct
+
+
+class BodyPart:
+    section: str
+    content_type: str
+    params: Dict[str, str]
+    content_id: Optional[str]
+    encoding: str
+    size: int
+    disposition: Optional[str]
+    disposition_params: Dict[str, str]
+
+    def __init__(self, section: str, content_type: str, params: Dict[str, str],
+                 content_id: Optional[str], encoding: str, size: int,
+                 disposition: Optional[str] = None,
+                 disposition_params: Optional[Dict[str, str]] = None) -> None: ...
+
+    @property
+    def maintype(self) -> str: ...
+
+    @property
+    def filename(self) -> Optional[str]: ...
+
+    def is_body(self) -> bool: ...
+
+    def is_attachment(self) -> bool: ...
+
+
+class PartContent:
+
+    def __init__(self, loader: Callable[[], bytes]) -> None: ...
+
+    def __getattr__(self, name: str) -> Any: ...
+
+def parse_body_structure(structure: list, section: str = '') -> List[BodyPart]: ...
+
+def part_to_message(part: BodyPart, payload: bytes) -> Message: ...
+
+def fetch_part_by_uid(uid: bytes, part: BodyPart, connection: IMAP4_SSL) -> bytes: ...
+
+def parse_attachment_part(uid: bytes, part: BodyPart,
+                          connection: IMAP4_SSL) -> Dict[str, Union[int, str, PartContent, None]]: ...
+
+def fetch_structures_by_uids(uids: List[bytes], connection: IMAP4_SSL,
+                             parser_policy: Optional[Policy]) -> Generator[Tuple[bytes, LazyStruct], None, None]: ...
+
+
+def preview_part(parts: List[BodyPart]) -> Optional[BodyPart]: ...
+
+def decode_preview(part: BodyPart, payload: bytes, sender: Optional[str] = None) -> str: ...
+
+def fetch_previews_by_uids(uids: List[bytes], connection: IMAP4_SSL, parser_policy: Optional[Policy],
+                           preview_bytes: int) -> Generator[Tuple[bytes, LazyStruct], None, None]: ...
@@ -0,0 +1,166 @@
+from collections import namedtuple
+
+import logging
+
+from imbox.paging import search_uid_numbers
+from imbox.response import parse_fetch_response
+from imbox.utils import sequence_set_to_uids, uids_to_sequence_set
+
+logger = logging.getLogger(__name__)
+
+# What a client remembers about a folder between two synchronizations; uids
+# is the sequence-set of the UIDs known at that time.
+SyncState = namedtuple('SyncState', ['uidvalidity', 'uidnext', 'highestmodseq', 'uids'])
+
+# new and vanished are lists of UIDs, changed maps UIDs to their new flags.
+# reset is True when UIDVALIDITY changed and every known UID is gone.
+SyncResult = namedtuple('SyncResult', ['new', 'changed', 'vanished', 'state', 'reset'])
+
+
+def _response_int(connection, name):
+    _, data = connection.response(name)
+    for value in reversed(data or []):
+        if value:
+            try:
+                return int(value.split()[0])
+            except (ValueError, IndexError):
+                pass
+    return None
+
+
+def _encode_uid(uid):
+    return str(uid).encode('ascii')
+
+
+def _changed_flags(data):
+    return {response['UID']: list(response.get('FLAGS') or [])
+            for response in parse_fetch_response(data)
+            if response.get('UID') is not None and 'FLAGS' in response}
+
+
+def _select(connection, mailbox, parameters=None):
+    """
+    SELECT a mailbox with optional RFC 7162 parameters, which
+    ``imaplib.IMAP4.select`` cannot send.
+    """
+    connection.untagged_responses = {}
+    if parameters:
+        status, data = connection._simple_command('SELECT', mailbox, parameters)
+    else:
+        status, data = connection._simple_command('SELECT', mailbox)
+
+    if status != 'OK':
+        connection.state = 'AUTH'
+        raise connection.error("Cannot select {}: {}".format(mailbox, data))
+    connection.state = 'SELECTED'
+    return status, data
+
+
+def _enable_qresync(connection):
+    """
+    ENABLE QRESYNC once per connection. ENABLE is only valid in the
+    authenticated state, so a selected mailbox is first UNSELECTed when the
+    server allows it; otherwise CONDSTORE alone is used.
+    """
+    if getattr(connection, '_imbox_qresync_enabled', False):
+        return True
+
+    if connection.state == 'SELECTED':
+        if 'UNSELECT' not in connection.capabilities or not hasattr(connection, 'unselect'):
+            logger.debug("Cannot leave the selected mailbox to ENABLE QRESYNC")
+            return False
+        connection.unselect()
+
+    status, _ = connection.enable('QRESYNC')
+    connection._imbox_qresync_enabled = status == 'OK'
+    return connection._imbox_qresync_enabled
+
+
+def sync(connection, mailbox, state=None):
+    """
+    Select ``mailbox`` and report what changed since ``state``.
+
+    With QRESYNC (RFC 7162) the changes and vanished UIDs come with the
+    SELECT response. With CONDSTORE only, flag changes are asked with
+    ``CHANGEDSINCE``. Otherwise new UIDs are found from UIDNEXT and vanished
+    UIDs by comparing UID ranges; flag changes are then not reported.
+    Pass the returned ``SyncResult.state`` to the next call.
+    """
+    capabilities = connection.capabilities
+    qresync = 'QRESYNC' in capabilities
+    condstore = qresync or 'CONDSTORE' in capabilities
+
+    if qresync:
+        qresync = _enable_qresync(connection)
+
+    parameters = None
+    if qresync and state is not None and state.highestmodseq:
+        parameters = '(QRESYNC ({} {}{}))'.format(
+            state.uidvalidity, state.highestmodseq, ' ' + state.uids if state.uids else '')
+    elif condstore:
+        parameters = '(CONDSTORE)'
+
+    _select(connection, mailbox, parameters)
+
+    uidvalidity = _response_int(connection, 'UIDVALIDITY')
+    uidnext = _response_int(connection, 'UIDNEXT')
+    highestmodseq = _response_int(connection, 'HIGHESTMODSEQ') if condstore else None
+    exists = _response_int(connection, 'EXISTS')
+    if uidnext is None:
+        logger.debug("No UIDNEXT for {}, using the highest known UID".format(mailbox))
+    _, vanished_data = connection.response('VANISHED')
+    _, fetch_data = connection.response('FETCH')
+
+    if state is None or state.uidvalidity != uidvalidity:
+        if state is not None:
+            logger.info("UIDVALIDITY of {} changed, resynchronizing".format(mailbox))
+        uids = search_uid_numbers(connection, 'ALL')
+        known = sequence_set_to_uids(state.uids) if state is not None else []
+        if uidnext is None:
+            uidnext = max(uids or [0]) + 1
+        new_state = SyncState(uidvalidity, uidnext, highestmodseq, uids_to_sequence_set(uids))
+        return SyncResult(new=[_encode_uid(uid) for uid in uids], changed={},
+                          vanished=[_encode_uid(uid) for uid in known],
+                          state=new_state, reset=state is not None)
+
+    known = set(sequence_set_to_uids(state.uids))
+
+    new = []
+    if uidnext is None or state.uidnext is None or uidnext > state.uidnext:
+        # N:* always matches the highest UID, even when it is below N
+        new = [uid for uid in search_uid_numbers(connection, 'UID {}:*'.format(state.uidnext or 1))
+               if uid >= (state.uidnext or 1) and uid not in known]
+
+    changed = {}
+    vanished = set()
+    if parameters and parameters.startswith('(QRESYNC'):
+        changed = _changed_flags(fetch_data)
+        for data in vanished_data or []:
+            if data:
+                vanished.update(sequence_set_to_uids(data.split()[-1]))
+    else:
+        if condstore and state.highestmodseq and highestmodseq and highestmodseq > state.highestmodseq \
+                and known:
+            _, data = connection.uid('fetch', '1:{}'.format(max(known)), '(UID FLAGS)',
+                                     '(CHANGEDSINCE {})'.format(state.highestmodseq))
+            changed = _changed_flags(data)
+
+        # Nothing was expunged when the message count adds up
+        if known and (exists is None or exists != len(known) + len(new)):
+            remaining = set(search_uid_numbers(connection, 'UID {}'.format(uids_to_sequence_set(known))))
+            vanished = known - remaining
+
+    vanished &= known
+    changed = {_encode_uid(uid): flags for uid, flags in changed.items()
+               if uid in known and uid not in vanished}
+    uids = (known - vanished) | set(new)
+    if uidnext is None:
+        uidnext = max(uids | {state.uidnext - 1 if state.uidnext else 0}) + 1
+    new_state = SyncState(uidvalidity, uidnext, highestmodseq, uids_to_sequence_set(uids))
+
+    logger.debug("Synchronized {}: {} new, {} changed, {} vanished".format(
+        mailbox, len(new), len(changed), len(vanished)))
+
+    return SyncResult(new=[_encode_uid(uid) for uid in new], changed=changed,
+                      vanished=[_encode_uid(uid) for uid in sorted(vanished)],
+                      state=new_state, reset=False)
@@ -0,0 +1,19 @@
+from imaplib import IMAP4
+from typing import Dict, List, NamedTuple, Optional
+
+
+class SyncState(NamedTuple):
+    uidvalidity: int
+    uidnext: int
+    highestmodseq: Optional[int]
+    uids: str
+
+
+class SyncResult(NamedTuple):
+    new: List[bytes]
+    changed: Dict[bytes, List[bytes]]
+    vanished: List[bytes]
+    state: SyncState
+    reset: bool
+
+def sync(connection: IMAP4, mailbox: str, state: Optional[SyncState] = None) -> SyncResult: ...
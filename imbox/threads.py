@@ -0,0 +1,344 @@
+import email.parser
+import email.utils
+import re
+import sqlite3
+import threading
+
+import logging
+
+from imbox.response import parse_fetch_response, parse_tokens
+from imbox.utils import UidList, chunked, uids_to_sequence_set
+from imbox.vendors.gmail import fetch_gmail_metadata
+
+logger = logging.getLogger(__name__)
+
+THREAD_HEADERS = 'MESSAGE-ID IN-REPLY-TO REFERENCES DATE'
+THREAD_FETCH_ITEMS = '(BODY.PEEK[HEADER.FIELDS ({})])'.format(THREAD_HEADERS)
+
+MESSAGE_ID_RE = re.compile(r'<[^<>\s]+>')
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thread_messages (
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    message_id TEXT NOT NULL,
+    parent_id TEXT,
+    date REAL,
+    PRIMARY KEY (account, folder, uidvalidity, uid)
+);
+CREATE TABLE IF NOT EXISTS thread_ids (
+    account TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    thread TEXT NOT NULL,
+    PRIMARY KEY (account, message_id)
+);
+CREATE INDEX IF NOT EXISTS thread_ids_thread ON thread_ids (account, thread);
+"""
+
+
+class ThreadNode:
+    """
+    A message of a thread and its replies. ``uid`` is None for a message
+    missing from the folder that other messages of the thread reply to.
+    """
+
+    __slots__ = ('uid', 'children')
+
+    def __init__(self, uid=None, children=None):
+        self.uid = uid
+        self.children = children or []
+
+    def uids(self):
+        """The UIDs of the thread, depth first"""
+        uids = [self.uid] if self.uid is not None else []
+        for child in self.children:
+            uids.extend(child.uids())
+        return uids
+
+    def __eq__(self, other):
+        return isinstance(other, ThreadNode) and (self.uid, self.children) == (other.uid, other.children)
+
+    def __repr__(self):
+        if not self.children:
+            return 'ThreadNode({!r})'.format(self.uid)
+        return 'ThreadNode({!r}, {!r})'.format(self.uid, self.children)
+
+
+def _uid(value):
+    return str(value).encode('ascii')
+
+
+def _thread_node(values):
+    # Numbers are a chain of replies, lists the branches below the last one
+    root = last = None
+    for value in values:
+        if isinstance(value, list):
+            if last is None:
+                root = last = ThreadNode()
+            last.children.append(_thread_node(value))
+        else:
+            node = ThreadNode(_uid(value))
+            if last is None:
+                root = node
+            else:
+                last.children.append(node)
+            last = node
+    return root
+
+
+def parse_thread_response(data):
+    """
+    Parse the data of a THREAD command (RFC 5256), e.g.
+    ``(2)(3 6 (4 23)(44 7 96))``, into a list of ThreadNode trees.
+    """
+    threads = []
+    for item in data or []:
+        if item is None:
+            continue
+        for values in parse_tokens([item]):
+            if isinstance(values, list) and values:
+                threads.append(_thread_node(values))
+    return threads
+
+
+def server_threads(connection, criteria='ALL', algorithm='REFERENCES'):
+    """
+    Return the threads of the messages matching ``criteria`` built by the
+    server with UID THREAD.
+    """
+    status, data = connection.uid('THREAD', algorithm, 'UTF-8', criteria)
+    if status != 'OK':
+        raise connection.error("UID THREAD command error: {} {}".format(status, data))
+    return parse_thread_response(data)
+
+
+def gmail_threads(connection, uids, chunk_size=500):
+    """
+    Return the threads of ``uids`` grouped by their X-GM-THRID; Gmail does
+    not tell which message replies to which, so the first message of a
+    thread is given the others as children, in UID order.
+    """
+    threads = {}
+    for chunk in chunked(uids, chunk_size):
+        for uid, metadata in fetch_gmail_metadata(chunk, connection):
+            threads.setdefault(metadata['gmail_thread_id'], []).append(uid)
+
+    roots = []
+    for thread_uids in threads.values():
+        thread_uids.sort(key=int)
+        roots.append(ThreadNode(thread_uids[0], [ThreadNode(uid) for uid in thread_uids[1:]]))
+    roots.sort(key=lambda root: int(root.uid))
+    return roots
+
+
+def _prune(node, uids):
+    children = [child for child in (_prune(child, uids) for child in node.children) if child is not None]
+    if node.uid in uids:
+        return ThreadNode(node.uid, children)
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else ThreadNode(None, children)
+
+
+def prune_threads(threads, uids):
+    """
+    Return ``threads`` with the messages whose UID is not in ``uids`` left
+    out, their replies moved up to their place.
+    """
+    return [root for root in (_prune(root, uids) for root in threads) if root is not None]
+
+
+def parse_thread_headers(raw_headers):
+    """
+    Return ``(message_id, references, timestamp)`` from the Message-ID,
+    References, In-Reply-To and Date headers of a message.
+    """
+    headers = email.parser.BytesHeaderParser().parsebytes(raw_headers)
+
+    message_ids = MESSAGE_ID_RE.findall(str(headers.get('Message-ID') or ''))
+    references = MESSAGE_ID_RE.findall(str(headers.get('References') or ''))
+    in_reply_to = MESSAGE_ID_RE.findall(str(headers.get('In-Reply-To') or ''))
+    # In-Reply-To is the parent when References lacks it (JWZ, step 1.A)
+    if in_reply_to and in_reply_to[0] not in references:
+        references.append(in_reply_to[0])
+
+    timestamp = None
+    try:
+        parsed_date = email.utils.parsedate_to_datetime(str(headers.get('Date') or ''))
+        timestamp = parsed_date.timestamp() if parsed_date is not None else None
+    except (TypeError, ValueError, IndexError, OverflowError):
+        pass
+    return (message_ids[0] if message_ids else None), references, timestamp
+
+
+def fetch_thread_headers(uids, connection):
+    """
+    Fetch the threading headers of several messages with a single UID FETCH.
+
+    Yields ``(uid, message_id, references, timestamp)`` tuples.
+    """
+    if not uids:
+        return
+    _, data = connection.uid('fetch', uids_to_sequence_set(uids), THREAD_FETCH_ITEMS)
+    for response in parse_fetch_response(data):
+        raw_headers = next((value for name, value in response.items()
+                            if name.startswith('BODY[HEADER.FIELDS')), None)
+        if response.get('UID') is None or raw_headers is None:
+            continue
+        yield (_uid(response['UID']),) + parse_thread_headers(raw_headers)
+
+
+class ThreadIndex:
+    """
+    A local index of the threads of the messages of an account, built with
+    the JWZ algorithm (https://www.jwz.org/doc/threading.html) from the
+    Message-ID, References and In-Reply-To headers, for servers without
+    THREAD.
+
+    ``update`` fetches the headers of the messages of a folder the index
+    does not know yet only, and adds them to their threads: every Message-ID
+    seen, referenced ones included, is mapped to a thread, and threads a new
+    message links together are merged. Subjects are not used to gather
+    threads. The index is kept in memory, or in the SQLite database
+    ``path`` to last across runs.
+    """
+
+    def __init__(self, path=':memory:', account=''):
+        self.path = path
+        self.account = account
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.executescript(INDEX_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _forget_other_uidvalidities(self, folder, uidvalidity):
+        self._db.execute('DELETE FROM thread_messages WHERE account = ? AND folder = ? AND uidvalidity != ?',
+                         (self.account, folder, uidvalidity))
+
+    def last_uid(self, folder, uidvalidity):
+        with self._lock:
+            row = self._db.execute('SELECT MAX(uid) FROM thread_messages WHERE account = ? AND folder = ? '
+                                   'AND uidvalidity = ?', (self.account, folder, uidvalidity)).fetchone()
+        return row[0] or 0
+
+    def _thread_of(self, message_ids):
+        threads = set()
+        for batch in chunked(message_ids, 500):
+            rows = self._db.execute('SELECT DISTINCT thread FROM thread_ids WHERE account = ? AND message_id IN ({})'
+                                    .format(','.join('?' * len(batch))), [self.account] + batch)
+            threads.update(thread for thread, in rows)
+        return threads
+
+    def _add(self, folder, uidvalidity, uid, message_id, references, timestamp):
+        if message_id is None:
+            message_id = '<{}.{}.{}@imbox.invalid>'.format(uidvalidity, int(uid), folder)
+        message_ids = [reference for reference in references if reference != message_id] + [message_id]
+
+        threads = self._thread_of(message_ids)
+        thread = min(threads) if threads else message_id
+        merged = sorted(threads - {thread})
+        if merged:
+            logger.debug("Merging threads {} into {}".format(merged, thread))
+            self._db.execute('UPDATE thread_ids SET thread = ? WHERE account = ? AND thread IN ({})'
+                             .format(','.join('?' * len(merged))), [thread, self.account] + merged)
+        self._db.executemany('INSERT OR REPLACE INTO thread_ids VALUES (?, ?, ?)',
+                             [(self.account, reference, thread) for reference in message_ids])
+        self._db.execute('INSERT OR REPLACE INTO thread_messages VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (self.account, folder, uidvalidity, int(uid), message_id,
+                          message_ids[-2] if len(message_ids) > 1 else None, timestamp))
+
+    def _add_many(self, folder, uidvalidity, messages, forget_other_uidvalidities):
+        with self._lock, self._db:
+            if forget_other_uidvalidities:
+                self._forget_other_uidvalidities(folder, uidvalidity)
+            for uid, message_id, references, timestamp in messages:
+                self._add(folder, uidvalidity, uid, message_id, references, timestamp)
+
+    def add_many(self, folder, uidvalidity, messages):
+        """
+        Add ``(uid, message_id, references, timestamp)`` tuples to the index
+        in one transaction, ``references`` being the Message-IDs of the
+        ancestors of a message, the parent last.
+        """
+        self._add_many(folder, uidvalidity, messages, True)
+
+    def add(self, folder, uidvalidity, uid, message_id, references, timestamp=None):
+        """
+        Add a message to the index; see ``add_many``.
+        """
+        self.add_many(folder, uidvalidity, [(uid, message_id, references, timestamp)])
+
+    def update(self, connection, folder, uidvalidity, chunk_size=500):
+        """
+        Index the messages of ``folder``, selected on ``connection``, above
+        the highest UID indexed; return their number.
+        """
+        last_uid = self.last_uid(folder, uidvalidity)
+        _, data = connection.uid('search', None, 'UID {}:*'.format(last_uid + 1))
+        uids = UidList(uid for uid in UidList.from_search(data[0]).numbers if uid > last_uid)
+
+        # One transaction per fetched chunk, the first one dropping the
+        # messages of other UIDVALIDITYs
+        chunks = list(chunked(uids, chunk_size)) or [[]]
+        for index, chunk in enumerate(chunks):
+            self._add_many(folder, uidvalidity, list(fetch_thread_headers(chunk, connection)), index == 0)
+        logger.debug("Indexed {} messages of {}".format(len(uids), folder))
+        return len(uids)
+
+    def threads(self, folder, uidvalidity):
+        """
+        Return the threads of the indexed messages of ``folder`` as a list of
+        ThreadNode trees, in the order of their first message. Replies to a
+        message missing from the folder are gathered under a node without UID.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT m.uid, m.message_id, m.parent_id, m.date, t.thread FROM thread_messages m '
+                'JOIN thread_ids t ON t.account = m.account AND t.message_id = m.message_id '
+                'WHERE m.account = ? AND m.folder = ? AND m.uidvalidity = ? ORDER BY m.uid',
+                (self.account, folder, uidvalidity)).fetchall()
+
+        # A message received twice has the same Message-ID under two UIDs;
+        # replies go below the first one
+        nodes = {uid: ThreadNode(_uid(uid)) for uid, _, _, _, _ in rows}
+        uids_by_id = {}
+        for uid, message_id, _, _, _ in rows:
+            uids_by_id.setdefault(message_id, []).append(uid)
+
+        roots_by_thread = {}
+        for uid, message_id, parent_id, _, thread in rows:
+            parent = nodes[uids_by_id[parent_id][0]] if parent_id in uids_by_id else None
+            if parent is not None and not self._is_descendant(parent, nodes[uid]):
+                parent.children.append(nodes[uid])
+            else:
+                roots_by_thread.setdefault(thread, []).append(nodes[uid])
+
+        # Rows come in UID order, so are children and roots
+        threads = []
+        for roots in roots_by_thread.values():
+            threads.append(roots[0] if len(roots) == 1 else ThreadNode(None, roots))
+        threads.sort(key=lambda root: min(int(uid) for uid in root.uids()))
+        return threads
+
+    @staticmethod
+    def _is_descendant(node, ancestor):
+        # Linking node below ancestor would make a cycle of bad References
+        pending = [ancestor]
+        while pending:
+            current = pending.pop()
+            if current is node:
+                return True
+            pending.extend(current.children)
+        return False
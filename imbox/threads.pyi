@@ -0,0 +1,58 @@
+import sqlite3
+from imaplib import IMAP4, IMAP4_SSL
+from typing import Generator, Iterable, List, Optional, Set, Tuple, Union
+
+THREAD_HEADERS: str
+THREAD_FETCH_ITEMS: str
+INDEX_SCHEMA: str
+
+
+class ThreadNode:
+    uid: Optional[bytes]
+    children: List['ThreadNode']
+
+    def __init__(self, uid: Optional[bytes] = None, children: Optional[List['ThreadNode']] = None) -> None: ...
+
+    def uids(self) -> List[bytes]: ...
+
+
+def parse_thread_response(data: List[Optional[bytes]]) -> List[ThreadNode]: ...
+
+def server_threads(connection: Union[IMAP4, IMAP4_SSL], criteria: str = 'ALL',
+                   algorithm: str = 'REFERENCES') -> List[ThreadNode]: ...
+
+def gmail_threads(connection: Union[IMAP4, IMAP4_SSL], uids: Iterable[bytes],
+                  chunk_size: int = 500) -> List[ThreadNode]: ...
+
+def prune_threads(threads: Iterable[ThreadNode], uids: Set[bytes]) -> List[ThreadNode]: ...
+
+def parse_thread_headers(raw_headers: bytes) -> Tuple[Optional[str], List[str], Optional[float]]: ...
+
+def fetch_thread_headers(uids: Iterable[bytes], connection: Union[IMAP4, IMAP4_SSL]
+                         ) -> Generator[Tuple[bytes, Optional[str], List[str], Optional[float]], None, None]: ...
+
+
+class ThreadIndex:
+    path: str
+    account: str
+
+    def __init__(self, path: str = ':memory:', account: str = '') -> None: ...
+
+    def __enter__(self) -> 'ThreadIndex': ...
+
+    def __exit__(self, type, value, traceback) -> None: ...
+
+    def close(self) -> None: ...
+
+    def last_uid(self, folder: str, uidvalidity: int) -> int: ...
+
+    def add_many(self, folder: str, uidvalidity: int,
+                 messages: Iterable[Tuple[Union[bytes, int], Optional[str], List[str], Optional[float]]]) -> None: ...
+
+    def add(self, folder: str, uidvalidity: int, uid: Union[bytes, int], message_id: Optional[str],
+            references: List[str], timestamp: Optional[float] = None) -> None: ...
+
+    def update(self, connection: Union[IMAP4, IMAP4_SSL], folder: str, uidvalidity: int,
+               chunk_size: int = 500) -> int: ...
+
+    def threads(self, folder: str, uidvalidity: int) -> List[ThreadNode]: ...
@@ -1,17 +1,31 @@
+import codecs
 import datetime
 import logging
+import re
+from array import array
+from functools import lru_cache
 from imaplib import Time2Internaldate
 logger = logging.getLogger(__name__)
 
+# A mailbox name made of ASTRING-CHARs (RFC 3501), which needs no quoting
+ATOM_RE = re.compile(r'^[^\x00-\x20\x7f(){%*"\\]+$')
+
 
 def str_encode(value='', encoding=None, errors='strict'):
-    logger.debug("Encode str {value} with encoding {encoding} and errors {errors}".format(
-        value=value,
-        encoding=encoding,
-        errors=errors))
+    # Formatted only when debug logging is on, value may be a whole message
+    logger.debug("Encode str %s with encoding %s and errors %s", value, encoding, errors)
     return str(value, encoding, errors)
 
 
+@lru_cache(maxsize=256)
+def lookup_charset(charset):
+    """Return the Python codec name of a charset label, or None if unknown"""
+    try:
+        return codecs.lookup(charset).name
+    except (LookupError, TypeError, ValueError):
+        return None
+
+
 def str_decode(value='', encoding=None, errors='strict'):
     if isinstance(value, str):
         return bytes(value, encoding, errors).decode('utf-8')
@@ -26,3 +40,147 @@ def date_to_date_text(date):
     tzutc = datetime.timezone.utc
     dt = datetime.datetime.combine(date, datetime.time.min, tzutc)
     return Time2Internaldate(dt)[1:12]
+
+
+def quote_mailbox(name):
+    """
+    Quote a mailbox name that is not an IMAP atom (e.g. has spaces), since
+    imaplib sends arguments as they are
+    """
+    if name.startswith('"') or ATOM_RE.match(name):
+        return name
+    return '"{}"'.format(name.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def chunked(iterable, size):
+    """Yield successive lists of at most ``size`` items from ``iterable``"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def uid_ranges(numbers):
+    """Return the ``[start, end]`` runs of consecutive sorted ``numbers``"""
+    ranges = []
+    for number in numbers:
+        if ranges and ranges[-1][1] + 1 == number:
+            ranges[-1][1] = number
+        elif not ranges or ranges[-1][1] != number:
+            ranges.append([number, number])
+    return ranges
+
+
+def ranges_to_sequence_set(ranges):
+    return ','.join(str(start) if start == end else '{}:{}'.format(start, end)
+                    for start, end in ranges)
+
+
+def uids_to_sequence_set(uids):
+    """Return the IMAP sequence-set of ``uids``, e.g. ``1:200,305``"""
+    if isinstance(uids, UidList):
+        numbers = sorted(uids.numbers)
+    else:
+        numbers = sorted(int(uid) for uid in uids)
+    return ranges_to_sequence_set(uid_ranges(numbers))
+
+
+def sequence_set_to_uids(sequence_set):
+    """Return the sorted UIDs of an IMAP sequence-set such as ``1:3,7``"""
+    return sorted(set(UidList.from_sequence_set(sequence_set).numbers))
+
+
+class UidList:
+    """
+    A sequence of UIDs held as machine integers in an ``array('L')``,
+    rather than one bytes object per UID, in the order given (e.g. the
+    order of a SORT).
+
+    Items are read as bytes like the UIDs of imaplib responses; the
+    ``numbers`` array holds them as ints.
+    """
+
+    __slots__ = ('numbers',)
+
+    def __init__(self, uids=()):
+        if isinstance(uids, UidList):
+            self.numbers = array('L', uids.numbers)
+        else:
+            self.numbers = array('L', (int(uid) for uid in uids))
+
+    @classmethod
+    def from_search(cls, data):
+        """The UIDs of a SEARCH or SORT response, e.g. ``b'4 8 15'``"""
+        uids = cls()
+        if data:
+            uids.numbers = array('L', map(int, data.split()))
+        return uids
+
+    @classmethod
+    def from_sequence_set(cls, sequence_set):
+        """
+        The UIDs of a sequence-set such as ``1:500,502``, in its order;
+        ``*`` is not allowed.
+        """
+        if isinstance(sequence_set, bytes):
+            sequence_set = sequence_set.decode('ascii')
+        uids = cls()
+        for part in str(sequence_set).split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if ':' in part:
+                start, end = (int(value) for value in part.split(':'))
+                step = 1 if end >= start else -1
+                uids.numbers.extend(range(start, end + step, step))
+            else:
+                uids.numbers.append(int(part))
+        return uids
+
+    def ranges(self):
+        """The runs of consecutive UIDs, in ascending order without duplicates"""
+        return uid_ranges(sorted(self.numbers))
+
+    def sequence_set(self):
+        return ranges_to_sequence_set(self.ranges())
+
+    def sequence_sets(self, size):
+        """Yield the sequence-sets of successive chunks of at most ``size`` sorted UIDs"""
+        numbers = sorted(set(self.numbers))
+        for start in range(0, len(numbers), size):
+            yield ranges_to_sequence_set(uid_ranges(numbers[start:start + size]))
+
+    def reverse(self):
+        self.numbers.reverse()
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __iter__(self):
+        for number in self.numbers:
+            yield str(number).encode('ascii')
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            uids = UidList()
+            uids.numbers = self.numbers[index]
+            return uids
+        return str(self.numbers[index]).encode('ascii')
+
+    def __contains__(self, uid):
+        return int(uid) in self.numbers
+
+    def __eq__(self, other):
+        if isinstance(other, UidList):
+            return self.numbers == other.numbers
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return 'UidList({!r})'.format(self.sequence_set() if len(self) > 20 else list(self))
@@ -1,6 +1,52 @@
-from typing import Optional, Union
+from array import array
+from typing import Optional, Union, Iterable, Iterator, List, TypeVar
+
+T = TypeVar('T')
 
 
 def str_encode(value: Union[str, bytes], encoding: Optional[str], errors: str) -> str: ...
 
+def lookup_charset(charset: str) -> Optional[str]: ...
+
 def str_decode(value: Union[str, bytes], encoding: Optional[str], errors: str) -> Union[str, bytes]: ...
+
+def quote_mailbox(name: str) -> str: ...
+
+def chunked(iterable: Iterable[T], size: int) -> Iterator[List[T]]: ...
+
+def uid_ranges(numbers: Iterable[int]) -> List[List[int]]: ...
+
+def ranges_to_sequence_set(ranges: Iterable[List[int]]) -> str: ...
+
+def uids_to_sequence_set(uids: Iterable[Union[bytes, str, int]]) -> str: ...
+
+def sequence_set_to_uids(sequence_set: Union[str, bytes]) -> List[int]: ...
+
+
+class UidList:
+
+    numbers: array
+
+    def __init__(self, uids: Iterable[Union[bytes, str, int]] = ()) -> None: ...
+
+    @classmethod
+    def from_search(cls, data: Optional[bytes]) -> 'UidList': ...
+
+    @classmethod
+    def from_sequence_set(cls, sequence_set: Union[str, bytes]) -> 'UidList': ...
+
+    def ranges(self) -> List[List[int]]: ...
+
+    def sequence_set(self) -> str: ...
+
+    def sequence_sets(self, size: int) -> Iterator[str]: ...
+
+    def reverse(self) -> None: ...
+
+    def __len__(self) -> int: ...
+
+    def __iter__(self) -> Iterator[bytes]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[bytes, 'UidList']: ...
+
+    def __contains__(self, uid: Union[bytes, str, int]) -> bool: ...
@@ -1,6 +1,129 @@
+import sqlite3
+import threading
+
+import logging
+
 from imbox.messages import Messages
+from imbox.parser import fetch_responses_by_uids
+from imbox.utils import chunked
 from imbox.vendors.helpers import merge_two_dicts
 
+logger = logging.getLogger(__name__)
+
+GMAIL_FETCH_ITEMS = ('(X-GM-MSGID X-GM-THRID X-GM-LABELS)', 'X-GM-MSGID')
+# The same metadata along with the messages, in a single command
+GMAIL_EMAIL_FETCH_ITEMS = ('(BODY.PEEK[] FLAGS X-GM-MSGID X-GM-THRID X-GM-LABELS)', 'BODY[]')
+
+DEDUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS gmail_messages (
+    account TEXT NOT NULL,
+    msgid INTEGER NOT NULL,
+    thread_id INTEGER,
+    labels TEXT NOT NULL,
+    PRIMARY KEY (account, msgid)
+);
+"""
+
+
+def _label(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+
+METADATA_ATTRIBUTES = ('gmail_msgid', 'gmail_thread_id', 'gmail_labels')
+
+
+def _metadata(response):
+    return {
+        'gmail_msgid': response.get('X-GM-MSGID'),
+        'gmail_thread_id': response.get('X-GM-THRID'),
+        'gmail_labels': [_label(label) for label in response.get('X-GM-LABELS') or []],
+    }
+
+
+def fetch_gmail_metadata(uids, connection):
+    """
+    Fetch the X-GM-MSGID, X-GM-THRID and X-GM-LABELS of several messages.
+
+    Yields ``(uid, {'gmail_msgid', 'gmail_thread_id', 'gmail_labels'})``
+    tuples in the order of ``uids``.
+    """
+    for uid, response in fetch_responses_by_uids(uids, connection, *GMAIL_FETCH_ITEMS):
+        yield uid, _metadata(response)
+
+
+class GmailDedupCache:
+    """
+    The X-GM-MSGID of the Gmail messages already fetched, with their thread
+    and labels, so that a message seen in one folder (INBOX, All Mail, a
+    label) is not downloaded again from another one.
+
+    Kept in memory by default, or in the SQLite database ``path`` to last
+    across runs; ``account`` separates the messages of several accounts
+    sharing a database.
+    """
+
+    def __init__(self, path=':memory:', account=''):
+        self.path = path
+        self.account = account
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.executescript(DEDUP_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def known(self, msgids):
+        """
+        Return the set of ``msgids`` already fetched.
+        """
+        msgids = list(msgids)
+        found = set()
+        with self._lock:
+            # Stay well under the SQLite limit of bound parameters
+            for batch in chunked(msgids, 500):
+                rows = self._db.execute(
+                    'SELECT msgid FROM gmail_messages WHERE account = ? AND msgid IN ({})'.format(
+                        ','.join('?' * len(batch))), [self.account] + batch)
+                found.update(msgid for msgid, in rows)
+        return found
+
+    def get(self, msgid):
+        """
+        Return ``{'gmail_thread_id', 'gmail_labels'}`` of a fetched message,
+        or None.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT thread_id, labels FROM gmail_messages WHERE account = ? AND msgid = ?',
+                                   (self.account, msgid)).fetchone()
+        if row is None:
+            return None
+        return {'gmail_thread_id': row[0], 'gmail_labels': row[1].split('\n') if row[1] else []}
+
+    def add_many(self, metadata):
+        """
+        Remember the ``fetch_gmail_metadata`` dicts of fetched messages.
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO gmail_messages VALUES (?, ?, ?, ?)',
+                [(self.account, item['gmail_msgid'], item['gmail_thread_id'], '\n'.join(item['gmail_labels']))
+                 for item in metadata])
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM gmail_messages WHERE account = ?',
+                                    (self.account,)).fetchone()[0]
+
 
 class GmailMessages(Messages):
     authentication_error_message = ('If you\'re not using an app-specific password, grab one here: '
@@ -31,9 +154,111 @@ class GmailMessages(Messages):
     def __init__(self,
                  connection,
                  parser_policy,
+                 gmail_metadata=False,
+                 dedup=None,
                  **kwargs):
 
         self.IMAP_ATTRIBUTE_LOOKUP = merge_two_dicts(self.IMAP_ATTRIBUTE_LOOKUP,
                                                      self.GMAIL_IMAP_ATTRIBUTE_LOOKUP_DIFF)
+        self.gmail_metadata = gmail_metadata or dedup is not None
+        self.dedup = dedup
+        # Metadata of the messages fetched but not yet yielded, by UID
+        self._gmail_metadata = {}
 
         super().__init__(connection, parser_policy, **kwargs)
+
+    def _metadata_with_body(self):
+        # Full fetches from the server can carry the metadata; the dedup
+        # cache needs it before downloading, the message cache not at all
+        return (self.dedup is None and self.cache is None and not
+                (self.headers_only or self.envelope or self.lazy_attachments or self.preview_bytes))
+
+    def _download_raw(self, uids):
+        if not (self.gmail_metadata and self._metadata_with_body()):
+            yield from super()._download_raw(uids)
+            return
+        for uid, response in fetch_responses_by_uids(uids, self.connection, *GMAIL_EMAIL_FETCH_ITEMS):
+            self._gmail_metadata[uid] = _metadata(response)
+            yield uid, response['BODY[]'], list(response.get('FLAGS') or [])
+
+    def _prefetch_metadata(self, uids, prefetched):
+        """
+        Fetch the metadata of ``uids`` a chunk at a time, yielding the UIDs
+        of the messages the dedup cache does not know, also added to
+        ``prefetched``.
+        """
+        for chunk in chunked(uids, self.fetch_chunk_size):
+            metadata = dict(fetch_gmail_metadata(chunk, self.connection))
+            new = chunk
+            if self.dedup is not None:
+                known = self.dedup.known(item['gmail_msgid'] for item in metadata.values())
+                new = [uid for uid in chunk if uid in metadata and metadata[uid]['gmail_msgid'] not in known]
+                logger.debug("Skipping {} messages already fetched".format(len(chunk) - len(new)))
+            self._gmail_metadata.update((uid, metadata[uid]) for uid in new if uid in metadata)
+            prefetched.extend(new)
+            yield from new
+
+    def _apply_gmail_metadata(self, uid, email_object):
+        metadata = self._gmail_metadata.pop(uid, None)
+        if metadata is not None:
+            for key, value in metadata.items():
+                setattr(email_object, key, value)
+        return metadata
+
+    def _with_gmail_metadata(self, uids, fetched):
+        try:
+            missing = [uid for uid in uids if uid not in self._gmail_metadata]
+            if missing and not self._metadata_with_body():
+                self._gmail_metadata.update(fetch_gmail_metadata(missing, self.connection))
+            for uid, email_object in fetched:
+                self._apply_gmail_metadata(uid, email_object)
+                yield uid, email_object
+        finally:
+            # Messages expunged meanwhile, or not consumed
+            for uid in uids:
+                self._gmail_metadata.pop(uid, None)
+
+    def _fetch_emails(self, uids):
+        """
+        With ``gmail_metadata``, set the X-GM-MSGID, X-GM-THRID and
+        X-GM-LABELS of messages as ``gmail_msgid``, ``gmail_thread_id`` and
+        ``gmail_labels``, fetched along with full messages or else with an
+        extra command.
+        """
+        if not self.gmail_metadata:
+            return super()._fetch_emails(uids)
+        return self._with_gmail_metadata(uids, super()._fetch_emails(uids))
+
+    def _fetch_email_list(self, uids=None):
+        """
+        Like ``Messages._fetch_email_list``, fetching the metadata of a chunk
+        first when the FETCH of the messages cannot carry it. With a
+        ``dedup`` cache, messages whose X-GM-MSGID it knows are skipped
+        without being downloaded.
+        """
+        if not self.gmail_metadata:
+            yield from super()._fetch_email_list(uids)
+            return
+
+        if uids is None:
+            uids = self._uid_list
+        prefetched = []
+        if not self._metadata_with_body():
+            uids = self._prefetch_metadata(uids, prefetched)
+
+        fetched = []
+        try:
+            for uid, email_object in super()._fetch_email_list(uids):
+                # Already set by _fetch_emails, but not in parse_workers
+                self._apply_gmail_metadata(uid, email_object)
+                if self.dedup is not None:
+                    fetched.append({key: getattr(email_object, key) for key in METADATA_ATTRIBUTES})
+                    if len(fetched) >= self.fetch_chunk_size:
+                        self.dedup.add_many(fetched)
+                        fetched = []
+                yield uid, email_object
+        finally:
+            if fetched:
+                self.dedup.add_many(fetched)
+            for uid in prefetched:
+                self._gmail_metadata.pop(uid, None)
@@ -1,14 +1,44 @@
 import datetime
 from email._policybase import Policy
 from imaplib import IMAP4, IMAP4_SSL
-from typing import Union
+from typing import Any, Dict, Generator, Iterable, List, Optional, Set, Tuple, Union
 
 from imbox.messages import Messages
 
+GMAIL_FETCH_ITEMS: Tuple[str, str]
+GMAIL_EMAIL_FETCH_ITEMS: Tuple[str, str]
+METADATA_ATTRIBUTES: Tuple[str, ...]
+
+def fetch_gmail_metadata(uids: Iterable[bytes],
+                         connection: Union[IMAP4, IMAP4_SSL]) -> Generator[Tuple[bytes, Dict[str, Any]], None, None]: ...
+
+
+class GmailDedupCache:
+    path: str
+    account: str
+
+    def __init__(self, path: str = ':memory:', account: str = '') -> None: ...
+
+    def __enter__(self) -> 'GmailDedupCache': ...
+
+    def __exit__(self, type, value, traceback) -> None: ...
+
+    def close(self) -> None: ...
+
+    def known(self, msgids: Iterable[int]) -> Set[int]: ...
+
+    def get(self, msgid: int) -> Optional[Dict[str, Any]]: ...
+
+    def add_many(self, metadata: Iterable[Dict[str, Any]]) -> None: ...
+
+    def __len__(self) -> int: ...
+
 
 class GmailMessages(Messages):
 
     def __init__(self,
                  connection: Union[IMAP4, IMAP4_SSL],
                  parser_policy: Policy,
+                 gmail_metadata: bool = False,
+                 dedup: Optional[GmailDedupCache] = None,
                  **kwargs: Union[bool, str, datetime.date]) -> None: ...
@@ -30,6 +30,11 @@ setup(
     install_requires=[
         'chardet',
     ],
+    entry_points={
+        'console_scripts': [
+            'imbox-export = imbox.export:main',
+        ],
+    },
     python_requires='>=3.3',
     zip_safe=False,
     classifiers=[
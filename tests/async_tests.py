@@ -0,0 +1,121 @@
+import asyncio
+import re
+import unittest
+
+from imbox.async_imbox import AsyncImbox
+
+MESSAGES = {
+    3: b'Subject: first\r\nFrom: a@example.com\r\n\r\nfirst body\r\n',
+    4: b'Subject: second\r\nFrom: b@example.com\r\n\r\nsecond body\r\n',
+}
+
+
+class FakeIMAPServer:
+    """Answers just enough IMAP for AsyncImbox"""
+
+    def __init__(self):
+        self.commands = []
+        self.flags = {3: [], 4: ['\\Seen']}
+
+    async def handle(self, reader, writer):
+        writer.write(b'* OK IMAP4rev1 ready\r\n')
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            tag, command = line.decode().rstrip('\r\n').split(' ', 1)
+            self.commands.append(command)
+            name = command.split(' ')[0].upper()
+
+            if name == 'CAPABILITY':
+                writer.write(b'* CAPABILITY IMAP4rev1 IDLE MOVE\r\n')
+            elif name == 'SELECT':
+                writer.write(b'* 2 EXISTS\r\n* OK [UIDVALIDITY 7] UIDs valid\r\n')
+            elif name == 'LIST':
+                writer.write(b'* LIST (\\HasNoChildren) "/" INBOX\r\n')
+            elif name == 'IDLE':
+                writer.write(b'+ idling\r\n* 3 EXISTS\r\n')
+                await writer.drain()
+                self.commands.append((await reader.readline()).decode().rstrip('\r\n'))
+            elif command == 'UID SEARCH UID *':
+                writer.write(b'* SEARCH 4\r\n')
+            elif command == 'UID SEARCH UID 5:*':
+                writer.write(b'* SEARCH 5\r\n')
+            elif command.startswith('UID SEARCH'):
+                writer.write(b'* SEARCH 3 4\r\n')
+            elif command.startswith('UID FETCH'):
+                for uid in (3, 4):
+                    body = MESSAGES[uid]
+                    writer.write('* {} FETCH (UID {} BODY[] {{{}}}\r\n'.format(
+                        uid - 2, uid, len(body)).encode())
+                    writer.write(body)
+                    writer.write(' FLAGS ({}))\r\n'.format(' '.join(self.flags[uid])).encode())
+            elif command.startswith('UID STORE'):
+                uid = int(re.search(r'STORE (\d+)', command).group(1))
+                self.flags[uid].append('\\Seen')
+            elif name == 'LOGOUT':
+                writer.write(b'* BYE logging out\r\n')
+            writer.write('{} OK {} completed\r\n'.format(tag, name).encode())
+            await writer.drain()
+            if name == 'LOGOUT':
+                break
+        writer.close()
+
+
+class TestAsyncImbox(unittest.TestCase):
+
+    def run_with_server(self, scenario):
+        server = FakeIMAPServer()
+
+        async def main():
+            listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+            port = listener.sockets[0].getsockname()[1]
+            try:
+                imbox = AsyncImbox('127.0.0.1', username='user', password='pass "secret"',
+                                   ssl=False, port=port)
+                async with imbox:
+                    return await scenario(imbox)
+            finally:
+                listener.close()
+                await listener.wait_closed()
+
+        # Not asyncio.run(), which needs Python 3.7
+        loop = asyncio.new_event_loop()
+        try:
+            return server, loop.run_until_complete(main())
+        finally:
+            loop.close()
+
+    def test_messages(self):
+        async def scenario(imbox):
+            return [(uid, message) async for uid, message in imbox.messages(folder='Archive')]
+
+        server, messages = self.run_with_server(scenario)
+
+        self.assertEqual([b'3', b'4'], [uid for uid, _ in messages])
+        self.assertEqual('second', messages[1][1].subject)
+        self.assertEqual([b'\\Seen'], messages[1][1].flags)
+        self.assertIn('LOGIN "user" "pass \\"secret\\""', server.commands)
+        self.assertIn('SELECT Archive', server.commands)
+
+    def test_mark_seen_and_folders(self):
+        async def scenario(imbox):
+            await imbox.mark_seen(b'3')
+            return await imbox.folders()
+
+        server, (status, folders) = self.run_with_server(scenario)
+
+        self.assertEqual('OK', status)
+        self.assertEqual([b'(\\HasNoChildren) "/" INBOX'], folders)
+        self.assertEqual(['\\Seen'], server.flags[3])
+
+    def test_watch_idle(self):
+        async def scenario(imbox):
+            async for uid in imbox.watch(idle_timeout=5):
+                return uid
+
+        server, uid = self.run_with_server(scenario)
+
+        self.assertEqual(b'5', uid)
+        self.assertEqual(['IDLE', 'DONE', 'UID SEARCH UID 5:*'],
+                         server.commands[server.commands.index('IDLE'):][:3])
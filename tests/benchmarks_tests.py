@@ -0,0 +1,33 @@
+import unittest
+
+from benchmarks.corpus import generate_mailbox
+from benchmarks.server import FakeIMAPServer
+from imbox import Imbox
+
+
+class TestBenchmarkServer(unittest.TestCase):
+
+    def setUp(self):
+        self.mailbox = generate_mailbox(6, seed=1, attachment_sizes=(128,))
+        self.server = FakeIMAPServer(self.mailbox).start()
+        self.addCleanup(self.server.stop)
+        self.imbox = Imbox('127.0.0.1', port=self.server.port, ssl=False,
+                           username='user', password='password')
+        self.addCleanup(self.imbox.logout)
+
+    def test_corpus_is_reproducible(self):
+        self.assertEqual(self.mailbox, generate_mailbox(6, seed=1, attachment_sizes=(128,)))
+
+    def test_messages(self):
+        messages = list(self.imbox.messages(fetch_chunk_size=4))
+
+        self.assertEqual([b'1', b'2', b'3', b'4', b'5', b'6'], [uid for uid, _ in messages])
+        self.assertTrue(all('#{} '.format(int(uid)) in message.subject for uid, message in messages))
+
+    def test_store(self):
+        self.imbox.mark_seen_many([b'2', b'3'])
+
+        self.assertEqual({'\\Seen'}, self.server.mailbox.flags[2])
+        unread = [uid for uid, message in self.imbox.messages(headers_only=True)
+                  if b'\\Seen' not in message.flags]
+        self.assertEqual([b'1', b'4', b'5', b'6'], unread)
@@ -0,0 +1,69 @@
+import unittest
+
+from imbox.cache import MessageCache
+from imbox.messages import Messages
+from tests.fake_imap import FakeConnection
+from tests.messages_tests import make_message
+
+
+class TestMessageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = MessageCache(':memory:')
+        self.connection = FakeConnection(
+            {uid: make_message('message {}'.format(uid)) for uid in (1, 2, 3)})
+
+    def tearDown(self):
+        self.cache.close()
+
+    def fetched_items(self):
+        return [command[2] for command in self.connection.commands if command[0] == 'FETCH']
+
+    def test_serves_cached_messages(self):
+        folder_cache = self.cache.folder('user@example.com', 'INBOX', 7)
+        first = [message.subject for _, message in Messages(self.connection, None, cache=folder_cache)]
+
+        self.connection.flags[2] = ['\\Seen']
+        self.connection.commands = []
+        second = list(Messages(self.connection, None, cache=folder_cache))
+
+        self.assertEqual(first, [message.subject for _, message in second])
+        self.assertEqual(['(FLAGS)'], self.fetched_items())
+        self.assertEqual([b'\\Seen'], second[1][1].flags)
+
+    def test_fetches_missing_messages(self):
+        folder_cache = self.cache.folder('user@example.com', 'INBOX', 7)
+        list(Messages(self.connection, None, cache=folder_cache))
+
+        self.connection.messages[4] = make_message('message 4')
+        self.connection.commands = []
+        fetched = list(Messages(self.connection, None, cache=folder_cache))
+
+        self.assertEqual([b'1', b'2', b'3', b'4'], [uid for uid, _ in fetched])
+        self.assertEqual(['(FLAGS)', '(BODY.PEEK[] FLAGS)'], self.fetched_items())
+
+    def test_skips_expunged_messages(self):
+        folder_cache = self.cache.folder('user@example.com', 'INBOX', 7)
+        messages = Messages(self.connection, None, cache=folder_cache)
+        list(messages)
+
+        del self.connection.messages[2]
+        self.assertEqual([b'1', b'3'], [uid for uid, _ in messages])
+
+    def test_uidvalidity_change_invalidates(self):
+        list(Messages(self.connection, None, cache=self.cache.folder('user@example.com', 'INBOX', 7)))
+        folder_cache = self.cache.folder('user@example.com', 'INBOX', 8)
+
+        self.assertEqual({}, folder_cache.get_many([1, 2, 3]))
+        self.assertEqual(0, self.cache.size())
+
+    def test_size_bound(self):
+        size = len(self.connection.messages[1])
+        self.cache.max_size = size * 2
+        folder_cache = self.cache.folder('user@example.com', 'INBOX', 7)
+        folder_cache.put_many([(1, self.connection.messages[1], [])])
+        folder_cache.put_many([(2, self.connection.messages[2], [])])
+        folder_cache.get_many([1])
+        folder_cache.put_many([(3, self.connection.messages[3], [])])
+
+        self.assertEqual({1, 3}, set(folder_cache.get_many([1, 2, 3])))
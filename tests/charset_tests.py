@@ -0,0 +1,64 @@
+import unittest
+
+from imbox.charset import CharsetDetector
+from imbox.parser import parse_email
+
+
+class TestCharsetDetector(unittest.TestCase):
+
+    def setUp(self):
+        self.samples = []
+
+        def statistical(sample):
+            self.samples.append(sample)
+            return 'koi8-r'
+
+        self.detector = CharsetDetector(statistical=statistical, sample_size=16)
+
+    def test_utf8_fast_path(self):
+        self.assertEqual('utf-8', self.detector.detect('été'.encode('utf-8'), label='x-unknown'))
+        self.assertEqual([], self.samples)
+
+    def test_candidates(self):
+        detector = CharsetDetector(candidates=['shift_jis'], statistical=None)
+
+        self.assertEqual('shift_jis', detector.detect('こんにちは'.encode('shift_jis')))
+        self.assertIsNone(CharsetDetector(statistical=None).detect(b'\xff\xfe\xfa'))
+
+    def test_statistical_on_a_sample(self):
+        content = 'Привет, мир! '.encode('koi8-r') * 10
+
+        self.assertEqual('koi8-r', self.detector.detect(content, label='x-cyr', sender='a@example.com'))
+        self.assertEqual([content[:16]], self.samples)
+
+    def test_cache_per_sender_and_label(self):
+        content = 'Привет'.encode('koi8-r')
+        self.detector.detect(content, label='X-Cyr', sender='a@example.com')
+        self.detector.detect(content, label='x-cyr', sender='a@example.com')
+        self.detector.detect(content, label='x-cyr', sender='b@example.com')
+
+        self.assertEqual(2, len(self.samples))
+
+    def test_ascii_is_not_remembered(self):
+        self.assertEqual('utf-8', self.detector.detect(b'Hello', label='x-cyr', sender='a@example.com'))
+        content = 'Привет мир'.encode('koi8-r')
+
+        self.assertEqual('koi8-r', self.detector.detect(content, label='x-cyr', sender='a@example.com'))
+        self.assertEqual('Привет мир', content.decode(self.detector.detect(content, 'x-cyr', 'a@example.com')))
+
+    def test_remembered_encoding_must_decode(self):
+        guesses = ['shift_jis', 'koi8-r']
+        detector = CharsetDetector(statistical=lambda sample: guesses.pop(0))
+        detector.detect('こんにちは'.encode('shift_jis'), label='x-unknown', sender='a@example.com')
+
+        content = 'Привет'.encode('koi8-r') + b'\xff'
+        self.assertEqual('koi8-r', detector.detect(content, label='x-unknown', sender='a@example.com'))
+
+    def test_parse_email(self):
+        raw_email = (b'From: a@example.com\r\nContent-Type: multipart/mixed; boundary=b\r\n\r\n'
+                     b'--b\r\nContent-Type: text/plain; charset=x-cyr\r\n\r\n' +
+                     'Привет'.encode('koi8-r') + b'\r\n--b--\r\n')
+
+        parsed = parse_email(raw_email, charset_detector=self.detector)
+
+        self.assertEqual(['Привет'], parsed.body['plain'])
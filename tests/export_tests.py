@@ -0,0 +1,93 @@
+import json
+import mailbox
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.corpus import generate_mailbox
+from benchmarks.server import FakeIMAPServer
+from imbox import Imbox
+from imbox.export import (Checkpoint, EmlExporter, JsonlExporter, MboxExporter, export, folder_filename,
+                          main)
+
+
+class Interrupted(Exception):
+    pass
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.mailbox = generate_mailbox(5, seed=2, attachment_sizes=(64,))
+        self.server = FakeIMAPServer(self.mailbox).start()
+        self.addCleanup(self.server.stop)
+        self.imbox = Imbox('127.0.0.1', port=self.server.port, ssl=False,
+                           username='user', password='password')
+        self.addCleanup(self.imbox.logout)
+        self.destination = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.destination)
+
+    def test_folder_filename(self):
+        self.assertEqual('INBOX_Sub folder', folder_filename('INBOX/Sub folder'))
+        self.assertEqual('_', folder_filename('..'))
+
+    def test_mbox(self):
+        progress = export(self.imbox, MboxExporter(self.destination))
+
+        self.assertEqual(5, progress.messages)
+        self.assertEqual(sum(len(raw) for raw in self.mailbox.values()), progress.bytes)
+        exported = mailbox.mbox(os.path.join(self.destination, 'INBOX.mbox'))
+        self.assertEqual([message['Subject'] for message in exported],
+                         [mailbox.mboxMessage(raw)['Subject'] for raw in self.mailbox.values()])
+        self.assertIn('Jul 17 09:44:25 1996', exported.get_message(0).get_from())
+
+    def test_resume(self):
+        checkpoint = os.path.join(self.destination, 'checkpoint.json')
+        reports = []
+
+        def interrupt(progress):
+            reports.append(progress.messages)
+            if progress.messages == 2:
+                raise Interrupted()
+
+        with self.assertRaises(Interrupted):
+            export(self.imbox, MboxExporter(self.destination), ['INBOX'], checkpoint, chunk_size=2,
+                   report=interrupt)
+        state = Checkpoint(checkpoint).folders['INBOX']
+        self.assertEqual(2, state['last_uid'])
+
+        # A message written after the checkpoint is dropped when resuming
+        with open(os.path.join(self.destination, 'INBOX.mbox'), 'ab') as mbox_file:
+            mbox_file.write(b'From MAILER-DAEMON Thu Jan  1 00:00:00 1970\npartial')
+
+        # Chunks of at most one message when chunk_bytes is smaller than them
+        progress = export(self.imbox, MboxExporter(self.destination), ['INBOX'], checkpoint, chunk_bytes=1,
+                          report=lambda progress: reports.append(progress.messages))
+        self.assertEqual(3, progress.messages)
+        self.assertEqual([2, 1, 2, 3], reports)
+        self.assertEqual(5, len(mailbox.mbox(os.path.join(self.destination, 'INBOX.mbox'))))
+
+    def test_jsonl(self):
+        export(self.imbox, JsonlExporter(self.destination))
+
+        with open(os.path.join(self.destination, 'INBOX.jsonl'), encoding='utf-8') as jsonl_file:
+            records = [json.loads(line) for line in jsonl_file]
+        self.assertEqual([1, 2, 3, 4, 5], [record['uid'] for record in records])
+        self.assertIn('#1 ', records[0]['subject'])
+        self.assertEqual('1996-07-17T02:44:25-07:00', records[0]['internaldate'])
+        self.assertEqual(len(self.mailbox[1]), records[0]['size'])
+
+    def test_eml(self):
+        export(self.imbox, EmlExporter(self.destination))
+
+        with open(os.path.join(self.destination, 'INBOX', '3.eml'), 'rb') as eml_file:
+            self.assertEqual(self.mailbox[3], eml_file.read())
+
+    def test_main(self):
+        main(['127.0.0.1', self.destination, '--port', str(self.server.port), '--no-ssl',
+              '-u', 'user', '--password', 'password', '--format', 'jsonl', '--quiet'])
+
+        self.assertTrue(os.path.exists(os.path.join(self.destination, 'INBOX.jsonl')))
+        with open(os.path.join(self.destination, '.imbox-export.json'), encoding='utf-8') as checkpoint_file:
+            self.assertEqual(5, json.load(checkpoint_file)['folders']['INBOX']['last_uid'])
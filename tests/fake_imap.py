@@ -0,0 +1,102 @@
+"""
+A minimal stand-in for an ``imaplib.IMAP4`` connection.
+
+Only the commands used by the tests are understood; every command issued is
+recorded in ``commands`` so tests can assert on round trips.
+"""
+import re
+
+
+def sequence_set_to_list(sequence_set):
+    if isinstance(sequence_set, bytes):
+        sequence_set = sequence_set.decode()
+    uids = []
+    for part in sequence_set.split(','):
+        if ':' in part:
+            start, end = part.split(':')
+            uids.extend(range(int(start), int(end) + 1))
+        else:
+            uids.append(int(part))
+    return uids
+
+
+def header_fields(header, names):
+    names = {name.lower() for name in names}
+    lines = re.split(rb'\r\n(?![ \t])', header)
+    return b''.join(line + b'\r\n' for line in lines
+                    if line.split(b':', 1)[0].decode().lower() in names) + b'\r\n'
+
+
+class FakeConnection:
+
+    def __init__(self, messages, flags=None, capabilities=(), envelopes=None,
+                 structures=None, sections=None):
+        self.messages = messages
+        self.flags = flags or {}
+        self.envelopes = envelopes or {}
+        self.structures = structures or {}
+        self.sections = sections or {}
+        self.capabilities = tuple(capabilities)
+        self.commands = []
+        self.statuses = {}
+
+    def _fetch_items(self, uid, items):
+        message = self.messages[uid]
+        header, _, text = message.partition(b'\r\n\r\n')
+        sections = {'': message, 'HEADER': header + b'\r\n\r\n', 'TEXT': text}
+        sections.update(self.sections.get(uid, {}))
+
+        response = 'UID {} FLAGS ({})'.format(uid, ' '.join(self.flags.get(uid, [])))
+        if 'RFC822.SIZE' in items:
+            response += ' RFC822.SIZE {}'.format(len(message))
+        if 'ENVELOPE' in items:
+            response += ' ENVELOPE {}'.format(self.envelopes[uid])
+        if 'BODYSTRUCTURE' in items:
+            response += ' BODYSTRUCTURE {}'.format(self.structures[uid])
+
+        literals = []
+        for section, start, length in re.findall(r'BODY\.PEEK\[([^\]]*)\](?:<(\d+)\.(\d+)>)?', items):
+            if section.startswith('HEADER.FIELDS '):
+                sections[section] = header_fields(header, section[len('HEADER.FIELDS '):].strip('()').split())
+            if start:
+                content = sections[section][int(start):int(start) + int(length)]
+                literals.append(('BODY[{}]<{}>'.format(section, start), content))
+            else:
+                literals.append(('BODY[{}]'.format(section), sections[section]))
+        return response, literals
+
+    def uid(self, command, *args):
+        self.commands.append((command.upper(),) + args)
+        command = command.lower()
+
+        if command == 'search':
+            uids = ' '.join(str(uid) for uid in sorted(self.messages))
+            return 'OK', [uids.encode()]
+
+        if command == 'fetch':
+            sequence_set, items = args
+            items = items.decode() if isinstance(items, bytes) else items
+            data = []
+            for uid in sequence_set_to_list(sequence_set):
+                if uid not in self.messages:
+                    continue
+                response, literals = self._fetch_items(uid, items)
+                head = '{} ({}'.format(uid, response)
+                for name, literal in literals:
+                    data.append(('{} {} {{{}}}'.format(head, name, len(literal)).encode(), literal))
+                    head = ''
+                data.append('{})'.format(head).encode())
+            return 'OK', data or [None]
+
+        return self.statuses.get(command, 'OK'), [None]
+
+    def select(self, mailbox='INBOX'):
+        self.commands.append(('SELECT', mailbox))
+        return 'OK', [str(len(self.messages)).encode()]
+
+    def response(self, code):
+        return code, [b'1'] if code == 'UIDVALIDITY' else [None]
+
+    def expunge(self):
+        self.commands.append(('EXPUNGE',))
+        return 'OK', [None]
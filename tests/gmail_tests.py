@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from imbox.messages import Messages
+from imbox.vendors.gmail import GmailDedupCache, GmailMessages, fetch_gmail_metadata
+from tests.fake_imap import FakeConnection
+
+
+def make_message(subject):
+    return 'Subject: {}\r\nFrom: sender@example.com\r\n\r\nbody of {}\r\n'.format(subject, subject).encode()
+
+
+class GmailConnection(FakeConnection):
+    """A folder of Gmail messages, ``msgids`` mapping UIDs to X-GM-MSGID"""
+
+    def __init__(self, msgids, labels):
+        super().__init__({uid: make_message('message {}'.format(msgid)) for uid, msgid in msgids.items()})
+        self.msgids = msgids
+        self.labels = labels
+
+    def _fetch_items(self, uid, items):
+        response, literals = super()._fetch_items(uid, items)
+        if 'X-GM-MSGID' in items:
+            msgid = self.msgids[uid]
+            response += ' X-GM-MSGID {} X-GM-THRID {} X-GM-LABELS ({})'.format(
+                msgid, msgid // 10, self.labels.get(msgid, ''))
+        return response, literals
+
+
+class TestGmail(unittest.TestCase):
+
+    def setUp(self):
+        labels = {1001: '\\Inbox "Work stuff"', 1002: 'Finance'}
+        self.inbox = GmailConnection({1: 1001, 2: 1003}, labels)
+        self.all_mail = GmailConnection({7: 1001, 8: 1002, 9: 1003}, labels)
+
+    def fetch_commands(self, connection):
+        return [command for command in connection.commands if command[0] == 'FETCH']
+
+    def test_fetch_gmail_metadata(self):
+        metadata = dict(fetch_gmail_metadata([b'1', b'2'], self.inbox))
+
+        self.assertEqual({'gmail_msgid': 1001, 'gmail_thread_id': 100, 'gmail_labels': ['\\Inbox', 'Work stuff']},
+                         metadata[b'1'])
+        self.assertEqual([], metadata[b'2']['gmail_labels'])
+
+    def test_gmail_metadata(self):
+        uid, message = list(GmailMessages(self.all_mail, None, gmail_metadata=True))[1]
+
+        self.assertEqual(b'8', uid)
+        self.assertEqual('message 1002', message.subject)
+        self.assertEqual((1002, 100, ['Finance']),
+                         (message.gmail_msgid, message.gmail_thread_id, message.gmail_labels))
+
+    def test_metadata_with_messages(self):
+        messages = list(GmailMessages(self.all_mail, None, gmail_metadata=True, fetch_chunk_size=2))
+
+        self.assertEqual([1001, 1002, 1003], [message.gmail_msgid for _, message in messages])
+        # Carried by the FETCH of the messages, without a command of its own
+        self.assertEqual(['(BODY.PEEK[] FLAGS X-GM-MSGID X-GM-THRID X-GM-LABELS)'] * 2,
+                         [command[2] for command in self.fetch_commands(self.all_mail)])
+
+    def test_metadata_when_indexing(self):
+        for kwargs in ({}, {'headers_only': True}):
+            messages = GmailMessages(self.all_mail, None, gmail_metadata=True, **kwargs)
+            uid, message = messages[1]
+
+            self.assertEqual((b'8', 1002, ['Finance']), (uid, message.gmail_msgid, message.gmail_labels))
+            self.assertEqual({}, messages._gmail_metadata)
+
+    def test_abandoned_iteration(self):
+        messages = GmailMessages(self.all_mail, None, headers_only=True, gmail_metadata=True)
+        iterator = iter(messages)
+        next(iterator)
+        iterator.close()
+
+        self.assertEqual({}, messages._gmail_metadata)
+
+    def test_dedup_in_one_iteration(self):
+        messages = GmailMessages(self.all_mail, None, dedup=GmailDedupCache(), fetch_chunk_size=1)
+        with mock.patch.object(Messages, '_fetch_email_list', autospec=True,
+                               side_effect=Messages._fetch_email_list) as fetch_email_list:
+            self.assertEqual([b'7', b'8', b'9'], [uid for uid, _ in messages])
+
+        self.assertEqual(1, fetch_email_list.call_count)
+
+    def test_dedup_across_folders(self):
+        dedup = GmailDedupCache()
+        inbox = list(GmailMessages(self.inbox, None, dedup=dedup))
+        all_mail = list(GmailMessages(self.all_mail, None, dedup=dedup, compact=True))
+
+        self.assertEqual([b'1', b'2'], [uid for uid, _ in inbox])
+        self.assertEqual([b'8'], [uid for uid, _ in all_mail])
+        self.assertEqual(['Finance'], all_mail[0][1].gmail_labels)
+        # Only the message missing from the cache is downloaded
+        self.assertEqual('8', self.fetch_commands(self.all_mail)[-1][1])
+        self.assertEqual(3, len(dedup))
+
+    def test_persistent_dedup(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'dedup.sqlite')
+
+        with GmailDedupCache(path, account='me@gmail.com') as dedup:
+            list(GmailMessages(self.inbox, None, dedup=dedup))
+        with GmailDedupCache(path, account='me@gmail.com') as dedup:
+            self.assertEqual({1001, 1003}, dedup.known([1001, 1002, 1003]))
+            self.assertEqual({'gmail_thread_id': 100, 'gmail_labels': ['\\Inbox', 'Work stuff']}, dedup.get(1001))
+        with GmailDedupCache(path, account='other@gmail.com') as dedup:
+            self.assertEqual(set(), dedup.known([1001]))
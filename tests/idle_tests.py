@@ -0,0 +1,97 @@
+import imaplib
+import socket
+import threading
+import unittest
+
+from imbox.idle import idle, watch
+
+
+class FakeIdleServer(threading.Thread):
+    """Serves one imaplib connection; a new message arrives during IDLE"""
+
+    def __init__(self, capabilities='IMAP4rev1 IDLE'):
+        super().__init__(daemon=True)
+        self.capabilities = capabilities
+        self.commands = []
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.port = self.listener.getsockname()[1]
+        self.exists = 2
+
+    def run(self):
+        client, _ = self.listener.accept()
+        stream = client.makefile('rwb')
+        stream.write(b'* PREAUTH ready\r\n')
+        stream.flush()
+        for line in stream:
+            tag, command = line.decode().rstrip('\r\n').split(' ', 1)
+            self.commands.append(command)
+            if command == 'CAPABILITY':
+                stream.write('* CAPABILITY {}\r\n'.format(self.capabilities).encode())
+            elif command == 'IDLE':
+                self.exists += 1
+                stream.write('+ idling\r\n* {} EXISTS\r\n'.format(self.exists).encode())
+                stream.flush()
+                self.commands.append(stream.readline().decode().rstrip('\r\n'))
+            elif command == 'NOOP':
+                self.exists += 1
+                stream.write('* {} EXISTS\r\n'.format(self.exists).encode())
+            elif command == 'UID SEARCH UID *':
+                stream.write(b'* SEARCH 4\r\n')
+            elif command.startswith('UID SEARCH UID '):
+                first = int(command.split()[-1].split(':')[0])
+                stream.write('* SEARCH {}\r\n'.format(max(first, 4)).encode())
+            elif command.startswith('SELECT'):
+                stream.write(b'* 2 EXISTS\r\n')
+            stream.write('{} OK done\r\n'.format(tag).encode())
+            stream.flush()
+            if command == 'LOGOUT':
+                break
+        client.close()
+        self.listener.close()
+
+
+class TestIdle(unittest.TestCase):
+
+    def connect(self, server):
+        server.start()
+        connection = imaplib.IMAP4('127.0.0.1', server.port)
+        connection.select()
+        return connection
+
+    def test_idle_returns_on_change(self):
+        server = FakeIdleServer()
+        connection = self.connect(server)
+        connection.response('EXISTS')
+
+        changes = idle(connection, timeout=5)
+
+        self.assertEqual({'EXISTS': [b'3']}, changes)
+        self.assertEqual(['IDLE', 'DONE'], server.commands[-2:])
+        connection.logout()
+
+    def test_watch_yields_new_uids(self):
+        server = FakeIdleServer()
+        connection = self.connect(server)
+
+        uids = watch(connection, idle_timeout=5)
+
+        self.assertEqual([b'5'], next(uids))
+        self.assertEqual([b'6'], next(uids))
+        uids.close()
+        self.assertEqual(['UID SEARCH UID 5:*', 'IDLE', 'DONE', 'UID SEARCH UID 6:*'],
+                         server.commands[-4:])
+        connection.logout()
+
+    def test_watch_polls_without_idle(self):
+        server = FakeIdleServer(capabilities='IMAP4rev1')
+        connection = self.connect(server)
+
+        uids = watch(connection, poll_interval=0)
+
+        self.assertEqual([b'5'], next(uids))
+        uids.close()
+        self.assertNotIn('IDLE', server.commands)
+        self.assertEqual(['NOOP', 'UID SEARCH UID 5:*'], server.commands[-2:])
+        connection.logout()
@@ -0,0 +1,91 @@
+import imaplib
+import unittest
+
+from imbox.imbox import Imbox
+from tests.fake_imap import FakeConnection
+
+
+def make_imbox(capabilities=()):
+    imbox = Imbox.__new__(Imbox)
+    imbox.connection = FakeConnection({}, capabilities=capabilities)
+    imbox.vendor = None
+    return imbox
+
+
+class TestBulkOperations(unittest.TestCase):
+
+    def test_mark_seen_many(self):
+        imbox = make_imbox()
+        imbox.mark_seen_many([b'5', b'1', b'2', b'3', b'9'])
+
+        self.assertEqual([('STORE', '1:3,5,9', '+FLAGS', '(\\Seen)')], imbox.connection.commands)
+
+    def test_chunks(self):
+        imbox = make_imbox()
+        imbox.BULK_CHUNK_SIZE = 2
+        imbox.mark_flag_many([1, 2, 3, 4, 5])
+
+        self.assertEqual(['1:2', '3:4', '5'], [command[1] for command in imbox.connection.commands])
+
+    def test_delete_many_without_uidplus(self):
+        imbox = make_imbox()
+        imbox.delete_many([1, 2, 4])
+
+        self.assertEqual([('STORE', '1:2,4', '+FLAGS', '(\\Deleted)'), ('EXPUNGE',)],
+                         imbox.connection.commands)
+
+    def test_delete_many_with_uidplus(self):
+        imbox = make_imbox(['UIDPLUS'])
+        imbox.delete_many([1, 2, 4])
+
+        self.assertEqual([('STORE', '1:2,4', '+FLAGS', '(\\Deleted)'), ('EXPUNGE', '1:2,4')],
+                         imbox.connection.commands)
+
+    def test_move_many_with_move(self):
+        imbox = make_imbox(['MOVE'])
+        imbox.move_many(iter([3, 4]), 'Archive')
+
+        self.assertEqual([('MOVE', '3:4', 'Archive')], imbox.connection.commands)
+
+    def test_move_many_rejected(self):
+        imbox = make_imbox(['MOVE'])
+        imbox.BULK_CHUNK_SIZE = 1
+        imbox.connection.statuses['move'] = 'NO'
+
+        with self.assertRaises(imaplib.IMAP4.error):
+            imbox.move_many([3, 5], 'Archive')
+        self.assertEqual([('MOVE', '3', 'Archive')], imbox.connection.commands)
+
+    def test_move_many_without_move(self):
+        imbox = make_imbox(['UIDPLUS'])
+        imbox.move_many([3, 4], 'Archive')
+
+        self.assertEqual([('COPY', '3:4', 'Archive'), ('STORE', '3:4', '+FLAGS', '(\\Deleted)'),
+                          ('EXPUNGE', '3:4')], imbox.connection.commands)
+
+    def test_move_many_copy_rejected(self):
+        imbox = make_imbox(['UIDPLUS'])
+        imbox.connection.statuses['copy'] = 'NO'
+
+        with self.assertRaises(imaplib.IMAP4.error):
+            imbox.move_many([3, 4], 'Archive')
+        self.assertEqual([('COPY', '3:4', 'Archive')], imbox.connection.commands)
+
+
+class TestSelect(unittest.TestCase):
+
+    def test_quoted_mailbox(self):
+        imbox = make_imbox()
+        imbox.select('Sent Items')
+
+        self.assertEqual([('SELECT', '"Sent Items"')], imbox.connection.commands)
+        self.assertEqual('Sent Items', imbox.selected_folder)
+        self.assertEqual(1, imbox.uidvalidity)
+
+    def test_gmail_lookup(self):
+        imbox = make_imbox()
+        imbox.vendor = 'gmail'
+        imbox.select('all_mail')
+
+        self.assertEqual([('SELECT', '"[Gmail]/All Mail"')], imbox.connection.commands)
+        self.assertEqual('all_mail', imbox.selected_folder)
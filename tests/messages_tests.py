@@ -0,0 +1,139 @@
+import unittest
+
+from imbox.messages import Messages
+from imbox.response import parse_tokens
+from imbox.structure import decode_preview, parse_body_structure
+from tests.fake_imap import FakeConnection
+
+
+def make_message(subject):
+    return 'Subject: {}\r\nFrom: sender@example.com\r\n\r\nbody of {}\r\n'.format(
+        subject, subject).encode()
+
+
+class TestMessages(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection(
+            {uid: make_message('message {}'.format(uid)) for uid in (1, 2, 3, 5, 8)},
+            flags={2: ['\\Seen']})
+
+    def fetch_commands(self):
+        return [command for command in self.connection.commands if command[0] == 'FETCH']
+
+    def test_iterates_in_chunks(self):
+        messages = Messages(self.connection, None, fetch_chunk_size=3)
+        fetched = list(messages)
+
+        self.assertEqual([b'1', b'2', b'3', b'5', b'8'], [uid for uid, _ in fetched])
+        self.assertEqual('message 5', fetched[3][1].subject)
+        self.assertEqual(['1:3', '5,8'], [command[1] for command in self.fetch_commands()])
+
+    def test_preserves_flags(self):
+        fetched = dict(Messages(self.connection, None))
+
+        self.assertEqual([b'\\Seen'], fetched[b'2'].flags)
+        self.assertEqual([], fetched[b'1'].flags)
+
+    def test_skips_expunged_uids(self):
+        messages = Messages(self.connection, None)
+        del self.connection.messages[3]
+
+        self.assertEqual([b'1', b'2', b'5', b'8'], [uid for uid, _ in messages])
+
+    def test_getitem_slice(self):
+        messages = Messages(self.connection, None)
+
+        self.assertEqual([b'2', b'3'], [uid for uid, _ in messages[1:3]])
+        self.assertEqual(1, len(self.fetch_commands()))
+
+    def test_headers_only(self):
+        messages = Messages(self.connection, None, headers_only=True)
+        uid, message = messages[1]
+
+        self.assertEqual('message 2', message.subject)
+        self.assertEqual([b'\\Seen'], message.flags)
+        self.assertNotIn('body', message.keys())
+        self.assertIn('BODY.PEEK[HEADER]', self.fetch_commands()[-1][2])
+
+        self.assertEqual(['body of message 2\r\n'], message.body['plain'])
+        self.assertIn('BODY.PEEK[]', self.fetch_commands()[-1][2])
+
+    def test_envelope(self):
+        self.connection.envelopes[1] = (
+            '("Tue, 30 Jul 2013 15:56:29 +0300" "=?utf-8?q?caf=C3=A9?=" '
+            '(("Martin" NIL "martin" "amon.cx")) NIL NIL '
+            '((NIL NIL "john" "example.com")) NIL NIL NIL "<test0@example.com>")')
+        uid, message = Messages(self.connection, None, envelope=True)[0]
+
+        self.assertEqual('café', message.subject)
+        self.assertEqual([{'name': 'Martin', 'email': 'martin@amon.cx'}], message.sent_from)
+        self.assertEqual([{'name': '', 'email': 'john@example.com'}], message.sent_to)
+        self.assertEqual('<test0@example.com>', message.message_id)
+        self.assertEqual(2013, message.parsed_date.year)
+        self.assertEqual(len(self.connection.messages[1]), message.size)
+        self.assertEqual(1, len(self.fetch_commands()))
+
+    def test_lazy_attachments(self):
+        self.connection.structures[1] = (
+            '(("TEXT" "PLAIN" ("CHARSET" "ISO-8859-1") NIL NIL "QUOTED-PRINTABLE" 9 1 NIL NIL NIL NIL)'
+            '("APPLICATION" "PDF" ("NAME" "a.pdf") "<part2>" NIL "BASE64" 8 NIL '
+            '("ATTACHMENT" ("FILENAME*" "utf-8\'\'%C3%A9t%C3%A9.pdf")) NIL NIL) "MIXED" ("BOUNDARY" "x") NIL NIL NIL)')
+        self.connection.sections[1] = {'1': b'caf=E9 !\r\n', '2': b'aGVsbG8=\r\n'}
+        uid, message = Messages(self.connection, None, lazy_attachments=True)[0]
+
+        self.assertEqual(['café !\r\n'], message.body['plain'])
+        attachment = message.attachments[0]
+        self.assertEqual('été.pdf', attachment['filename'])
+        self.assertEqual('application/pdf', attachment['content-type'])
+        self.assertEqual('<part2>', attachment['content-id'])
+        self.assertEqual(8, attachment['size'])
+        self.assertEqual(['BODY.PEEK[1]'], [command[2].strip('()') for command in self.fetch_commands()[1:]])
+
+        self.assertEqual(b'hello', attachment['content'].read())
+        self.assertEqual('(BODY.PEEK[2])', self.fetch_commands()[-1][2])
+
+    def test_preview(self):
+        self.connection.structures[1] = (
+            '(("TEXT" "HTML" ("CHARSET" "UTF-8") NIL NIL "BASE64" 40 1 NIL NIL NIL NIL)'
+            '("TEXT" "PLAIN" ("CHARSET" "UTF-8") NIL NIL "QUOTED-PRINTABLE" 30 1 NIL NIL NIL NIL)'
+            '"ALTERNATIVE" ("BOUNDARY" "x") NIL NIL NIL)')
+        self.connection.structures[2] = '("TEXT" "HTML" NIL NIL NIL "7BIT" 60 1 NIL NIL NIL NIL)'
+        self.connection.sections[1] = {'2': b'Caf=C3=A9  au\r\nlait =C3=A9t=C3=A9'}
+        self.connection.sections[2] = {'1': b'<html><style>p {}</style><p>Hello &amp;\r\n <b>wor'}
+        messages = Messages(self.connection, None, preview_bytes=44)
+        previews = [message.preview for _, message in messages[:2]]
+
+        self.assertEqual(['Café au lait été', 'Hello &'], previews)
+        self.assertEqual(['BODY.PEEK[2]<0.44>', 'BODY.PEEK[1]<0.44>'],
+                         [command[2].strip('()') for command in self.fetch_commands()[1:]])
+
+        # Cut in a quoted-printable escape and in a base64 quantum
+        part = parse_body_structure(parse_tokens([self.connection.structures[1].encode()])[0])[1]
+        self.assertEqual('Café au lait', decode_preview(part, b'Caf=C3=A9  au\r\nlait =C3=A'))
+        part.encoding = 'base64'
+        self.assertEqual('ét', decode_preview(part, b'w6l0w6k'))
+        # Undeclared charsets are UTF-8
+        part.encoding = '7bit'
+        part.params.pop('charset', None)
+        self.assertEqual('café crème', decode_preview(part, 'café crème'.encode('utf-8')))
+
+    def test_parse_workers(self):
+        messages = Messages(self.connection, None, fetch_chunk_size=2, parse_workers=2)
+        fetched = list(messages)
+
+        self.assertEqual([b'1', b'2', b'3', b'5', b'8'], [uid for uid, _ in fetched])
+        self.assertEqual(['message {}'.format(uid) for uid in (1, 2, 3, 5, 8)],
+                         [message.subject for _, message in fetched])
+        self.assertEqual([b'\\Seen'], fetched[1][1].flags)
+
+    def test_compact(self):
+        fetched = dict(Messages(self.connection, None, compact=True, keep_raw_email=False))
+
+        message = fetched[b'2']
+        self.assertFalse(hasattr(message, '__dict__'))
+        self.assertFalse(hasattr(message, 'raw_email'))
+        self.assertEqual('message 2', message.subject)
+        self.assertEqual([b'\\Seen'], message.flags)
+        self.assertIs(message.sent_from[0]['email'], fetched[b'1'].sent_from[0]['email'])
+        self.assertNotIn('raw_email', message.keys())
@@ -0,0 +1,65 @@
+import unittest
+
+from imbox.imap import MeteredIMAP4
+from imbox.messages import Messages
+from imbox.metrics import CallbackMetrics, Stats
+from tests.fake_imap import FakeConnection
+from tests.idle_tests import FakeIdleServer
+from tests.messages_tests import make_message
+
+
+class TestStats(unittest.TestCase):
+
+    def test_prometheus(self):
+        stats = Stats()
+        stats.count('round_trips')
+        stats.count('round_trips', 2)
+        stats.timing('search', 0.5)
+        stats.timing('search', 1.5)
+
+        self.assertEqual({'count': 2, 'total': 2.0, 'max': 1.5}, stats.snapshot()['timings']['search'])
+        self.assertEqual('# TYPE imbox_round_trips_total counter\n'
+                         'imbox_round_trips_total 3\n'
+                         '# TYPE imbox_search_seconds summary\n'
+                         'imbox_search_seconds_count 2\n'
+                         'imbox_search_seconds_sum 2.0\n', stats.prometheus())
+
+    def test_messages(self):
+        connection = FakeConnection({
+            1: make_message('first'),
+            2: b'Subject: second\r\nContent-Type: multipart/mixed; boundary=b\r\n\r\n'
+               b'--b\r\nContent-Type: text/plain; charset=x-unknown\r\n\r\nbody\r\n--b--\r\n',
+        })
+        stats = Stats()
+
+        list(Messages(connection, None, metrics=stats, fetch_chunk_size=1))
+
+        timings = stats.snapshot()['timings']
+        self.assertEqual(1, timings['search']['count'])
+        self.assertEqual(2, timings['fetch']['count'])
+        self.assertEqual(2, timings['parse']['count'])
+        self.assertEqual({'charset_fallbacks': 1}, stats.counters)
+
+    def test_callback(self):
+        calls = []
+        connection = FakeConnection({1: make_message('first')})
+
+        Messages(connection, None, metrics=CallbackMetrics(lambda *call: calls.append(call)))
+
+        self.assertEqual([('timing', 'search')], [call[:2] for call in calls])
+
+
+class TestMeteredIMAP4(unittest.TestCase):
+
+    def test_round_trips_and_bytes(self):
+        server = FakeIdleServer()
+        server.start()
+        stats = Stats()
+
+        connection = MeteredIMAP4('127.0.0.1', server.port, metrics=stats)
+        connection.select()
+        connection.logout()
+
+        self.assertEqual(3, stats.counters['round_trips'])
+        self.assertEqual(3, stats.timings['command'][0])
+        self.assertGreater(stats.counters['bytes_received'], 50)
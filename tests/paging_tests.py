@@ -0,0 +1,137 @@
+import unittest
+
+from imbox.messages import Messages
+from imbox.paging import expand_sequence_set, parse_order_by, search_uids, sort_criteria
+from imbox.utils import uids_to_sequence_set
+from tests.fake_imap import FakeConnection
+
+
+def envelope(date, subject, sender):
+    return '("{}" "{}" ((NIL NIL "{}" "example.com")) NIL NIL NIL NIL NIL NIL NIL)'.format(
+        date, subject, sender)
+
+
+class PagingConnection(FakeConnection):
+    """Answers UID SORT and UID SEARCH/SORT RETURN (...) on subject order"""
+
+    error = Exception
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.untagged_responses = {}
+
+    def response(self, name):
+        return 'OK', self.untagged_responses.pop(name, [None])
+
+    def _sorted(self, sort_keys):
+        uids = sorted(self.messages)
+        if 'SUBJECT' in sort_keys:
+            uids.sort(key=lambda uid: self.envelopes[uid].split('"')[3])
+        if 'REVERSE' in sort_keys:
+            uids.reverse()
+        return uids
+
+    def uid(self, command, *args):
+        if command.lower() not in ('sort', 'search') or args[0] is None:
+            return super().uid(command, *args)
+        self.commands.append((command.upper(),) + args)
+
+        if not args[0].startswith('RETURN'):
+            return 'OK', [' '.join(str(uid) for uid in self._sorted(args[0])).encode()]
+
+        if command.lower() == 'sort':
+            uids = self._sorted(args[1])
+        else:
+            uids = sorted(self.messages)
+        start, end = args[0].split()[2].split(':')
+        start, end = int(start), int(end)
+        if start < 0:
+            page = sorted(uids[len(uids) + end:len(uids) + start + 1])
+        else:
+            page = uids[start - 1:end]
+        if command.lower() == 'search':
+            page = [uids_to_sequence_set(str(uid).encode() for uid in page)]
+        else:
+            page = [','.join(str(uid) for uid in page)]
+        self.untagged_responses['ESEARCH'] = ['(TAG "A1") UID COUNT {} PARTIAL ({}:{} {})'.format(
+            len(uids), start, end, page[0]).encode()]
+        return 'OK', [None]
+
+
+class TestPaging(unittest.TestCase):
+
+    def setUp(self):
+        subjects = {1: 'delta', 2: 'Re: alpha', 3: 'charlie', 4: 'bravo', 5: 'echo'}
+        self.messages = {uid: 'Subject: {}\r\n\r\nbody\r\n'.format(subject).encode()
+                         for uid, subject in subjects.items()}
+        self.envelopes = {uid: envelope('Tue, 30 Jul 2013 15:56:2{} +0300'.format(10 - uid), subject, 'user')
+                          for uid, subject in subjects.items()}
+
+    def connection(self, capabilities=()):
+        return PagingConnection(dict(self.messages), capabilities=capabilities,
+                                envelopes=dict(self.envelopes))
+
+    def test_parse_order_by(self):
+        self.assertEqual([('date', True), ('subject', False)], parse_order_by(['-date', 'subject']))
+        self.assertEqual('(REVERSE DATE SUBJECT)', sort_criteria(parse_order_by(['-date', 'subject'])))
+        with self.assertRaises(ValueError):
+            parse_order_by('colour')
+        self.assertEqual([('date', True)], parse_order_by(['-date', 'uid']))
+        with self.assertRaises(ValueError):
+            parse_order_by(['-date', '-uid'])
+        with self.assertRaises(ValueError):
+            parse_order_by(['date', 'uid', 'subject'])
+
+    def test_expand_sequence_set(self):
+        self.assertEqual([b'4', b'7', b'8', b'9', b'3', b'2'], expand_sequence_set(b'4,7:9,3:2'))
+        self.assertEqual([b'5'], expand_sequence_set(5))
+        self.assertEqual([], expand_sequence_set(None))
+
+    def test_plain_search(self):
+        connection = self.connection()
+        self.assertEqual(([b'1', b'2', b'3', b'4', b'5'], 5), search_uids(connection, '(ALL)'))
+        self.assertEqual(([b'4', b'3'], 5), search_uids(connection, '(ALL)', '-uid', offset=1, limit=2))
+        self.assertEqual([('SEARCH', None, '(ALL)')] * 2, connection.commands)
+
+    def test_sort(self):
+        connection = self.connection(['SORT'])
+        uids, total = search_uids(connection, '(ALL)', 'subject', offset=1, limit=2)
+        self.assertEqual([b'4', b'3'], uids)
+        self.assertEqual(5, total)
+        self.assertEqual([('SORT', '(SUBJECT)', 'UTF-8', '(ALL)')], connection.commands)
+
+    def test_sort_with_uid_tiebreak(self):
+        connection = self.connection(['SORT'])
+        search_uids(connection, '(ALL)', ['-date', 'uid'])
+        self.assertEqual([('SORT', '(REVERSE DATE)', 'UTF-8', '(ALL)')], connection.commands)
+
+    def test_esort_partial(self):
+        connection = self.connection(['SORT', 'ESORT', 'CONTEXT=SORT'])
+        uids, total = search_uids(connection, '(ALL)', '-subject', offset=1, limit=2)
+        self.assertEqual([b'1', b'3'], uids)
+        self.assertEqual(5, total)
+        self.assertEqual([('SORT', 'RETURN (PARTIAL 2:3 COUNT)', '(REVERSE SUBJECT)', 'UTF-8', '(ALL)')],
+                         connection.commands)
+
+    def test_search_partial(self):
+        connection = self.connection(['ESEARCH', 'PARTIAL'])
+        self.assertEqual(([b'2', b'3'], 5), search_uids(connection, '(ALL)', limit=2, offset=1))
+        self.assertEqual(([b'4', b'3'], 5), search_uids(connection, '(ALL)', '-uid', limit=2, offset=1))
+        self.assertEqual(('SEARCH', 'RETURN (PARTIAL -2:-3 COUNT)', '(ALL)'), connection.commands[-1])
+
+    def test_sort_locally(self):
+        connection = self.connection()
+        uids, total = search_uids(connection, '(ALL)', ['subject'])
+        self.assertEqual([b'2', b'4', b'3', b'1', b'5'], uids)
+        uids, total = search_uids(connection, '(ALL)', '-date', limit=3)
+        self.assertEqual([b'1', b'2', b'3'], uids)
+        self.assertEqual(5, total)
+        uids, total = search_uids(connection, '(ALL)', ['-date', 'uid'])
+        self.assertEqual([b'1', b'2', b'3', b'4', b'5'], uids)
+
+    def test_messages(self):
+        connection = self.connection(['SORT'])
+        messages = Messages(connection, None, order_by='-subject', limit=2)
+        self.assertEqual(2, len(messages))
+        self.assertEqual(5, messages.total)
+        self.assertEqual(['echo', 'delta'], [message.subject for _, message in messages])
@@ -1,5 +1,6 @@
 import unittest
 from imbox.parser import *
+from imbox.parser import _decode_header_value
 
 import os
 import sys
@@ -476,6 +477,21 @@ class TestParser(unittest.TestCase):
     def test_decode_mail_header(self):
         pass
 
+    def test_decode_mail_header_is_memoized(self):
+        value = '=?koi8-r?b?8NLJ18XU?= =?x-unknown?q?abc?='
+        misses = _decode_header_value.cache_info().misses
+
+        self.assertEqual('Приветabc', decode_mail_header(value))
+        self.assertEqual('Приветabc', decode_mail_header(value))
+        self.assertEqual(misses + 1, _decode_header_value.cache_info().misses)
+
+    def test_get_mail_addresses_returns_new_dicts(self):
+        message = email.message_from_string("From: John Smith <johnsmith@gmail.com>")
+        addresses = get_mail_addresses(message, 'from')
+        addresses[0]['name'] = 'changed'
+
+        self.assertEqual('John Smith', get_mail_addresses(message, 'from')[0]['name'])
+
     def test_get_mail_addresses(self):
 
         to_message_object = email.message_from_string("To: John Doe <johndoe@gmail.com>")
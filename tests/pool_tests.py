@@ -0,0 +1,155 @@
+import imaplib
+import threading
+import time
+import unittest
+
+from imbox.pool import ImboxPool
+
+
+class FakeServer:
+
+    def __init__(self):
+        self.alive = True
+        self.logged_out = False
+
+    def noop(self):
+        if not self.alive:
+            raise imaplib.IMAP4.abort('socket error: EOF')
+        return 'OK', [b'NOOP completed']
+
+    def logout(self):
+        self.logged_out = True
+
+
+class FakeImbox:
+
+    def __init__(self):
+        self.connection = FakeServer()
+        self.selected_folder = 'INBOX'
+        self.selects = []
+
+    def select(self, folder):
+        self.selects.append(folder)
+        self.selected_folder = folder
+
+    def logout(self):
+        self.connection.logout()
+
+
+class FakePool(ImboxPool):
+
+    def __init__(self, **kwargs):
+        super().__init__('imap.example.com', **kwargs)
+        self.created = []
+
+    def _connect(self):
+        self.created.append(FakeImbox())
+        return self.created[-1]
+
+
+class TestPool(unittest.TestCase):
+
+    def test_reuses_connections(self):
+        pool = FakePool(size=2)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(1, len(pool.created))
+
+    def test_selects_folder_only_when_needed(self):
+        pool = FakePool(size=1)
+        with pool.connection(folder='Archive') as imbox:
+            pass
+        with pool.connection(folder='Archive') as imbox:
+            pass
+        with pool.connection(folder='INBOX') as imbox:
+            pass
+
+        self.assertEqual(['Archive', 'INBOX'], imbox.selects)
+
+    def test_replaces_dropped_connections(self):
+        pool = FakePool(size=1, health_check_interval=0)
+        with pool.connection() as first:
+            first.connection.alive = False
+        with pool.connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.connection.logged_out)
+
+    def test_discards_connections_failing_in_use(self):
+        pool = FakePool(size=1)
+        with self.assertRaises(imaplib.IMAP4.abort):
+            with pool.connection() as first:
+                raise imaplib.IMAP4.abort('socket error')
+        with pool.connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+
+    def test_size_limit(self):
+        pool = FakePool(size=1, timeout=0.01)
+        with pool.connection():
+            with self.assertRaises(TimeoutError):
+                with pool.connection():
+                    pass
+
+    def test_concurrent_use(self):
+        pool = FakePool(size=3)
+        in_use = set()
+        errors = []
+
+        def worker():
+            for _ in range(50):
+                with pool.connection() as imbox:
+                    if imbox in in_use:
+                        errors.append(imbox)
+                    in_use.add(imbox)
+                    in_use.discard(imbox)
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertLessEqual(len(pool.created), 3)
+
+    def test_waits_for_a_connection(self):
+        pool = FakePool(size=1)
+        finished = []
+
+        def worker():
+            with pool.connection():
+                time.sleep(0.02)
+            finished.append(True)
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(3, len(finished))
+        self.assertEqual(1, len(pool.created))
+
+    def test_resets_folder(self):
+        pool = FakePool(size=1)
+        with pool.connection(folder='Trash'):
+            pass
+        with pool.connection() as imbox:
+            pass
+
+        self.assertEqual('INBOX', imbox.selected_folder)
+
+    def test_close(self):
+        pool = FakePool(size=1)
+        with pool.connection() as imbox:
+            pass
+        pool.close()
+
+        self.assertTrue(imbox.connection.logged_out)
@@ -1,10 +1,11 @@
 from datetime import date
 import unittest
 
-from imbox.query import build_search_query
+from imbox.query import Q, build_search_query
 from imbox.messages import Messages
 from imbox.vendors.helpers import merge_two_dicts
 from imbox.vendors.gmail import GmailMessages
+from tests.fake_imap import FakeConnection
 
 IMAP_ATTRIBUTE_LOOKUP = Messages.IMAP_ATTRIBUTE_LOOKUP
 GMAIL_ATTRIBUTE_LOOKUP = merge_two_dicts(IMAP_ATTRIBUTE_LOOKUP,
@@ -85,3 +86,30 @@ class TestQuery(unittest.TestCase):
     def test_gmail_label(self):
         res = build_search_query(GMAIL_ATTRIBUTE_LOOKUP, label='finance')
         self.assertEqual(res, '(X-GM-LABELS "finance")')
+
+    def test_size_flags_and_header(self):
+        res = build_search_query(IMAP_ATTRIBUTE_LOOKUP, size__gt=1024, answered=True,
+                                 **{'header__X-Mailer': 'Mutt', 'header__list_id': 'dev'})
+        self.assertEqual(res, '(LARGER 1024) (ANSWERED) (HEADER "X-Mailer" "Mutt") (HEADER "list-id" "dev")')
+
+    def test_q_or_not(self):
+        query = Q(sent_from='a@example.com', unread=True) | ~Q(size__lt=100) | Q(keyword='$Work')
+        res = build_search_query(IMAP_ATTRIBUTE_LOOKUP, query, flagged=True)
+        self.assertEqual(res, '(FLAGGED) (OR ((FROM "a@example.com") (UNSEEN)) '
+                              'OR NOT (SMALLER 100) (KEYWORD $Work))')
+
+    def test_q_and(self):
+        query = Q(subject='hi') & Q(date__gt=date(2014, 12, 31), text=None)
+        self.assertEqual(build_search_query(IMAP_ATTRIBUTE_LOOKUP, query),
+                         '((SUBJECT "hi") (SINCE "31-Dec-2014"))')
+        self.assertEqual(build_search_query(IMAP_ATTRIBUTE_LOOKUP, Q()), '(ALL)')
+
+    def test_q_gmail(self):
+        query = Q(raw='has:attachment') | Q(label='finance')
+        self.assertEqual(build_search_query(GMAIL_ATTRIBUTE_LOOKUP, query),
+                         '(OR (X-GM-RAW "has:attachment") (X-GM-LABELS "finance"))')
+
+    def test_messages_query(self):
+        connection = FakeConnection({})
+        Messages(connection, None, query=Q(seen=True) | Q(size__gt=10), unread=True)
+        self.assertEqual(('SEARCH', None, '(UNSEEN) (OR (SEEN) (LARGER 10))'), connection.commands[0])
@@ -0,0 +1,72 @@
+import unittest
+
+from imbox.response import parse_esearch_response, parse_fetch_response, parse_list_response, parse_tokens
+from imbox.utils import UidList, sequence_set_to_uids, uids_to_sequence_set, chunked
+
+
+class TestResponse(unittest.TestCase):
+
+    def test_parse_tokens(self):
+        values = parse_tokens([b'(NIL "a \\"quoted\\" string" 12 \\Seen ())'])
+        self.assertEqual([[None, b'a "quoted" string', 12, b'\\Seen', []]], values)
+
+    def test_parse_fetch_response_single(self):
+        data = [(b'1 (UID 5 FLAGS (\\Seen) BODY[] {3}', b'abc'), b')']
+        self.assertEqual([{'UID': 5, 'FLAGS': [b'\\Seen'], 'BODY[]': b'abc'}],
+                         parse_fetch_response(data))
+
+    def test_parse_fetch_response_multiple(self):
+        data = [(b'1 (UID 5 BODY[] {3}', b'abc'), b' FLAGS (\\Seen))',
+                (b'2 (UID 7 BODY[] {2}', b'de'), b' FLAGS ())',
+                b'3 (FLAGS (\\Deleted) UID 9)']
+        responses = parse_fetch_response(data)
+
+        self.assertEqual(3, len(responses))
+        self.assertEqual(b'abc', responses[0]['BODY[]'])
+        self.assertEqual([b'\\Seen'], responses[0]['FLAGS'])
+        self.assertEqual(7, responses[1]['UID'])
+        self.assertEqual([], responses[1]['FLAGS'])
+        self.assertNotIn('BODY[]', responses[2])
+
+    def test_parse_fetch_response_sections(self):
+        data = [(b'1 (UID 5 BODY[HEADER.FIELDS (FROM)] {6}', b'From: '),
+                (b' BODY[TEXT]<0> {2}', b'hi'), b')']
+        response = parse_fetch_response(data)[0]
+        self.assertEqual(b'From: ', response['BODY[HEADER.FIELDS (FROM)]'])
+        self.assertEqual(b'hi', response['BODY[TEXT]<0>'])
+
+    def test_parse_fetch_response_empty(self):
+        self.assertEqual([], parse_fetch_response([None]))
+
+    def test_parse_esearch_response(self):
+        data = [b'(TAG "A5") UID COUNT 17 PARTIAL (1:50 4,7:9)']
+        self.assertEqual({'UID': True, 'COUNT': 17, 'PARTIAL': [b'1:50', b'4,7:9']},
+                         parse_esearch_response(data))
+        self.assertEqual({'COUNT': 0}, parse_esearch_response([b'(TAG "A6") COUNT 0']))
+
+    def test_parse_list_response(self):
+        data = [b'(\\HasNoChildren) "/" "INBOX"', (b'(\\Noselect) "." {7}', b'a "b" c'), b'() NIL 2023']
+        self.assertEqual([(['\\HasNoChildren'], '/', 'INBOX'), (['\\Noselect'], '.', 'a "b" c'),
+                          ([], None, '2023')], parse_list_response(data))
+
+    def test_uids_to_sequence_set(self):
+        self.assertEqual('1:3,5,7:8', uids_to_sequence_set([b'8', b'1', b'2', b'3', b'5', b'7', b'2']))
+        self.assertEqual('', uids_to_sequence_set([]))
+
+    def test_sequence_set_to_uids(self):
+        self.assertEqual([1, 2, 3, 7], sequence_set_to_uids(b'3:1,7,2'))
+
+    def test_uid_list(self):
+        uids = UidList.from_search(b'9 1 2 3 5')
+        self.assertEqual([b'9', b'1', b'2', b'3', b'5'], list(uids))
+        self.assertEqual(b'9', uids[0])
+        self.assertEqual(UidList([1, 2]), uids[1:3])
+        self.assertIn(b'5', uids)
+        self.assertEqual('1:3,5,9', uids.sequence_set())
+        self.assertEqual('1:3,5,9', uids_to_sequence_set(uids))
+        self.assertEqual(['1:2', '3,5', '9'], list(uids.sequence_sets(2)))
+        self.assertEqual([b'5', b'4', b'3', b'8'], list(UidList.from_sequence_set('5:3,8')))
+        self.assertEqual(0, len(UidList.from_search(None)))
+
+    def test_chunked(self):
+        self.assertEqual([[1, 2], [3, 4], [5]], list(chunked(range(1, 6), 2)))
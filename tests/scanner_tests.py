@@ -0,0 +1,48 @@
+import unittest
+
+from benchmarks.corpus import generate_mailbox
+from benchmarks.server import FakeIMAPServer
+from imbox.pool import ImboxPool
+from imbox.scanner import Scanner, scan
+
+
+class TestScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.mailbox = generate_mailbox(7, seed=3, attachment_sizes=(32,))
+        self.server = FakeIMAPServer(self.mailbox).start()
+        self.addCleanup(self.server.stop)
+        self.pool = ImboxPool('127.0.0.1', port=self.server.port, ssl=False,
+                              username='user', password='password', size=3)
+        self.addCleanup(self.pool.close)
+
+    def test_scan_folders(self):
+        # The fake server serves the same messages in every folder
+        results = list(scan(self.pool, ['INBOX', 'Archive 2020'], shard_size=2))
+
+        self.assertEqual(sorted((folder, str(uid).encode()) for folder in ('INBOX', 'Archive 2020')
+                                for uid in range(1, 8)),
+                         sorted((folder, uid) for folder, uid, _ in results))
+        self.assertTrue(all('#{} '.format(int(uid)) in message.subject for _, uid, message in results))
+        self.assertLessEqual(self.pool._idle.qsize(), 3)
+
+    def test_all_folders_and_uid_range(self):
+        results = list(Scanner(self.pool, uid_range='2:4', concurrency=2, shard_size=1))
+
+        self.assertEqual([('INBOX', b'2'), ('INBOX', b'3'), ('INBOX', b'4')],
+                         sorted((folder, uid) for folder, uid, _ in results))
+
+    def test_stop_early(self):
+        scanner = iter(Scanner(self.pool, ['INBOX'], shard_size=1, buffer_size=1))
+        folder, uid, message = next(scanner)
+        scanner.close()
+
+        self.assertEqual('INBOX', folder)
+
+    def test_lazy_modes(self):
+        with self.assertRaises(ValueError):
+            Scanner(self.pool, ['INBOX'], headers_only=True)
+
+    def test_failure(self):
+        with self.assertRaises(ValueError):
+            list(scan(self.pool, ['INBOX'], order_by='colour'))
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from imbox.messages import Messages
+from imbox.search_index import SearchIndex, match_query
+from tests.fake_imap import FakeConnection
+
+
+def make_message(subject, sender, body):
+    return ('Subject: {}\r\nFrom: {}\r\nTo: team@example.com\r\n\r\n{}\r\n'
+            .format(subject, sender, body)).encode()
+
+
+def make_html_message(subject, sender, html):
+    return ('Subject: {}\r\nFrom: {}\r\nContent-Type: multipart/alternative; boundary="b1"\r\n\r\n'
+            '--b1\r\nContent-Type: text/html; charset=utf-8\r\n\r\n{}\r\n--b1--\r\n'
+            .format(subject, sender, html)).encode()
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SearchIndex(keep_raw=True)
+        self.connection = FakeConnection({
+            1: make_message('Quarterly invoice', 'Alice <alice@example.com>', 'Please pay the invoice'),
+            2: make_message('Lunch', 'bob@example.com', 'Pizza on friday?'),
+            3: make_html_message('Re: lunch', 'carol@example.com', '<p>Sushi <b>instead</b></p>'),
+        })
+
+    def tearDown(self):
+        self.index.close()
+
+    def index_folder(self, **kwargs):
+        folder_index = self.index.folder('me@example.com', 'INBOX', 7)
+        list(Messages(self.connection, None, search_index=folder_index, **kwargs))
+        return folder_index
+
+    def test_match_query(self):
+        self.assertEqual('"re" "foo" "bar"', match_query('re: foo-bar'))
+
+    def test_search(self):
+        folder_index = self.index_folder()
+        self.connection.commands = []
+
+        self.assertEqual([b'1'], folder_index.search('invoice'))
+        self.assertEqual([b'2', b'3'], sorted(folder_index.search('lunch')))
+        self.assertEqual([b'1'], folder_index.search('alice'))
+        self.assertEqual([b'3'], folder_index.search('sushi instead'))
+        self.assertEqual([b'3'], folder_index.search('subject:lunch AND body:sushi', raw_query=True))
+        self.assertEqual([], folder_index.search('b'))
+        self.assertEqual([('me@example.com', 'INBOX', b'1')], self.index.search('pay'))
+        self.assertEqual([], self.connection.commands)
+
+    def test_cached_messages(self):
+        folder_index = self.index_folder()
+        uid, message = next(folder_index.messages('pizza'))
+
+        self.assertEqual(b'2', uid)
+        self.assertEqual('Lunch', message.subject)
+
+    def test_cached_raw_messages_as_fetched(self):
+        self.connection.messages[4] = ('Subject: Menu\r\nFrom: chef@example.com\r\n'
+                                       'Content-Type: text/plain; charset=iso-8859-1\r\n\r\n'
+                                       'café crème\r\n').encode('latin-1')
+        folder_index = self.index_folder()
+        uid, message = next(folder_index.messages('menu'))
+
+        self.assertEqual(b'4', uid)
+        self.assertEqual(['café crème\r\n'], message.body['plain'])
+
+    def test_indexing_by_index(self):
+        folder_index = self.index.folder('me@example.com', 'INBOX', 7)
+        messages = Messages(self.connection, None, search_index=folder_index)
+        messages[0]
+        messages[1:3]
+
+        self.assertEqual({}, messages._raw_emails)
+        self.assertEqual([b'2'], folder_index.search('pizza'))
+        self.assertEqual('Quarterly invoice', next(folder_index.messages('invoice'))[1].subject)
+
+    def test_incremental(self):
+        folder_index = self.index_folder()
+        self.assertEqual(3, folder_index.last_uid())
+
+        self.connection.messages[4] = make_message('Invoice paid', 'alice@example.com', 'Thanks')
+        list(Messages(self.connection, None, search_index=folder_index, uids=[4]))
+        folder_index.remove_many([1])
+
+        self.assertEqual([b'4'], folder_index.search('invoice'))
+        self.assertEqual(4, folder_index.last_uid())
+
+    def test_headers_only_keeps_bodies(self):
+        folder_index = self.index_folder()
+        self.index_folder(headers_only=True)
+
+        self.assertEqual([b'1'], folder_index.search('pay'))
+
+    def test_headers_only(self):
+        folder_index = self.index_folder(headers_only=True)
+
+        self.assertEqual([b'1'], folder_index.search('invoice alice'))
+        self.assertEqual([], folder_index.search('pay'))
+
+    def test_uidvalidity_change(self):
+        self.index_folder()
+        folder_index = self.index.folder('me@example.com', 'INBOX', 8)
+
+        self.assertEqual([], folder_index.search('invoice'))
+        self.assertEqual(0, folder_index.last_uid())
+
+    def test_persistence(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'search.db')
+
+        with SearchIndex(path) as index:
+            list(Messages(self.connection, None, search_index=index.folder('me', 'INBOX', 7)))
+        with SearchIndex(path) as index:
+            self.assertEqual([b'2'], index.folder('me', 'INBOX', 7).search('pizza'))
+            self.assertEqual([], list(index.messages('pizza')))
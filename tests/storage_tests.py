@@ -0,0 +1,101 @@
+import gc
+import io
+import os
+import tempfile
+import unittest
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from imbox.messages import Messages
+from imbox.parser import parse_email
+from imbox.storage import DirectoryStorage, SpooledStorage, StoredFile
+from tests.fake_imap import FakeConnection
+
+
+def make_message_with_attachment(payload):
+    message = MIMEMultipart()
+    message['Subject'] = 'scans'
+    message.attach(MIMEText('see attached'))
+    attachment = MIMEApplication(payload, 'pdf')
+    attachment.add_header('Content-Disposition', 'attachment', filename='scan.pdf')
+    message.attach(attachment)
+    return message.as_bytes()
+
+
+class TestSpooledStorage(unittest.TestCase):
+
+    def test_large_attachments_go_to_disk(self):
+        storage = SpooledStorage(threshold=10)
+
+        small = storage.store(b'small')
+        large = storage.store(b'x' * 100)
+
+        self.assertFalse(small._rolled)
+        self.assertTrue(large._rolled)
+        self.assertEqual(b'x' * 100, large.read())
+        self.assertEqual(5, storage.in_memory)
+
+    def test_memory_budget(self):
+        storage = SpooledStorage(threshold=10, memory_budget=12)
+
+        first = storage.store(b'a' * 8)
+        second = storage.store(b'b' * 8)
+        self.assertTrue(second._rolled)
+        self.assertEqual(8, storage.in_memory)
+
+        del first
+        gc.collect()
+        self.assertEqual(0, storage.in_memory)
+        self.assertFalse(storage.store(b'c' * 8)._rolled)
+
+
+class TestDirectoryStorage(unittest.TestCase):
+
+    def test_content_addressed(self):
+        with tempfile.TemporaryDirectory() as path:
+            storage = DirectoryStorage(path, threshold=4)
+
+            first = storage.store(b'same content')
+            second = storage.store(b'same content')
+
+            self.assertIsInstance(first, StoredFile)
+            self.assertEqual(first.path, second.path)
+            self.assertEqual(1, sum(len(files) for _, _, files in os.walk(path)))
+            self.assertEqual(b'same content', second.read())
+            second.close()
+            self.assertIsInstance(storage.store(b'tiny'), io.BytesIO)
+
+    def test_parse_email(self):
+        with tempfile.TemporaryDirectory() as path:
+            parsed = parse_email(make_message_with_attachment(b'%PDF' * 100), storage=DirectoryStorage(path))
+
+            attachment = parsed.attachments[0]
+            self.assertEqual('scan.pdf', attachment['filename'])
+            self.assertEqual(400, attachment['size'])
+            self.assertEqual(b'%PDF' * 100, attachment['content'].read())
+            attachment['content'].close()
+
+
+class TestMessagesStorage(unittest.TestCase):
+
+    def test_memory_budget(self):
+        connection = FakeConnection({1: make_message_with_attachment(b'%PDF' * 100)})
+        messages = Messages(connection, None, memory_budget=100)
+
+        _, message = messages[0]
+
+        self.assertTrue(message.attachments[0]['content']._rolled)
+        self.assertEqual(b'%PDF' * 100, message.attachments[0]['content'].read())
+
+    def test_memory_budget_with_storage(self):
+        storage = SpooledStorage(threshold=10, dir=tempfile.gettempdir())
+        first = Messages(FakeConnection({}), None, storage=storage, memory_budget=100)
+        second = Messages(FakeConnection({}), None, storage=storage, memory_budget=200)
+
+        self.assertEqual((10, 100, storage.dir),
+                         (first.storage.threshold, first.storage.memory_budget, first.storage.dir))
+        self.assertEqual(200, second.storage.memory_budget)
+        self.assertIsNone(storage.memory_budget)
+        with self.assertRaises(ValueError):
+            Messages(FakeConnection({}), None, storage=DirectoryStorage('spool'), memory_budget=100)
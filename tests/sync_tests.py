@@ -0,0 +1,141 @@
+import re
+import unittest
+
+from imbox.sync import sync
+from imbox.utils import sequence_set_to_uids
+
+
+class FakeSyncConnection:
+    """A mailbox answering the commands used by sync()"""
+
+    error = Exception
+
+    def __init__(self, capabilities=()):
+        self.capabilities = tuple(capabilities)
+        self.state = 'SELECTED'
+        self.untagged_responses = {}
+        self.commands = []
+        self.uidvalidity = 7
+        self.uidnext = 1
+        self.modseq = 1
+        self.messages = {}
+        self.expunged = {}
+
+    def append(self, count=1):
+        for _ in range(count):
+            self.modseq += 1
+            self.messages[self.uidnext] = ([], self.modseq)
+            self.uidnext += 1
+
+    def store(self, uid, flag):
+        self.modseq += 1
+        self.messages[uid] = (self.messages[uid][0] + [flag], self.modseq)
+
+    def expunge(self, uid):
+        self.modseq += 1
+        del self.messages[uid]
+        self.expunged[uid] = self.modseq
+
+    def _fetch_line(self, uid):
+        flags, modseq = self.messages[uid]
+        return '{0} (UID {0} FLAGS ({1}) MODSEQ ({2}))'.format(uid, ' '.join(flags), modseq).encode()
+
+    def _simple_command(self, name, *args):
+        self.commands.append((name,) + args)
+        if name == 'SELECT':
+            responses = {'EXISTS': [str(len(self.messages)).encode()],
+                         'UIDVALIDITY': [str(self.uidvalidity).encode()],
+                         'UIDNEXT': [str(self.uidnext).encode()]}
+            if 'CONDSTORE' in self.capabilities or 'QRESYNC' in self.capabilities:
+                responses['HIGHESTMODSEQ'] = [str(self.modseq).encode()]
+            match = re.search(r'QRESYNC \((\d+) (\d+)', args[-1]) if len(args) > 1 else None
+            if match and int(match.group(1)) == self.uidvalidity:
+                since = int(match.group(2))
+                vanished = [uid for uid, modseq in self.expunged.items() if modseq > since]
+                if vanished:
+                    responses['VANISHED'] = ['(EARLIER) {}'.format(
+                        ','.join(str(uid) for uid in vanished)).encode()]
+                responses['FETCH'] = [self._fetch_line(uid) for uid, (_, modseq)
+                                      in self.messages.items() if modseq > since]
+            self.untagged_responses = responses
+        return 'OK', [b'completed']
+
+    def unselect(self):
+        self.commands.append(('UNSELECT',))
+        self.state = 'AUTH'
+
+    def enable(self, capability):
+        self.commands.append(('ENABLE', capability))
+        return 'OK', [None]
+
+    def response(self, name):
+        return name, self.untagged_responses.pop(name, [None])
+
+    def uid(self, command, *args):
+        self.commands.append((command.upper(),) + args)
+        if command == 'search':
+            criteria = args[1]
+            uids = sorted(self.messages)
+            if criteria.startswith('UID '):
+                sequence_set = criteria[4:].replace('*', str(max(uids or [0])))
+                wanted = set(sequence_set_to_uids(sequence_set))
+                if criteria.endswith(':*') and uids:
+                    wanted.add(max(uids))
+                uids = [uid for uid in uids if uid in wanted]
+            return 'OK', [' '.join(str(uid) for uid in uids).encode()]
+        if command == 'fetch':
+            since = int(re.search(r'CHANGEDSINCE (\d+)', args[2]).group(1))
+            return 'OK', [self._fetch_line(uid) for uid, (_, modseq)
+                          in self.messages.items() if modseq > since] or [None]
+
+
+class TestSync(unittest.TestCase):
+
+    def check_sync(self, connection):
+        connection.append(5)
+        first = sync(connection, 'INBOX')
+        self.assertEqual([b'1', b'2', b'3', b'4', b'5'], first.new)
+
+        connection.append(2)
+        connection.store(2, '\\Seen')
+        connection.expunge(4)
+        second = sync(connection, 'INBOX', first.state)
+
+        self.assertEqual([b'6', b'7'], second.new)
+        self.assertEqual([b'4'], second.vanished)
+        self.assertFalse(second.reset)
+        self.assertEqual('1:3,5:7', second.state.uids)
+
+        third = sync(connection, 'INBOX', second.state)
+        self.assertEqual(([], {}, []), (third.new, third.changed, third.vanished))
+        return second
+
+    def test_fallback(self):
+        connection = FakeSyncConnection()
+        second = self.check_sync(connection)
+        self.assertEqual({}, second.changed)
+
+    def test_condstore(self):
+        connection = FakeSyncConnection(['CONDSTORE'])
+        second = self.check_sync(connection)
+        self.assertEqual({b'2': [b'\\Seen']}, second.changed)
+
+    def test_qresync(self):
+        connection = FakeSyncConnection(['CONDSTORE', 'QRESYNC', 'UNSELECT', 'ENABLE'])
+        second = self.check_sync(connection)
+
+        self.assertEqual({b'2': [b'\\Seen']}, second.changed)
+        self.assertEqual(1, connection.commands.count(('ENABLE', 'QRESYNC')))
+        self.assertNotIn('fetch', [command[0].lower() for command in connection.commands])
+
+    def test_uidvalidity_change(self):
+        connection = FakeSyncConnection()
+        connection.append(2)
+        first = sync(connection, 'INBOX')
+
+        connection.uidvalidity = 8
+        second = sync(connection, 'INBOX', first.state)
+
+        self.assertTrue(second.reset)
+        self.assertEqual([b'1', b'2'], second.vanished)
+        self.assertEqual([b'1', b'2'], second.new)
@@ -0,0 +1,146 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from imbox.imbox import Imbox
+from imbox.threads import ThreadIndex, ThreadNode, parse_thread_headers, parse_thread_response, prune_threads
+from tests.fake_imap import FakeConnection
+from tests.gmail_tests import GmailConnection
+
+
+def make_message(message_id, references=None, in_reply_to=None, subject='Hello'):
+    headers = ['Message-ID: <{}@example.com>'.format(message_id), 'Subject: {}'.format(subject),
+               'Date: Sun, 18 Oct 2026 10:00:00 +0000']
+    if references:
+        headers.append('References: ' + '\r\n '.join('<{}@example.com>'.format(ref) for ref in references))
+    if in_reply_to:
+        headers.append('In-Reply-To: <{}@example.com>'.format(in_reply_to))
+    return ('\r\n'.join(headers) + '\r\n\r\nbody\r\n').encode()
+
+
+def node(uid, *children):
+    return ThreadNode(None if uid is None else str(uid).encode(), list(children))
+
+
+class ThreadConnection(FakeConnection):
+
+    def uid(self, command, *args):
+        if command.upper() == 'THREAD':
+            self.commands.append((command.upper(),) + args)
+            return 'OK', [b'(2)(3 6 (4 23)(44 7 96))']
+        return super().uid(command, *args)
+
+
+def make_imbox(connection, vendor=None):
+    imbox = Imbox.__new__(Imbox)
+    imbox.connection = connection
+    imbox.vendor = vendor
+    imbox.selected_folder = 'INBOX'
+    imbox.uidvalidity = 7
+    return imbox
+
+
+class TestThreads(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection({
+            1: make_message('a'),
+            2: make_message('b', in_reply_to='a'),
+            4: make_message('d'),
+            5: make_message('e', references=['missing']),
+            6: make_message('f', references=['missing'], in_reply_to='missing'),
+        })
+
+    def test_parse_thread_response(self):
+        self.assertEqual([
+            node(2),
+            node(3, node(6, node(4, node(23)), node(44, node(7, node(96))))),
+            node(None, node(3), node(5)),
+        ], parse_thread_response([b'(2)(3 6 (4 23)(44 7 96))((3)(5))']))
+
+    def test_parse_thread_headers(self):
+        message_id, references, timestamp = parse_thread_headers(
+            make_message('c', references=['a', 'b'], in_reply_to='x'))
+
+        self.assertEqual('<c@example.com>', message_id)
+        self.assertEqual(['<a@example.com>', '<b@example.com>', '<x@example.com>'], references)
+        self.assertIsNotNone(timestamp)
+
+    def test_server_threads(self):
+        connection = ThreadConnection({}, capabilities=['THREAD=REFERENCES'])
+        threads = make_imbox(connection).threads(unread=True)
+
+        self.assertEqual([('THREAD', 'REFERENCES', 'UTF-8', '(UNSEEN)')], connection.commands)
+        self.assertEqual([b'3', b'6', b'4', b'23', b'44', b'7', b'96'], threads[1].uids())
+
+    def test_gmail_threads(self):
+        connection = GmailConnection({1: 1001, 2: 1003, 3: 1011, 4: 1005}, {})
+        threads = make_imbox(connection, vendor='gmail').threads()
+
+        self.assertEqual([node(1, node(2), node(4)), node(3)], threads)
+
+    def test_local_threads(self):
+        threads = make_imbox(self.connection).threads()
+
+        self.assertEqual([node(1, node(2)), node(4), node(None, node(5), node(6))], threads)
+        fetches = [command for command in self.connection.commands if command[0] == 'FETCH']
+        self.assertIn('HEADER.FIELDS', fetches[0][2])
+
+    def test_incremental_index(self):
+        index = ThreadIndex()
+        imbox = make_imbox(self.connection)
+        imbox.threads(index=index)
+
+        self.connection.messages[7] = make_message('g', references=['a', 'b'])
+        self.connection.messages[8] = make_message('h', references=['d', 'missing'])
+        self.connection.commands = []
+        threads = imbox.threads(index=index)
+
+        fetches = [command for command in self.connection.commands if command[0] == 'FETCH']
+        self.assertEqual(['7:8'], [command[1] for command in fetches])
+        # h joins the thread of d to the replies to the missing message
+        self.assertEqual([node(1, node(2, node(7))), node(None, node(4), node(5), node(6), node(8))], threads)
+
+    def test_filtered_threads(self):
+        threads = make_imbox(self.connection).threads()
+
+        self.assertEqual([node(2), node(None, node(5), node(6))], prune_threads(threads, {b'2', b'5', b'6'}))
+        self.assertEqual([node(1)], prune_threads(threads, {b'1'}))
+
+    def test_cycle(self):
+        index = ThreadIndex()
+        index.add('INBOX', 1, 1, '<a@x>', ['<b@x>'])
+        index.add('INBOX', 1, 2, '<b@x>', ['<a@x>'])
+
+        self.assertEqual([node(2, node(1))], index.threads('INBOX', 1))
+
+    def test_duplicate_message_ids(self):
+        index = ThreadIndex()
+        index.add_many('INBOX', 1, [(1, '<a@x>', [], None), (2, '<a@x>', [], None),
+                                    (3, '<b@x>', ['<a@x>'], None)])
+
+        self.assertEqual([node(None, node(1, node(3)), node(2))], index.threads('INBOX', 1))
+
+    def test_one_transaction_per_chunk(self):
+        statements = []
+        index = ThreadIndex()
+        index._db.set_trace_callback(lambda statement: statements.append(statement))
+        index.update(self.connection, 'INBOX', 7, chunk_size=3)
+
+        self.assertEqual(2, sum(statement.startswith('COMMIT') for statement in statements))
+        self.assertEqual(1, sum(statement.startswith('DELETE') for statement in statements))
+
+    def test_persistence(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'threads.db')
+
+        with ThreadIndex(path, account='me') as index:
+            self.assertEqual(5, index.update(self.connection, 'INBOX', 7))
+        with ThreadIndex(path, account='me') as index:
+            self.assertEqual(0, index.update(self.connection, 'INBOX', 7))
+            self.assertEqual(6, index.last_uid('INBOX', 7))
+            # A new UIDVALIDITY drops the messages indexed before
+            self.assertEqual(5, index.update(self.connection, 'INBOX', 8))
+            self.assertEqual(0, index.last_uid('INBOX', 7))